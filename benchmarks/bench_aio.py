@@ -0,0 +1,63 @@
+# Sends bursts of translation requests, many of them for the same few queries, to an asyncio
+# event loop while a ticker measures how long the loop is kept from running other work.
+# Translating inline blocks the loop for the whole burst; qastle.aio runs translations on a
+# thread pool and shares the run of identical requests.
+#
+#     python benchmarks/bench_aio.py [burst size]
+
+from qastle import aio, text_ast_to_python_ast
+
+import asyncio
+import sys
+import time
+
+
+def query(index):
+    return ('(Select (Where data_source (lambda (list e) (> (call (attr e \'pt\')) '
+            + str(index) + '))) (lambda (list e) (list (call (attr e \'eta\')))))')
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def burst(translate, burst_size):
+    lags = []
+    stop = asyncio.Event()
+    ticker_task = asyncio.ensure_future(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+    latencies = []
+    # The whole burst arrives at once, so each request's latency is counted from the start
+    start = time.perf_counter()
+
+    async def request(text_ast):
+        await translate(text_ast)
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[request(query(index % 10)) for index in range(burst_size)])
+    stop.set()
+    await ticker_task
+    return sorted(latencies), sorted(lags)
+
+
+async def inline_translate(text_ast):
+    return text_ast_to_python_ast(text_ast)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main(burst_size=500):
+    for name, translate in [('inline', inline_translate), ('aio', aio.text_ast_to_python_ast)]:
+        latencies, lags = asyncio.run(burst(translate, burst_size))
+        print('%-8s request p50 %8.2f ms  p99 %8.2f ms   loop lag max %8.2f ms'
+              % (name, percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3,
+                 lags[-1] * 1e3))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,38 @@
+# Measures the throughput of translating a batch of text ASTs with 1, 2, 4, and 8 workers in
+# process and thread pools. The pools are created and warmed up before timing. Threads only
+# help on a free-threaded Python, since parsing holds the GIL.
+#
+#     python benchmarks/bench_batch.py [number of queries]
+
+from qastle import make_batch_executor, text_ast_to_python_ast_many
+
+import sys
+import time
+
+
+def query(index):
+    return ('(Select (Where data_source (lambda (list e) (> (call (attr e \'pt\')) '
+            + str(index) + '))) (lambda (list e) (list '
+            + ' '.join("(call (attr (attr e '" + collection + "') '" + column + "'))"
+                       for collection in ['Electrons', 'Muons']
+                       for column in ['pt', 'eta', 'phi', 'e'])
+            + ')))')
+
+
+def main(n_queries=4000):
+    text_asts = [query(index) for index in range(n_queries)]
+    start = time.perf_counter()
+    text_ast_to_python_ast_many(text_asts, executor=None)
+    print('%-8s %2s %10.0f queries/s' % ('serial', '', n_queries / (time.perf_counter() - start)))
+    for executor_kind in ['process', 'thread']:
+        for max_workers in [1, 2, 4, 8]:
+            with make_batch_executor(executor_kind, max_workers=max_workers) as executor:
+                text_ast_to_python_ast_many(text_asts[:max_workers], executor=executor)
+                start = time.perf_counter()
+                text_ast_to_python_ast_many(text_asts, executor=executor, max_workers=max_workers)
+                seconds = time.perf_counter() - start
+            print('%-8s %2d %10.0f queries/s' % (executor_kind, max_workers, n_queries / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,36 @@
+# Compares the size of text and binary encodings of the README query and the time to read each
+# back into a Python AST.
+#
+#     python benchmarks/bench_binary.py [repetitions]
+
+from qastle import (binary_ast_to_python_ast, python_ast_to_binary_ast,
+                    python_ast_to_text_ast, text_ast_to_python_ast)
+
+import sys
+import timeit
+
+
+text_ast = ('(Select data_column_source (lambda (list Event) (list '
+            + ' '.join("(call (attr (attr Event '" + collection + "') '" + column + "'))"
+                       for collection in ['Electrons', 'Muons']
+                       for column in ['pt', 'eta', 'phi', 'e'])
+            + ')))')
+
+
+def main(repetitions=2000):
+    python_ast = text_ast_to_python_ast(text_ast)
+    data = python_ast_to_binary_ast(python_ast)
+    print('text size:   %5d bytes' % len(text_ast))
+    print('binary size: %5d bytes' % len(data))
+    for name, function in [('lark', lambda: text_ast_to_python_ast(text_ast)),
+                           ('fast', lambda: text_ast_to_python_ast(text_ast, backend='fast')),
+                           ('binary_ast_to_python_ast', lambda: binary_ast_to_python_ast(data)),
+                           ('python_ast_to_text_ast', lambda: python_ast_to_text_ast(python_ast)),
+                           ('python_ast_to_binary_ast',
+                            lambda: python_ast_to_binary_ast(python_ast))]:
+        seconds = timeit.timeit(function, number=repetitions) / repetitions
+        print('%-24s %8.1f us' % (name, seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
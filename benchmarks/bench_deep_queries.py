@@ -0,0 +1,75 @@
+# Times each translation stage on machine-generated queries of increasing depth. The time per
+# node should stay flat as the depth grows, and no stage should raise RecursionError.
+#
+#     python benchmarks/bench_deep_queries.py [max depth]
+
+from qastle import (insert_linq_nodes, python_ast_to_columns, python_ast_to_text_ast,
+                    text_ast_to_python_ast, wrap_ast, unwrap_ast, Select)
+
+import ast
+import sys
+import time
+
+
+def where_chain(depth):
+    node = ast.Name(id='data_source', ctx=ast.Load())
+    for _ in range(depth):
+        node = ast.Call(func=ast.Attribute(value=node, attr='Where', ctx=ast.Load()),
+                        args=[unwrap_ast(ast.parse('lambda e: e.pt() > 0'))],
+                        keywords=[])
+    return wrap_ast(node)
+
+
+def and_chain(depth):
+    return wrap_ast(ast.BoolOp(op=ast.And(),
+                               values=[ast.Name(id='x' + str(i), ctx=ast.Load())
+                                       for i in range(depth)]))
+
+
+def compare_chain(depth):
+    return wrap_ast(ast.Compare(left=ast.Name(id='x', ctx=ast.Load()),
+                                ops=[ast.Lt() for _ in range(depth)],
+                                comparators=[ast.Name(id='x', ctx=ast.Load())
+                                             for _ in range(depth)]))
+
+
+def attribute_chain_select(depth):
+    node = ast.Name(id='e', ctx=ast.Load())
+    for _ in range(depth):
+        node = ast.Attribute(value=node, attr='a', ctx=ast.Load())
+    return wrap_ast(Select(source=ast.Name(id='data_source', ctx=ast.Load()),
+                           selector=ast.Lambda(args=unwrap_ast(ast.parse('lambda e: e')).args,
+                                               body=node)))
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main(max_depth=100000):
+    depths = [max_depth // 8, max_depth // 4, max_depth // 2, max_depth]
+    print('%-40s %10s %12s %14s' % ('stage', 'depth', 'seconds', 'us per level'))
+    for depth in depths:
+        call_chain = where_chain(depth)
+        linq_ast, seconds = timed(insert_linq_nodes, call_chain)
+        rows = [('insert_linq_nodes (Where chain)', seconds)]
+        text_ast, seconds = timed(python_ast_to_text_ast, linq_ast)
+        rows.append(('python_ast_to_text_ast (Where chain)', seconds))
+        rows.append(('text_ast_to_python_ast lark (Where)',
+                     timed(text_ast_to_python_ast, text_ast)[1]))
+        rows.append(('text_ast_to_python_ast fast (Where)',
+                     timed(text_ast_to_python_ast, text_ast, backend='fast')[1]))
+        rows.append(('python_ast_to_text_ast (and chain)',
+                     timed(python_ast_to_text_ast, and_chain(depth))[1]))
+        rows.append(('python_ast_to_text_ast (compare chain)',
+                     timed(python_ast_to_text_ast, compare_chain(depth))[1]))
+        rows.append(('python_ast_to_columns (attr chain)',
+                     timed(python_ast_to_columns, attribute_chain_select(depth))[1]))
+        for stage, seconds in rows:
+            print('%-40s %10d %12.4f %14.3f' % (stage, depth, seconds, seconds / depth * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,41 @@
+# Times building a query one operator at a time and writing its text AST after every step, as
+# func_adl does. Writing the whole chain again makes each step slower than the last; the
+# incremental transformer only lays out the new operator at each step.
+#
+#     python benchmarks/bench_incremental.py [number of operators]
+
+from qastle import PythonASTToIncrementalTextASTTransformer, python_ast_to_text_ast, unwrap_ast
+
+import ast
+import sys
+import time
+
+
+operator_sources = ['_.Select(lambda e: e.jets())',
+                    '_.Where(lambda j: j.pt() > 30 and abs(j.eta()) < 2.5)',
+                    '_.Select(lambda j: [j.pt(), j.eta(), j.phi()])']
+
+
+def build(n_operators, to_text_ast):
+    query = ast.Name(id='data_source', ctx=ast.Load())
+    step_seconds = []
+    for index in range(n_operators):
+        operator = unwrap_ast(ast.parse(operator_sources[index % len(operator_sources)]))
+        operator.func.value = query
+        query = operator
+        start = time.perf_counter()
+        to_text_ast(query)
+        step_seconds.append(time.perf_counter() - start)
+    return sum(step_seconds), step_seconds[-1]
+
+
+def main(n_operators=300):
+    transformer = PythonASTToIncrementalTextASTTransformer()
+    for name, to_text_ast in [('python_ast_to_text_ast', python_ast_to_text_ast),
+                              ('incremental', transformer.visit)]:
+        total, last = build(n_operators, to_text_ast)
+        print('%-24s total %8.3f s   last step %8.1f us' % (name, total, last * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
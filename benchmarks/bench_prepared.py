@@ -0,0 +1,31 @@
+# Compares making variants of a query that differ only in cut values by binding a prepared
+# query with translating each variant's text AST from scratch.
+#
+#     python benchmarks/bench_prepared.py [repetitions]
+
+from qastle import prepare, text_ast_to_python_ast
+
+import sys
+import timeit
+
+
+template = ("(Select (Where data_source (lambda (list e) (and (> (call (attr e 'pt')) $pt_cut)"
+            + " (< (call abs (call (attr e 'eta'))) $eta_cut))))"
+            + " (lambda (list e) (list (call (attr e 'pt')) (call (attr e 'eta')))))")
+
+
+def main(repetitions=100000):
+    prepared_query = prepare(template)
+    text_ast = prepared_query.bind_text(pt_cut=25000, eta_cut=2.5)
+    for name, function, number in [
+            ('lark', lambda: text_ast_to_python_ast(text_ast), repetitions // 100),
+            ('fast', lambda: text_ast_to_python_ast(text_ast, backend='fast'), repetitions // 10),
+            ('bind', lambda: prepared_query.bind(pt_cut=25000, eta_cut=2.5), repetitions),
+            ('bind_text', lambda: prepared_query.bind_text(pt_cut=25000, eta_cut=2.5),
+             repetitions)]:
+        seconds = timeit.timeit(function, number=number) / number
+        print('%-10s %8.1f us %10d variants/s' % (name, seconds * 1e6, 1 / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
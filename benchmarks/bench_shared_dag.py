@@ -0,0 +1,37 @@
+# Times writing the text AST of a query built up programmatically, in which every node is used
+# twice by its parent, so the tree it stands for doubles in size with every level. Without
+# memoization every occurrence is laid out again; with it each node object is laid out once and
+# the rest of the time goes into copying text. Sharing subtrees keeps the output itself linear.
+#
+#     python benchmarks/bench_shared_dag.py [max depth]
+
+from qastle import python_ast_to_text_ast, unwrap_ast, wrap_ast
+
+import ast
+import sys
+import time
+
+
+def shared_dag(depth):
+    node = unwrap_ast(ast.parse("e.jets().Where(lambda j: j.pt() > 30).Count()"))
+    for _ in range(depth):
+        node = ast.BinOp(left=node, op=ast.Add(), right=node)
+    return wrap_ast(node)
+
+
+def main(max_depth=16):
+    print('%6s %12s %12s %12s %12s' % ('depth', 'chars', 'plain (s)', 'memoize (s)', 'shared (s)'))
+    for depth in range(4, max_depth + 1, 2):
+        python_ast = shared_dag(depth)
+        row = []
+        for options in [{}, {'memoize': True}, {'share_subtrees': True}]:
+            start = time.perf_counter()
+            text_ast = python_ast_to_text_ast(python_ast, **options)
+            row.append(time.perf_counter() - start)
+            if not options:
+                n_chars = len(text_ast)
+        print('%6d %12d %12.4f %12.4f %12.4f' % (depth, n_chars, *row))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,48 @@
+# Times the start-up costs that short-lived processes pay: importing qastle, serializing a
+# query (which should never import lark), and the first parse, which has to load or build
+# the LALR parser.
+#
+#     python benchmarks/bench_startup.py [repetitions]
+
+import statistics
+import subprocess
+import sys
+import time
+
+
+scenarios = [('python -c pass', 'pass'),
+             ('import qastle', 'import qastle'),
+             ('import qastle + python_ast_to_text_ast',
+              "import ast, qastle; qastle.python_ast_to_text_ast(ast.parse('a.b()'))"),
+             ('import qastle + first parse (serialized tables)',
+              "import qastle; qastle.text_ast_to_python_ast('(call (attr a \\'b\\'))')"),
+             ('import qastle + first parse (grammar analysis)',
+              'from qastle import build_parser; build_parser(use_serialized=False)'),
+             ('import qastle + first parse (fast backend)',
+              "import qastle; qastle.text_ast_to_python_ast('(call (attr a \\'b\\'))',"
+              " backend='fast')"),
+             ('import lark', 'import lark')]
+
+
+def time_subprocess(code, repetitions):
+    seconds = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+def main(repetitions=10):
+    for name, code in scenarios:
+        print('%-52s %8.1f ms' % (name, time_subprocess(code, repetitions) * 1e3))
+    modules = subprocess.run([sys.executable, '-c',
+                              "import ast, sys, qastle; "
+                              "qastle.python_ast_to_text_ast(ast.parse('a.b()')); "
+                              "print('lark' in sys.modules)"],
+                             check=True, capture_output=True, text=True).stdout.strip()
+    print('lark imported by python_ast_to_text_ast: ' + modules)
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
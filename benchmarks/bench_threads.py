@@ -0,0 +1,65 @@
+# Measures the throughput of translating text ASTs from 1, 2, 4, and 8 threads at once, and
+# checks that every result translates back to the text it came from. On a free-threaded build
+# (such as python3.13t or python3.14t) throughput should grow nearly linearly with the number
+# of threads, up to the number of cores, since each thread has its own parser; with the GIL
+# it stays flat.
+#
+#     python benchmarks/bench_threads.py [queries per thread]
+
+from qastle import python_ast_to_text_ast, text_ast_to_python_ast
+
+import os
+import sys
+import threading
+import time
+
+
+def query(index):
+    return ('(Select (Where data_source (lambda (list e) (> (call (attr e \'pt\')) '
+            + str(index) + '))) (lambda (list e) (list '
+            + ' '.join("(call (attr (attr e '" + collection + "') '" + column + "'))"
+                       for collection in ['Electrons', 'Muons']
+                       for column in ['pt', 'eta', 'phi', 'e'])
+            + ')))')
+
+
+def run_threads(n_threads, text_asts, backend):
+    barrier = threading.Barrier(n_threads + 1)
+    failures = []
+
+    def translate():
+        barrier.wait()
+        for text_ast in text_asts:
+            python_ast = text_ast_to_python_ast(text_ast, backend=backend)
+            if python_ast_to_text_ast(python_ast) != text_ast:
+                failures.append(text_ast)
+
+    threads = [threading.Thread(target=translate) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    if failures:
+        raise AssertionError(str(len(failures)) + ' translations were wrong')
+    return n_threads * len(text_asts) / seconds
+
+
+def main(queries_per_thread=500):
+    gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('GIL enabled: %s, %d cores' % (gil_enabled, os.cpu_count() or 1))
+    text_asts = [query(index) for index in range(queries_per_thread)]
+    for backend in ['lark', 'fast']:
+        baseline = None
+        for n_threads in [1, 2, 4, 8]:
+            throughput = run_threads(n_threads, text_asts, backend)
+            if baseline is None:
+                baseline = throughput
+            print('%-5s %2d threads %10.0f queries/s  %5.2fx'
+                  % (backend, n_threads, throughput, throughput / baseline))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
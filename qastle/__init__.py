@@ -1,6 +1,122 @@
-from .ast_util import *
-from .columns_util import *
-from .linq_util import *
-from .parse import *
-from .transform import *
-from .translate import *
+import importlib
+
+# parse() has to be bound eagerly: importing the qastle.parse submodule later would otherwise
+# replace the function with the module as the package's `parse` attribute. qastle.parse only
+# imports lark once a parser is actually needed.
+from .parse import parse
+
+# Everything else is imported from its submodule on first access, so that `import qastle`
+# stays cheap and using only the Python AST to text AST direction never imports lark. Each
+# submodule's entry is its public API, as listed in its __all__; everything else in it is an
+# implementation detail, available only from the submodule.
+_submodule_attributes = {
+    'ast_util': ('unwrap_ast',
+                 'wrap_ast',
+                 'Placeholder',
+                 'copy_ast'),
+    'binary': ('python_ast_to_binary_ast',
+               'binary_ast_to_python_ast'),
+    'cache': ('CacheInfo',
+              'TranslationCache',
+              'PersistentTranslationCache'),
+    'columns_util': ('SourceRemover',
+                     'remove_source',
+                     'PythonASTToColumnsTransformer',
+                     'python_ast_to_columns',
+                     'whole_element_path',
+                     'ColumnDependencyAnalyzer',
+                     'python_ast_to_column_dependencies'),
+    'equivalence': ('AlphaNormalTextASTTransformer',
+                    'alpha_normal_text_ast',
+                    'fingerprint',
+                    'are_alpha_equivalent'),
+    'linq_util': ('Where',
+                  'Select',
+                  'SelectMany',
+                  'First',
+                  'Last',
+                  'ElementAt',
+                  'Contains',
+                  'Aggregate',
+                  'Count',
+                  'Max',
+                  'Min',
+                  'Sum',
+                  'All',
+                  'Any',
+                  'Concat',
+                  'Zip',
+                  'OrderBy',
+                  'OrderByDescending',
+                  'Choose',
+                  'Let',
+                  'linq_operator_names',
+                  'InsertLINQNodesTransformer',
+                  'insert_linq_nodes',
+                  'RemoveLINQNodesTransformer',
+                  'remove_linq_nodes'),
+    'optimize': ('optimization_rules',
+                 'optimize_query',
+                 'optimize_text_ast',
+                 'eliminate_common_subexpressions',
+                 'eliminate_common_subexpressions_text_ast'),
+    'registry': ('node_types',
+                 'NodeType',
+                 'register_node_type',
+                 'unregister_node_type',
+                 'register_node_class'),
+    'normal_form': ('normalize',
+                    'normalize_text_ast'),
+    'prepared': ('PreparedQuery',
+                 'prepare'),
+    'parse': ('syntax_specification_pathname',
+              'Parser',
+              'parse',
+              'parse_to_python_ast'),
+    'transform': ('UnaryOp_ops',
+                  'BinOp_ops',
+                  'BoolOp_ops',
+                  'Compare_ops',
+                  'op_strings',
+                  'flexible_ops',
+                  'PythonASTToTextASTTransformer',
+                  'PythonASTToMemoizedTextASTTransformer',
+                  'PythonASTToIncrementalTextASTTransformer',
+                  'PythonASTToSharedTextASTTransformer',
+                  'TextASTToPythonASTTransformer'),
+    'translate': ('python_source_to_python_ast',
+                  'python_source_to_text_ast',
+                  'python_ast_to_text_ast',
+                  'write_text_ast',
+                  'text_ast_to_python_ast',
+                  'text_ast_to_columns',
+                  'text_ast_to_column_dependencies',
+                  'make_batch_executor',
+                  'text_ast_to_python_ast_many',
+                  'python_source_to_text_ast_many'),
+}
+
+_attribute_submodules = {attribute: submodule
+                         for submodule, attributes in _submodule_attributes.items()
+                         for attribute in attributes}
+
+# Reading these builds a parser, so they are left out of `from qastle import *`. They are also
+# never cached here, since each thread has its own parsers.
+_parser_attributes = ('Parser',)
+
+__all__ = [attribute for attribute in _attribute_submodules
+           if attribute not in _parser_attributes]
+
+
+def __getattr__(name):
+    if name in _attribute_submodules:
+        submodule = importlib.import_module('.' + _attribute_submodules[name], __name__)
+        value = getattr(submodule, name)
+        if name not in _parser_attributes:
+            globals()[name] = value
+        return value
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
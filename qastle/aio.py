@@ -0,0 +1,158 @@
+from . import translate
+from .ast_util import copy_ast
+
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+import weakref
+
+
+default_max_workers = min(4, os.cpu_count() or 1)
+
+
+class InFlightTranslation(object):
+    # A translation running on the executor, the number of coroutines waiting for it, and
+    # how many were waiting when it finished
+    __slots__ = ('future', 'n_waiters', 'n_receivers')
+
+    def __init__(self, future):
+        self.future = future
+        self.n_waiters = 0
+        self.n_receivers = None
+
+
+class AsyncTranslator(object):
+    # Runs translations on an executor so that they do not block the event loop. Concurrent
+    # requests for the same translation share one run, and each caller can be cancelled or
+    # time out on its own: the run itself is only cancelled once nobody is waiting for it.
+    # When more than one caller receives the Python AST of a shared run, each of them gets
+    # its own copy, made on the executor, and the original is never handed out, so callers
+    # are free to modify what they get. By default the executor is a thread pool
+    # of at most default_max_workers threads, which bounds how much of the machine
+    # translations use.
+
+    def __init__(self, executor=None, max_workers=None):
+        if executor is None:
+            if max_workers is None:
+                max_workers = default_max_workers
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                             thread_name_prefix='qastle')
+        self.executor = executor
+        # Futures belong to an event loop, so runs in progress are kept per loop
+        self.in_flight = weakref.WeakKeyDictionary()
+
+    async def run(self, key, function, timeout=None, copy_result=None):
+        # key is None for requests that are never shared
+        loop = asyncio.get_running_loop()
+        in_flight = self.in_flight.get(loop)
+        if in_flight is None:
+            in_flight = self.in_flight[loop] = {}
+        entry = in_flight.get(key) if key is not None else None
+        if entry is None:
+            entry = InFlightTranslation(loop.run_in_executor(self.executor, function))
+            if key is not None:
+                in_flight[key] = entry
+            entry.future.add_done_callback(functools.partial(self.forget, in_flight, key, entry))
+        entry.n_waiters += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(entry.future), timeout)
+        finally:
+            entry.n_waiters -= 1
+            if entry.n_waiters == 0 and not entry.future.done():
+                entry.future.cancel()
+        if copy_result is not None and entry.n_receivers != 1:
+            return await loop.run_in_executor(self.executor, copy_result, result)
+        return result
+
+    def forget(self, in_flight, key, entry, future):
+        # Runs before any waiter resumes, and nobody can join once the entry is gone, so a
+        # single receiver is the only one ever to see the result
+        entry.n_receivers = entry.n_waiters
+        if in_flight.get(key) is entry:
+            del in_flight[key]
+
+    async def python_source_to_text_ast(self, python_source, cache=None, timeout=None):
+        # Requests with different caches must not share a run, or only one cache is filled
+        return await self.run(('python_source_to_text_ast', python_source, id(cache)),
+                              functools.partial(translate.python_source_to_text_ast,
+                                                python_source,
+                                                cache=cache),
+                              timeout=timeout)
+
+    async def python_ast_to_text_ast(self, python_ast, share_subtrees=False, memoize=False,
+                                     timeout=None):
+        # Python ASTs can be modified between requests, so these are never shared
+        return await self.run(None,
+                              functools.partial(translate.python_ast_to_text_ast,
+                                                python_ast,
+                                                share_subtrees=share_subtrees,
+                                                memoize=memoize),
+                              timeout=timeout)
+
+    async def text_ast_to_python_ast(self, text_ast, parser='lalr', backend='lark', cache=None,
+                                     normalize=False, timeout=None):
+        return await self.run(('text_ast_to_python_ast', text_ast, parser, backend, normalize,
+                               id(cache)),
+                              functools.partial(translate.text_ast_to_python_ast,
+                                                text_ast,
+                                                parser=parser,
+                                                backend=backend,
+                                                cache=cache,
+                                                normalize=normalize),
+                              timeout=timeout,
+                              copy_result=copy_ast)
+
+    async def text_ast_to_columns(self, text_ast, cache=None, timeout=None):
+        return await self.run(('text_ast_to_columns', text_ast, id(cache)),
+                              functools.partial(translate.text_ast_to_columns,
+                                                text_ast,
+                                                cache=cache),
+                              timeout=timeout)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+default_translator = None
+
+default_translator_lock = threading.Lock()
+
+
+def get_default_translator():
+    global default_translator
+    if default_translator is None:
+        with default_translator_lock:
+            if default_translator is None:
+                default_translator = AsyncTranslator()
+    return default_translator
+
+
+async def python_source_to_text_ast(python_source, cache=None, timeout=None):
+    return await get_default_translator().python_source_to_text_ast(python_source,
+                                                                    cache=cache,
+                                                                    timeout=timeout)
+
+
+async def python_ast_to_text_ast(python_ast, share_subtrees=False, memoize=False, timeout=None):
+    return await get_default_translator().python_ast_to_text_ast(python_ast,
+                                                                 share_subtrees=share_subtrees,
+                                                                 memoize=memoize,
+                                                                 timeout=timeout)
+
+
+async def text_ast_to_python_ast(text_ast, parser='lalr', backend='lark', cache=None,
+                                 normalize=False, timeout=None):
+    return await get_default_translator().text_ast_to_python_ast(text_ast,
+                                                                 parser=parser,
+                                                                 backend=backend,
+                                                                 cache=cache,
+                                                                 normalize=normalize,
+                                                                 timeout=timeout)
+
+
+async def text_ast_to_columns(text_ast, cache=None, timeout=None):
+    return await get_default_translator().text_ast_to_columns(text_ast,
+                                                              cache=cache,
+                                                              timeout=timeout)
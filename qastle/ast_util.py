@@ -1,6 +1,8 @@
 import ast
 import sys
 
+__all__ = ['unwrap_ast', 'wrap_ast', 'Placeholder', 'copy_ast']
+
 
 def unwrap_ast(module_node):
     if len(module_node.body) == 0:
@@ -21,3 +23,100 @@ def wrap_ast(node=None):
     else:
         module_node = ast.Module(body=body_list, type_ignores=[])
     return module_node
+
+
+class Placeholder(ast.AST):
+    # A $<name> atom, which stands for a constant that is only given when a prepared query
+    # is bound
+    _fields = ('name',)
+
+
+class PostOrderNodeTransformer(ast.NodeTransformer):
+    # Like ast.NodeTransformer, but walks the tree with an explicit stack and transforms all
+    # of a node's children before the node itself. visit_<Node> methods therefore see fields
+    # that have already been transformed and must not visit them again.
+
+    def visit(self, node):
+        reverse_post_order = []
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            reverse_post_order.append(item)
+            stack.extend(ast.iter_child_nodes(item))
+
+        results = {}
+        for item in reversed(reverse_post_order):
+            if id(item) in results:
+                continue
+            for field, old_value in ast.iter_fields(item):
+                if isinstance(old_value, list):
+                    new_values = []
+                    for value in old_value:
+                        if isinstance(value, ast.AST):
+                            value = results[id(value)]
+                            if value is None:
+                                continue
+                            elif not isinstance(value, ast.AST):
+                                new_values.extend(value)
+                                continue
+                        new_values.append(value)
+                    old_value[:] = new_values
+                elif isinstance(old_value, ast.AST):
+                    new_node = results[id(old_value)]
+                    if new_node is None:
+                        delattr(item, field)
+                    else:
+                        setattr(item, field, new_node)
+            method = 'visit_' + item.__class__.__name__
+            results[id(item)] = getattr(self, method, self.generic_visit)(item)
+        return results[id(node)]
+
+    def generic_visit(self, node):
+        return node
+
+
+def copy_ast(node, share_subtrees=True):
+    # Deep copy of an AST that, unlike copy.deepcopy, does not recurse, so it works for trees
+    # of any depth, and is several times faster. Each node is copied with its attributes, then
+    # its child nodes are replaced by their copies. Nodes that appear more than once in the
+    # tree are copied once and shared the same way in the copy, unless share_subtrees is
+    # False, in which case each place they appear gets its own copy, so that every node of
+    # the copy has one parent and can be modified in place. Values that are not AST nodes or
+    # lists are immutable and are not copied.
+    copies = {}
+
+    def copy_node(item):
+        item_copy = copies.get(id(item)) if share_subtrees else None
+        if item_copy is None:
+            item_copy = item.__class__.__new__(item.__class__)
+            if share_subtrees:
+                copies[id(item)] = item_copy
+            item_copy.__dict__.update(item.__dict__)
+            stack.append(item_copy)
+        return item_copy
+
+    stack = []
+    node_copy = copy_node(node)
+    while stack:
+        fields = stack.pop().__dict__
+        for field, value in fields.items():
+            if isinstance(value, ast.AST):
+                fields[field] = copy_node(value)
+            elif isinstance(value, list):
+                fields[field] = [copy_node(element) if isinstance(element, ast.AST) else element
+                                 for element in value]
+    return node_copy
+
+
+def constant_value(node):
+    # The value of a constant, including negative numbers and Python 3.8's ast.Index, or
+    # raises KeyError
+    if sys.version_info < (3, 9) and isinstance(node, ast.Index):
+        node = node.value
+    if isinstance(node, ast.Constant):
+        return node.value
+    if (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+       and isinstance(node.operand, ast.Constant)
+       and isinstance(node.operand.value, (int, float))):
+        return -node.operand.value
+    raise KeyError
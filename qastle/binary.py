@@ -0,0 +1,232 @@
+from .transform import PythonASTToTextASTTransformer, make_atom_node, make_composite_node
+from .ast_util import wrap_ast
+from .fastparse import atom_pattern
+
+import ast
+
+__all__ = ['python_ast_to_binary_ast', 'binary_ast_to_python_ast']
+
+
+# A binary encoding of text ASTs. An encoded record is:
+#
+#     binary_ast_magic, binary_ast_version
+#     varint number of strings, then each string as a varint length and UTF-8 bytes
+#     the nodes of the expression, if the record is not empty
+#
+# Nodes are written in post-order, each as a varint opcode and one varint operand. Atoms are
+# an atom opcode and the index of their text in the string table; a string literal's text is
+# its value rather than its quoted form, and a placeholder is an identifier whose text starts
+# with $, which no identifier's can. Composites are their fields, followed by the opcode
+# of their node type and the number of fields. Node types not in node_type_opcodes are written
+# as named_composite_opcode, the string index of the node type, and the number of fields.
+# Decoding builds nodes with the same functions as parsing the text AST, so both give
+# identical Python ASTs.
+binary_ast_magic = b'QASTLE'
+
+binary_ast_version = 1
+
+identifier_opcode = 0
+string_literal_opcode = 1
+numeric_literal_opcode = 2
+named_composite_opcode = 3
+
+# Never reorder or remove entries, as that would change the meaning of existing encodings; new
+# node types may only be added at the end, along with a new binary_ast_version
+node_types_by_opcode = ('list', 'dict', 'attr', 'subscript', 'call', 'if', 'lambda',
+                        '+', '-', 'not', '~', '*', '/', '%', '**', '//', '&', '|', '^', '<<',
+                        '>>', 'and', 'or', '==', '!=', '<', '<=', '>', '>=',
+                        'Where', 'Select', 'SelectMany', 'First', 'Last', 'ElementAt',
+                        'Contains', 'Aggregate', 'Count', 'Max', 'Min', 'Sum', 'All', 'Any',
+                        'Concat', 'Zip', 'OrderBy', 'OrderByDescending', 'Choose')
+
+first_node_type_opcode = 4
+
+node_type_opcodes = {node_type: first_node_type_opcode + index
+                     for index, node_type in enumerate(node_types_by_opcode)}
+
+atom_opcodes = {'IDENTIFIER': identifier_opcode, 'NUMERIC_LITERAL': numeric_literal_opcode}
+
+atom_token_types = {identifier_opcode: 'IDENTIFIER', numeric_literal_opcode: 'NUMERIC_LITERAL'}
+
+
+class BinaryLiteral(object):
+    # Layout of a constant for the encoder, which needs values rather than their text
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class CompositeEnd(tuple):
+    # The codes written after the fields of a composite
+    pass
+
+
+class PythonASTToBinaryASTTransformer(PythonASTToTextASTTransformer):
+    def visit_Constant(self, node):
+        return BinaryLiteral(node.value)
+
+    def visit_Attribute(self, node):
+        return ('attr', node.value, BinaryLiteral(node.attr))
+
+    def encode(self, node):
+        strings = {}
+        codes = []
+
+        def string_index(string):
+            index = strings.get(string)
+            if index is None:
+                index = strings[string] = len(strings)
+            return index
+
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            while isinstance(item, ast.AST):
+                item = self.layout(item)
+            if isinstance(item, CompositeEnd):
+                codes.extend(item)
+            elif isinstance(item, tuple):
+                opcode = node_type_opcodes.get(item[0])
+                if opcode is None:
+                    stack.append(CompositeEnd((named_composite_opcode,
+                                               string_index(item[0]),
+                                               len(item) - 1)))
+                else:
+                    stack.append(CompositeEnd((opcode, len(item) - 1)))
+                stack.extend(reversed(item[1:]))
+            elif isinstance(item, str):
+                if item == '':
+                    # Only an empty record lays out to nothing
+                    continue
+                codes.append(identifier_opcode)
+                codes.append(string_index(item))
+            elif isinstance(item, BinaryLiteral):
+                if isinstance(item.value, str):
+                    codes.append(string_literal_opcode)
+                    codes.append(string_index(item.value))
+                else:
+                    text = repr(item.value)
+                    match = atom_pattern.fullmatch(text)
+                    if match is None or match.lastgroup not in atom_opcodes:
+                        raise SyntaxError('Invalid atom: ' + text)
+                    codes.append(atom_opcodes[match.lastgroup])
+                    codes.append(string_index(text))
+            elif isinstance(item, list):
+                stack.extend(reversed(item))
+            elif callable(item):
+                item()
+            else:
+                self.generic_visit(item)
+
+        data = bytearray(binary_ast_magic)
+        data.append(binary_ast_version)
+        write_varint(data, len(strings))
+        for string in strings:
+            encoded_string = string.encode('utf-8', 'surrogatepass')
+            write_varint(data, len(encoded_string))
+            data += encoded_string
+        for code in codes:
+            write_varint(data, code)
+        return bytes(data)
+
+
+def write_varint(data, number):
+    while number > 0x7f:
+        data.append((number & 0x7f) | 0x80)
+        number >>= 7
+    data.append(number)
+
+
+def read_varint(data, position):
+    byte = data[position]
+    if byte < 0x80:
+        return byte, position + 1
+    number = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, position
+        shift += 7
+
+
+def python_ast_to_binary_ast(python_ast):
+    return PythonASTToBinaryASTTransformer().encode(python_ast)
+
+
+def binary_ast_to_python_ast(data):
+    if data[:len(binary_ast_magic)] != binary_ast_magic:
+        raise ValueError('Not an encoded qastle AST')
+    if (len(data) <= len(binary_ast_magic)
+            or data[len(binary_ast_magic)] != binary_ast_version):
+        raise ValueError('Unsupported encoded qastle AST version; expected '
+                         + str(binary_ast_version))
+    try:
+        return decode_binary_ast_body(data, len(binary_ast_magic) + 1)
+    except IndexError:
+        raise ValueError('Truncated encoded qastle AST')
+
+
+def decode_binary_ast_body(data, position):
+    n_strings, position = read_varint(data, position)
+    strings = []
+    for _ in range(n_strings):
+        length, position = read_varint(data, position)
+        end = position + length
+        if end > len(data):
+            raise IndexError
+        strings.append(data[position:end].decode('utf-8', 'surrogatepass'))
+        position = end
+
+    # The rest is all varints, which are nearly always single bytes
+    if max(data[position:], default=0) < 0x80:
+        codes = iter(data[position:])
+    else:
+        code_list = []
+        while position < len(data):
+            code, position = read_varint(data, position)
+            code_list.append(code)
+        codes = iter(code_list)
+    return wrap_ast(decode_binary_ast_nodes(codes, strings))
+
+
+def decode_binary_ast_nodes(codes, strings):
+    # Nodes are pushed onto the stack as they are decoded, and composites pop their fields
+    next_code = codes.__next__
+    stack = []
+    try:
+        for opcode in codes:
+            operand = next_code()
+            if opcode >= first_node_type_opcode:
+                node_type = node_types_by_opcode[opcode - first_node_type_opcode]
+                n_fields = operand
+            elif opcode == named_composite_opcode:
+                node_type = strings[operand]
+                n_fields = next_code()
+            elif opcode == string_literal_opcode:
+                stack.append(ast.Constant(value=strings[operand], kind=None))
+                continue
+            else:
+                token_type = atom_token_types[opcode]
+                text = strings[operand]
+                if text[:1] == '$' and opcode == identifier_opcode:
+                    token_type = 'PLACEHOLDER'
+                stack.append(make_atom_node(token_type, text))
+                continue
+            start = len(stack) - n_fields
+            if start < 0:
+                raise ValueError('Malformed encoded qastle AST')
+            fields = stack[start:]
+            del stack[start:]
+            stack.append(make_composite_node(node_type, fields))
+    except StopIteration:
+        raise IndexError
+    if len(stack) > 1:
+        raise ValueError('Malformed encoded qastle AST')
+    elif len(stack) == 1:
+        return stack[0]
+    else:
+        return None
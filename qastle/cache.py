@@ -0,0 +1,316 @@
+import collections
+import contextlib
+import functools
+import hashlib
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+
+__all__ = ['CacheInfo', 'TranslationCache', 'PersistentTranslationCache']
+
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class TranslationCache(object):
+    # A thread-safe, size-bounded LRU mapping for the results of translations. Pass an
+    # instance as the cache argument of the translate functions to reuse their results for
+    # repeated inputs.
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError('Cache size must be at least 1; found ' + str(maxsize))
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None, count_miss=True):
+        # count_miss=False is for lookups that are followed by another for the same request
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                if count_miss:
+                    self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        with self.lock:
+            return CacheInfo(self.hits,
+                             self.misses,
+                             self.evictions,
+                             self.maxsize,
+                             len(self.entries))
+
+    def __len__(self):
+        return len(self.entries)
+
+
+@functools.lru_cache(maxsize=None)
+def package_source_sha256():
+    # A hash of the source of every module in the package and of the grammar, which changes
+    # whenever anything that produces or defines the translations kept in a cache does
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.py') or filename.endswith('.lark'):
+            with open(os.path.join(directory, filename), 'rb') as source_file:
+                digest.update(filename.encode('utf-8') + b'\0' + source_file.read() + b'\0')
+    return digest.hexdigest()
+
+
+class PersistentTranslationCache(object):
+    # A translation cache kept in an SQLite database file, so that it is shared by every
+    # process and thread that opens the same file and outlives them. It can be passed as the
+    # cache argument of the translate functions just like a TranslationCache.
+    #
+    # Keys are stored as SHA-256 hashes and values as pickles. Entries are keyed separately for
+    # each Python version and version of qastle's source, since pickled ASTs are only valid
+    # for the Python and the node classes and transformers that made them. Pickles are
+    # trusted when loaded, so the file must only be writable by trusted users. Once there are
+    # more than max_entries entries or they take more than max_bytes, the least recently used
+    # are evicted. The hit, miss, and eviction counts are those of this instance; the size is
+    # that of the whole database.
+    #
+    # Hits are not written as they happen: the times entries were used are kept by the
+    # instance and written together, by the next put or once touch_interval seconds have
+    # passed since they were last written, so reads do not each take the write lock. Until
+    # then, other processes see the entries as used when they were last written.
+
+    def __init__(self, pathname, max_entries=65536, max_bytes=None, timeout=30.0,
+                 touch_interval=1.0):
+        if max_entries < 1:
+            raise ValueError('Cache size must be at least 1; found ' + str(max_entries))
+        self.pathname = pathname
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+        self.namespace = ('python ' + '.'.join(str(part) for part in sys.version_info[:2])
+                          + '; qastle ' + package_source_sha256() + '; ')
+        self.connections = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.touches = {}
+        self.last_touch_write = time.monotonic()
+        self.connection()
+
+    def connection(self):
+        # Each thread of each process gets its own connection, since SQLite connections must
+        # not be shared across threads or used again in a forked child process
+        connection = getattr(self.connections, 'connection', None)
+        if connection is None or self.connections.pid != os.getpid():
+            import sqlite3
+            connection = sqlite3.connect(self.pathname,
+                                         timeout=self.timeout,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self.write_transaction(connection):
+                connection.execute('CREATE TABLE IF NOT EXISTS entries'
+                                   ' (key BLOB PRIMARY KEY, value BLOB NOT NULL,'
+                                   ' size INTEGER NOT NULL, last_used REAL NOT NULL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS entries_last_used'
+                                   ' ON entries (last_used)')
+                # The number and total size of the entries, kept up to date by every write so
+                # that they are never counted again. Databases made before the totals were
+                # kept are counted once here.
+                connection.execute('CREATE TABLE IF NOT EXISTS totals'
+                                   ' (id INTEGER PRIMARY KEY CHECK (id = 0),'
+                                   ' n_entries INTEGER NOT NULL, n_bytes INTEGER NOT NULL)')
+                connection.execute('INSERT OR IGNORE INTO totals (id, n_entries, n_bytes)'
+                                   ' SELECT 0, COUNT(*), TOTAL(size) FROM entries')
+            self.connections.connection = connection
+            self.connections.pid = os.getpid()
+        return connection
+
+    @contextlib.contextmanager
+    def write_transaction(self, connection):
+        # Takes the database's write lock until the block ends, committing if it completes
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def hash_key(self, key):
+        return hashlib.sha256((self.namespace + repr(key)).encode('utf-8')).digest()
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key, default=None, count_miss=True):
+        connection = self.connection()
+        hashed_key = self.hash_key(key)
+        row = connection.execute('SELECT value FROM entries WHERE key = ?',
+                                 (hashed_key,)).fetchone()
+        if row is None:
+            if count_miss:
+                self.count('misses')
+            return default
+        with self.lock:
+            self.hits += 1
+            self.touches[hashed_key] = time.time()
+            write_touches = time.monotonic() - self.last_touch_write >= self.touch_interval
+        if write_touches:
+            with self.write_transaction(connection):
+                self.write_touches(connection)
+        return pickle.loads(row[0])
+
+    def write_touches(self, connection):
+        # Writes the times entries were used since they were last written, in the transaction
+        # connection is in. Entries evicted since are left alone.
+        with self.lock:
+            touches = self.touches
+            self.touches = {}
+            self.last_touch_write = time.monotonic()
+        try:
+            connection.executemany('UPDATE entries SET last_used = MAX(last_used, ?)'
+                                   ' WHERE key = ?',
+                                   [(last_used, key) for key, last_used in touches.items()])
+        except BaseException:
+            with self.lock:
+                for key, last_used in touches.items():
+                    self.touches.setdefault(key, last_used)
+            raise
+
+    def put(self, key, value):
+        try:
+            pickled_value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError):
+            # Too deep or not picklable; the value is just not cached
+            return
+        connection = self.connection()
+        hashed_key = self.hash_key(key)
+        with self.write_transaction(connection):
+            self.write_touches(connection)
+            row = connection.execute('SELECT size FROM entries WHERE key = ?',
+                                     (hashed_key,)).fetchone()
+            connection.execute('INSERT OR REPLACE INTO entries (key, value, size, last_used)'
+                               ' VALUES (?, ?, ?, ?)',
+                               (hashed_key, pickled_value, len(pickled_value), time.time()))
+            if row is None:
+                connection.execute('UPDATE totals SET n_entries = n_entries + 1,'
+                                   ' n_bytes = n_bytes + ?', (len(pickled_value),))
+            else:
+                connection.execute('UPDATE totals SET n_bytes = n_bytes + ?',
+                                   (len(pickled_value) - row[0],))
+            n_evicted = self.evict(connection)
+        if n_evicted > 0:
+            with self.lock:
+                self.evictions += n_evicted
+
+    def evict(self, connection):
+        n_entries, n_bytes = connection.execute('SELECT n_entries, n_bytes'
+                                                ' FROM totals').fetchone()
+        n_excess_entries = n_entries - self.max_entries
+        if self.max_bytes is None:
+            n_excess_bytes = 0
+        else:
+            n_excess_bytes = n_bytes - self.max_bytes
+        if n_excess_entries <= 0 and n_excess_bytes <= 0:
+            return 0
+        keys = []
+        n_evicted_bytes = 0
+        for key, size in connection.execute('SELECT key, size FROM entries'
+                                            ' ORDER BY last_used'):
+            # The newest entry is kept even if it is larger than max_bytes on its own
+            if len(keys) == n_entries - 1:
+                break
+            if n_excess_entries <= 0 and n_excess_bytes <= 0:
+                break
+            keys.append(key)
+            n_evicted_bytes += size
+            n_excess_entries -= 1
+            n_excess_bytes -= size
+        connection.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in keys])
+        connection.execute('UPDATE totals SET n_entries = n_entries - ?,'
+                           ' n_bytes = n_bytes - ?', (len(keys), n_evicted_bytes))
+        return len(keys)
+
+    def clear(self):
+        connection = self.connection()
+        with self.write_transaction(connection):
+            connection.execute('DELETE FROM entries')
+            connection.execute('UPDATE totals SET n_entries = 0, n_bytes = 0')
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.touches = {}
+
+    def info(self):
+        currsize = self.connection().execute('SELECT n_entries FROM totals').fetchone()[0]
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.max_entries, currsize)
+
+    def __len__(self):
+        return self.info().currsize
+
+    def close(self):
+        # Writes the uses not yet written before closing this thread's connection
+        connection = getattr(self.connections, 'connection', None)
+        if connection is not None:
+            if self.touches and self.connections.pid == os.getpid():
+                with self.write_transaction(connection):
+                    self.write_touches(connection)
+            connection.close()
+            self.connections.connection = None
+
+
+# String literals are matched first so that whitespace inside them is left alone
+text_ast_whitespace_pattern = re.compile(r"(?P<string>'(?:\\.|[^'])*'|" r'"(?:\\.|[^"])*")'
+                                         r'|(?P<open>\([\t\n\r ]+)'
+                                         r'|(?P<close>[\t\n\r ]+\))'
+                                         r'|[\t\n\r ]+')
+
+
+def replace_text_ast_whitespace(match):
+    if match.lastgroup == 'string':
+        return match.group()
+    elif match.lastgroup == 'open':
+        return '('
+    elif match.lastgroup == 'close':
+        return ')'
+    else:
+        return ' '
+
+
+@functools.lru_cache(maxsize=4096)
+def canonical_text_ast(text_ast):
+    # Collapses the whitespace that the grammar ignores, so that text ASTs that differ only in
+    # formatting share a cache entry. Whitespace that separates nodes is kept as one space;
+    # whitespace after "(", before ")" and at either end is dropped. Invalid text stays
+    # invalid.
+    return text_ast_whitespace_pattern.sub(replace_text_ast_whitespace, text_ast).strip(' ')
@@ -1,16 +1,34 @@
+from .ast_util import constant_value
+
 import ast
 import sys
 
+__all__ = ['SourceRemover', 'remove_source', 'PythonASTToColumnsTransformer',
+           'python_ast_to_columns', 'whole_element_path', 'ColumnDependencyAnalyzer',
+           'python_ast_to_column_dependencies']
+
 
 class SourceRemover(ast.NodeTransformer):
     def __init__(self, source_name):
         self.source_name = source_name
 
+    def visit(self, node):
+        # Replaces fields in place while ast.walk() iterates, so deep trees need no recursion
+        node = self.visit_Attribute(node)
+        for parent in ast.walk(node):
+            for field, value in ast.iter_fields(parent):
+                if isinstance(value, list):
+                    value[:] = [self.visit_Attribute(item) for item in value]
+                else:
+                    setattr(parent, field, self.visit_Attribute(value))
+        return node
+
     def visit_Attribute(self, node):
-        if isinstance(node.value, ast.Name) and node.value.id == self.source_name:
+        if (isinstance(node, ast.Attribute)
+           and isinstance(node.value, ast.Name) and node.value.id == self.source_name):
             return ast.Name(id=node.attr, ctx=node.ctx)
         else:
-            return self.generic_visit(node)
+            return node
 
 
 def remove_source(node, source_name):
@@ -41,10 +59,22 @@ class PythonASTToColumnsTransformer(ast.NodeVisitor):
         return node.id
 
     def visit_Attribute(self, node):
-        return self.visit(node.value) + '.' + node.attr
+        return self.column_name(node)
 
     def visit_Call(self, node):
-        return self.visit(node.func) + '()'
+        return self.column_name(node)
+
+    def column_name(self, node):
+        suffixes = []
+        while isinstance(node, (ast.Attribute, ast.Call)):
+            if isinstance(node, ast.Attribute):
+                suffixes.append('.' + node.attr)
+                node = node.value
+            else:
+                suffixes.append('()')
+                node = node.func
+        suffixes.append(self.visit(node))
+        return ''.join(reversed(suffixes))
 
     def visit_Select(self, node):
         if self.n_selects != 0:
@@ -68,3 +98,386 @@ class PythonASTToColumnsTransformer(ast.NodeVisitor):
 
 def python_ast_to_columns(python_ast):
     return PythonASTToColumnsTransformer().visit(python_ast)
+
+
+column_dependency_labels = ('filter', 'output', 'aggregate')
+
+# The path of a whole element of a data source, which the paths read from it extend
+whole_element_path = ''
+
+
+def join_path(path, suffix):
+    if path == whole_element_path:
+        return suffix
+    return path + '.' + suffix
+
+
+class ColumnValue(object):
+    # What the dependency analysis knows about the value of an expression:
+    #     path     the data path whose value it is exactly, if any, which is
+    #              whole_element_path for a whole element of the data source
+    #     direct   paths whose values it is or is computed from
+    #     reduced  paths that were read by an aggregate to compute it
+    #     length   for a sequence, paths that determine how many elements it has
+    #     element  for a sequence, the value of its elements
+    #     items    for a list or dict literal, the values of its elements by index or key
+    __slots__ = ('path', 'direct', 'reduced', 'length', 'element', 'items')
+
+    def __init__(self, path=None, direct=frozenset(), reduced=frozenset(), length=frozenset(),
+                 element=None, items=None):
+        self.path = path
+        if path is not None:
+            direct = direct | {path}
+        self.direct = direct
+        self.reduced = reduced
+        self.length = length
+        self.element = element
+        self.items = items
+
+    def all_paths(self):
+        return self.direct | self.length | self.reduced
+
+
+empty_column_value = ColumnValue()
+
+operator_node_types = (ast.boolop, ast.operator, ast.unaryop, ast.cmpop, ast.expr_context)
+
+
+def combine_column_values(values):
+    # The value of an expression computed from all of values
+    direct = frozenset()
+    reduced = frozenset()
+    for value in values:
+        direct = direct | value.direct | value.length
+        reduced = reduced | value.reduced
+    return ColumnValue(direct=direct, reduced=reduced)
+
+
+def element_value(value):
+    if value.element is not None:
+        return value.element
+    elif value.path is not None:
+        return ColumnValue(path=value.path)
+    elif value.items is not None:
+        return combine_column_values(value.items.values())
+    return ColumnValue(direct=value.direct | value.length, reduced=value.reduced)
+
+
+def length_paths(value):
+    if value.element is not None:
+        return value.length
+    elif value.path is not None:
+        return frozenset([value.path])
+    return value.direct | value.length
+
+
+def sequence_value(element, length, reduced=frozenset()):
+    return ColumnValue(direct=element.direct | element.length,
+                       reduced=element.reduced | reduced,
+                       length=length,
+                       element=element)
+
+
+class ColumnDependencyAnalyzer(object):
+    # Finds every data path a query reads and how it is used, by evaluating the query on
+    # ColumnValues instead of data. The elements of a data source, which is any free name used
+    # as a sequence, have the path whole_element_path, ''; attributes and method calls on a
+    # value with a path extend it, as in python_ast_to_columns, with the arguments of a method
+    # call written out when they are constants, and the elements of a sequence at a path have
+    # that same path. Placeholders are constants. Each path is labeled with the ways it is used:
+    #     filter     deciding which elements a Where keeps
+    #     output     giving values, or the order of values, in the result of the query
+    #     aggregate  being reduced by an aggregate operator such as Count or Sum
+    # A path labeled only 'aggregate' never has to be read for anything but an aggregate.
+    # Each visit_<Node> method is a generator that yields (node, environment) for each value
+    # it needs and is sent the value back, so that the analysis does not recurse.
+
+    def __init__(self):
+        self.labels = {}
+
+    def analyze(self, node):
+        value = self.run(node, {})
+        self.consume(value, 'output')
+        return self.labels
+
+    def run(self, node, environment):
+        stack = [self.evaluate(node, environment)]
+        value = None
+        while True:
+            try:
+                request = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                if not stack:
+                    return value
+                continue
+            stack.append(self.evaluate(*request))
+            value = None
+
+    def evaluate(self, node, environment):
+        method = getattr(self, 'visit_' + node.__class__.__name__, None)
+        if method is None:
+            raise SyntaxError('Unsupported node type: ' + str(type(node)))
+        return method(node, environment)
+
+    def consume(self, value, label):
+        if label == 'output':
+            paths = value.direct | value.length
+        else:
+            paths = value.all_paths()
+        for path in paths:
+            self.labels.setdefault(path, set()).add(label)
+
+    def aggregate(self, values):
+        # The value of an aggregate computed from all of values
+        reduced = frozenset()
+        for value in values:
+            self.consume(value, 'aggregate')
+            reduced = reduced | value.all_paths()
+        return ColumnValue(reduced=reduced)
+
+    def visit_Module(self, node, environment):
+        if len(node.body) == 0:
+            return empty_column_value
+        elif len(node.body) == 1:
+            return (yield (node.body[0], environment))
+        raise SyntaxError('A record must contain zero or one expressions; found '
+                          + str(len(node.body)))
+        yield
+
+    def visit_Expr(self, node, environment):
+        return (yield (node.value, environment))
+
+    def visit_Name(self, node, environment):
+        value = environment.get(node.id)
+        if value is None:
+            value = ColumnValue(element=ColumnValue(path=whole_element_path))
+        return value
+        yield
+
+    def visit_Constant(self, node, environment):
+        return empty_column_value
+        yield
+
+    def visit_Placeholder(self, node, environment):
+        # Bound to a constant before the query is run, so it reads no data
+        return empty_column_value
+        yield
+
+    def visit_Index(self, node, environment):
+        return (yield (node.value, environment))
+
+    def visit_List(self, node, environment):
+        values = []
+        for element in node.elts:
+            values.append((yield (element, environment)))
+        value = combine_column_values(values)
+        value.items = dict(enumerate(values))
+        return value
+
+    def visit_Tuple(self, node, environment):
+        return (yield from self.visit_List(node, environment))
+
+    def visit_Dict(self, node, environment):
+        values = []
+        items = {}
+        for key, value_node in zip(node.keys, node.values):
+            values.append((yield (key, environment)))
+            value = yield (value_node, environment)
+            values.append(value)
+            try:
+                items[constant_value(key)] = value
+            except (KeyError, TypeError):
+                pass
+        value = combine_column_values(values)
+        value.items = items
+        return value
+
+    def visit_Attribute(self, node, environment):
+        value = yield (node.value, environment)
+        if value.items is not None and node.attr in value.items:
+            # func_adl reads the entries of dicts as attributes
+            return value.items[node.attr]
+        elif value.path is not None:
+            return ColumnValue(path=join_path(value.path, node.attr))
+        return combine_column_values([value])
+
+    def visit_Subscript(self, node, environment):
+        value = yield (node.value, environment)
+        index = yield (node.slice, environment)
+        try:
+            key = constant_value(node.slice)
+        except KeyError:
+            return combine_column_values([element_value(value), index,
+                                          ColumnValue(direct=length_paths(value))])
+        if value.items is not None:
+            try:
+                if key in value.items:
+                    return value.items[key]
+            except TypeError:
+                pass
+        if value.path is not None and isinstance(key, str):
+            return ColumnValue(path=join_path(value.path, key))
+        return element_value(value)
+
+    def visit_Call(self, node, environment):
+        if isinstance(node.func, ast.Lambda):
+            arguments = []
+            for argument in node.args:
+                arguments.append((yield (argument, environment)))
+            body_environment = dict(environment)
+            for arg, argument in zip(node.func.args.args, arguments):
+                body_environment[arg.arg] = argument
+            return (yield (node.func.body, body_environment))
+        arguments = []
+        for argument in node.args:
+            arguments.append((yield (argument, environment)))
+        if isinstance(node.func, ast.Attribute):
+            value = yield (node.func.value, environment)
+            if value.path is not None:
+                try:
+                    arguments_text = ', '.join(repr(constant_value(argument))
+                                               for argument in node.args)
+                except KeyError:
+                    method_value = ColumnValue(path=join_path(value.path,
+                                                              node.func.attr + '()'))
+                    return combine_column_values([method_value] + arguments)
+                return ColumnValue(path=join_path(value.path,
+                                                  node.func.attr + '(' + arguments_text + ')'))
+            return combine_column_values([value] + arguments)
+        function = yield (node.func, environment)
+        return combine_column_values([function] + arguments)
+
+    def visit_operation(self, node, environment):
+        values = []
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, operator_node_types):
+                values.append((yield (child, environment)))
+        return combine_column_values(values)
+
+    visit_UnaryOp = visit_BinOp = visit_BoolOp = visit_Compare = visit_IfExp = visit_operation
+
+    def visit_Lambda(self, node, environment):
+        body_environment = dict(environment)
+        for arg in node.args.args:
+            body_environment[arg.arg] = empty_column_value
+        return (yield (node.body, body_environment))
+
+    def apply_lambda(self, function, arguments, environment):
+        body_environment = dict(environment)
+        for arg, argument in zip(function.args.args, arguments):
+            body_environment[arg.arg] = argument
+        return (function.body, body_environment)
+
+    def visit_Let(self, node, environment):
+        value = yield (node.value, environment)
+        return (yield self.apply_lambda(node.func, [value], environment))
+
+    def visit_Where(self, node, environment):
+        source = yield (node.source, environment)
+        element = element_value(source)
+        predicate = yield self.apply_lambda(node.predicate, [element], environment)
+        self.consume(predicate, 'filter')
+        return sequence_value(element, length_paths(source), source.reduced)
+
+    def visit_Select(self, node, environment):
+        source = yield (node.source, environment)
+        element = yield self.apply_lambda(node.selector, [element_value(source)], environment)
+        return sequence_value(element, length_paths(source), source.reduced)
+
+    def visit_SelectMany(self, node, environment):
+        source = yield (node.source, environment)
+        collection = yield self.apply_lambda(node.selector, [element_value(source)],
+                                             environment)
+        return sequence_value(element_value(collection),
+                              length_paths(source) | length_paths(collection),
+                              source.reduced)
+
+    def visit_OrderBy(self, node, environment):
+        source = yield (node.source, environment)
+        element = element_value(source)
+        key = yield self.apply_lambda(node.key_selector, [element], environment)
+        # Sort keys only decide the order of the result
+        self.consume(key, 'output')
+        return source
+
+    visit_OrderByDescending = visit_OrderBy
+
+    def visit_element_operator(self, node, environment):
+        # First, Last, ElementAt, and Choose give elements of their source, whose length is
+        # all they reduce
+        values = []
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, operator_node_types):
+                values.append((yield (child, environment)))
+        source = values[0]
+        self.aggregate([ColumnValue(direct=length_paths(source))] + values[1:])
+        return element_value(source)
+
+    visit_First = visit_Last = visit_ElementAt = visit_Choose = visit_element_operator
+
+    def visit_Count(self, node, environment):
+        source = yield (node.source, environment)
+        return self.aggregate([ColumnValue(direct=length_paths(source),
+                                           reduced=source.reduced)])
+
+    def visit_reduction(self, node, environment):
+        values = []
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, operator_node_types):
+                values.append((yield (child, environment)))
+        return self.aggregate(values)
+
+    visit_Max = visit_Min = visit_Sum = visit_Contains = visit_reduction
+
+    def visit_quantifier(self, node, environment):
+        # All and Any
+        source = yield (node.source, environment)
+        predicate = yield self.apply_lambda(node.predicate, [element_value(source)],
+                                            environment)
+        return self.aggregate([ColumnValue(direct=length_paths(source),
+                                           reduced=source.reduced),
+                               predicate])
+
+    visit_All = visit_Any = visit_quantifier
+
+    def visit_Aggregate(self, node, environment):
+        source = yield (node.source, environment)
+        seed = yield (node.seed, environment)
+        accumulator = combine_column_values([seed])
+        result = yield self.apply_lambda(node.func, [accumulator, element_value(source)],
+                                         environment)
+        return self.aggregate([source, seed, result])
+
+    def visit_Concat(self, node, environment):
+        first = yield (node.first, environment)
+        second = yield (node.second, environment)
+        element = combine_column_values([element_value(first), element_value(second)])
+        if element_value(first).path is not None and (element_value(first).path
+                                                      == element_value(second).path):
+            element = element_value(first)
+        return sequence_value(element, length_paths(first) | length_paths(second),
+                              first.reduced | second.reduced)
+
+    def visit_Zip(self, node, environment):
+        source = yield (node.source, environment)
+        if source.items is not None:
+            sequences = [source.items[index] for index in sorted(source.items)]
+            elements = [element_value(sequence) for sequence in sequences]
+            element = combine_column_values(elements)
+            element.items = dict(enumerate(elements))
+            length = frozenset()
+            for sequence in sequences:
+                length = length | length_paths(sequence)
+            return sequence_value(element, length, source.reduced)
+        return sequence_value(element_value(element_value(source)), length_paths(source),
+                              source.reduced)
+
+
+def python_ast_to_column_dependencies(python_ast):
+    # Maps each data path the query reads to the set of ways it is used; see
+    # ColumnDependencyAnalyzer. The key whole_element_path, '', means that whole elements of
+    # the data source are used, as when the query gives back the elements of a Where. LINQ
+    # nodes must already have been inserted. Placeholders read no data.
+    return ColumnDependencyAnalyzer().analyze(python_ast)
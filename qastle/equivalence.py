@@ -0,0 +1,60 @@
+from .transform import PythonASTToTextASTTransformer
+from .translate import text_ast_to_python_ast
+
+import hashlib
+
+__all__ = ['AlphaNormalTextASTTransformer', 'alpha_normal_text_ast', 'fingerprint',
+           'are_alpha_equivalent']
+
+
+class AlphaNormalTextASTTransformer(PythonASTToTextASTTransformer):
+    # Writes the text AST with every lambda argument renamed to #<level>.<index>, where level
+    # is the number of lambdas the defining lambda is nested in and index is the position of
+    # the argument. Queries that differ only in the names of lambda arguments therefore give
+    # the same text. Free names are left alone; they cannot clash with the new names because
+    # identifiers cannot contain "#".
+
+    context_dependent_layouts = True
+
+    def __init__(self):
+        self.scopes = [{}]
+
+    def visit_Lambda(self, node):
+        level = len(self.scopes) - 1
+        scope = dict(self.scopes[-1])
+        for index, arg in enumerate(node.args.args):
+            scope[arg.arg] = '#' + str(level) + '.' + str(index)
+        return [lambda: self.scopes.append(scope),
+                ('lambda', node.args, node.body),
+                self.scopes.pop]
+
+    def visit_arg(self, node):
+        return self.scopes[-1][node.arg]
+
+    def visit_Name(self, node):
+        return self.scopes[-1].get(node.id, node.id)
+
+
+def as_python_ast(query):
+    if isinstance(query, str):
+        return text_ast_to_python_ast(query, backend='fast')
+    return query
+
+
+def alpha_normal_text_ast(query):
+    # query may be a text AST or a Python AST, which may contain LINQ nodes
+    return AlphaNormalTextASTTransformer().visit(as_python_ast(query))
+
+
+def fingerprint(query, bits=64):
+    # A hash of the query's structure that ignores whitespace and the names of lambda
+    # arguments. It is the same in every process and version of Python, so it can be stored.
+    if bits not in (64, 128):
+        raise ValueError('Fingerprint size must be 64 or 128 bits; found ' + str(bits))
+    digest = hashlib.blake2b(alpha_normal_text_ast(query).encode('utf-8'),
+                             digest_size=bits // 8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def are_alpha_equivalent(query_1, query_2):
+    return alpha_normal_text_ast(query_1) == alpha_normal_text_ast(query_2)
@@ -0,0 +1,100 @@
+from .transform import make_atom_node, make_composite_node, define_label, resolve_label
+from .ast_util import wrap_ast
+
+import re
+
+
+# Same terminals as syntax.lark, written out so that reading text ASTs does not need lark
+whitespace_pattern = re.compile(r'[\t\n\r ]+')
+
+atom_pattern = re.compile(r'(?P<IDENTIFIER>[A-Za-z_][A-Za-z_0-9]*)'
+                          r"|(?P<STRING_LITERAL>'(?:\\.|[^'])*'|" r'"(?:\\.|[^"])*")'
+                          r'|(?P<NUMERIC_LITERAL>(?:\.[0-9]+|[+-]?[0-9]+(?:\.(?:[0-9]+)?)?)'
+                          r'(?:[Ee][+-]?[0-9]+)?)'
+                          r'|(?P<PLACEHOLDER>\$[A-Za-z_][A-Za-z_0-9]*)')
+
+label_pattern = re.compile(r'#[0-9]+[=#]')
+
+node_type_pattern = re.compile(r'[A-Za-z]+|\*\*|//|<<|>>|==|!=|<=|>=|[-+*/%&^|~<>]')
+
+
+def syntax_error(text, position, expected):
+    line_start = text.rfind('\n', 0, position) + 1
+    line_end = text.find('\n', position)
+    if line_end == -1:
+        line_end = len(text)
+    line = text.count('\n', 0, position) + 1
+    column = position - line_start + 1
+    if position < len(text):
+        found = repr(text[position])
+    else:
+        found = 'end of text'
+    return SyntaxError('Expected ' + expected + ' but found ' + found
+                       + ' at line ' + str(line) + ' col ' + str(column),
+                       ('<qastle>', line, column, text[line_start:line_end]))
+
+
+def text_ast_to_python_ast(text):
+    length = len(text)
+    match = whitespace_pattern.match(text)
+    position = match.end() if match else 0
+    if position == length:
+        return wrap_ast()
+
+    # Each entry is the node type and fields of a composite whose ")" has not been read yet,
+    # or None and the definition of a label for the node being read
+    stack = []
+    labels = {}
+    while True:
+        if position < length and text[position] == '#':
+            match = label_pattern.match(text, position)
+            if not match:
+                raise syntax_error(text, position, 'a label')
+            position = match.end()
+            if match.group()[-1] == '=':
+                stack.append((None, match.group()))
+                continue
+            node = resolve_label(labels, match.group())
+        elif position < length and text[position] == '(':
+            position += 1
+            match = whitespace_pattern.match(text, position)
+            if match:
+                position = match.end()
+            match = node_type_pattern.match(text, position)
+            if not match:
+                raise syntax_error(text, position, 'a node type')
+            stack.append((match.group(), []))
+            position = match.end()
+            node = None
+        else:
+            match = atom_pattern.match(text, position)
+            if not match:
+                raise syntax_error(text, position, 'a node')
+            node = make_atom_node(match.lastgroup, match.group())
+            position = match.end()
+        if node is not None:
+            while stack and stack[-1][0] is None:
+                node = define_label(labels, stack.pop()[1], node)
+            if stack:
+                stack[-1][1].append(node)
+
+        while True:
+            match = whitespace_pattern.match(text, position)
+            if match:
+                position = match.end()
+            if not stack:
+                if position != length:
+                    raise syntax_error(text, position, 'end of text')
+                return wrap_ast(node)
+            if position < length and text[position] == ')':
+                position += 1
+                node_type, fields = stack.pop()
+                node = make_composite_node(node_type, fields)
+                while stack and stack[-1][0] is None:
+                    node = define_label(labels, stack.pop()[1], node)
+                if stack:
+                    stack[-1][1].append(node)
+            elif match:
+                break
+            else:
+                raise syntax_error(text, position, 'whitespace or ")"')
@@ -1,7 +1,14 @@
-from .ast_util import unwrap_ast
+from .ast_util import unwrap_ast, PostOrderNodeTransformer
+from .registry import node_types, count_phrase, ordinal_words, register_node_class
 
 import ast
 
+__all__ = ['Where', 'Select', 'SelectMany', 'First', 'Last', 'ElementAt', 'Contains', 'Aggregate',
+           'Count', 'Max', 'Min', 'Sum', 'All', 'Any', 'Concat', 'Zip', 'OrderBy',
+           'OrderByDescending', 'Choose', 'Let', 'linq_operator_names',
+           'InsertLINQNodesTransformer', 'insert_linq_nodes', 'RemoveLINQNodesTransformer',
+           'remove_linq_nodes']
+
 
 class Where(ast.AST):
     _fields = ['source', 'predicate']
@@ -79,6 +86,12 @@ class Choose(ast.AST):
     _fields = ['source', 'n']
 
 
+class Let(ast.AST):
+    # Binds value to the argument of func; written by common subexpression elimination, and
+    # not a query operator, so calls named Let are left alone by insert_linq_nodes()
+    _fields = ['value', 'func']
+
+
 linq_operator_names = ('Where',
                        'Select',
                        'SelectMany',
@@ -99,18 +112,41 @@ linq_operator_names = ('Where',
                        'OrderByDescending',
                        'Choose')
 
-
-class InsertLINQNodesTransformer(ast.NodeTransformer):
+register_node_class(Where, lambda_arities={1: 1})
+register_node_class(Select, lambda_arities={1: 1})
+register_node_class(SelectMany, lambda_arities={1: 1})
+register_node_class(First)
+register_node_class(Last)
+register_node_class(ElementAt)
+register_node_class(Contains)
+register_node_class(Aggregate, lambda_arities={2: 2})
+register_node_class(Count)
+register_node_class(Max)
+register_node_class(Min)
+register_node_class(Sum)
+register_node_class(All, lambda_arities={1: 1})
+register_node_class(Any, lambda_arities={1: 1})
+register_node_class(Concat)
+register_node_class(Zip)
+register_node_class(OrderBy, lambda_arities={1: 1})
+register_node_class(OrderByDescending, lambda_arities={1: 1})
+register_node_class(Choose)
+register_node_class(Let, lambda_arities={1: 1}, method_call=False)
+
+
+class InsertLINQNodesTransformer(PostOrderNodeTransformer):
     def visit_Call(self, node):
         if isinstance(node.func, ast.Attribute):
             function_name = node.func.attr
-            if function_name not in linq_operator_names:
+            node_type = node_types.get(function_name)
+            if node_type is None or node_type.node_class is None or not node_type.method_call:
                 return self.generic_visit(node)
             source = node.func.value
-            args = node.args
+            args = list(node.args)
         elif isinstance(node.func, ast.Name):
             function_name = node.func.id
-            if function_name not in linq_operator_names:
+            node_type = node_types.get(function_name)
+            if node_type is None or node_type.node_class is None or not node_type.method_call:
                 return self.generic_visit(node)
             if len(node.args) == 0:
                 raise SyntaxError('LINQ operators must specify a data source to operate on')
@@ -119,126 +155,24 @@ class InsertLINQNodesTransformer(ast.NodeTransformer):
         else:
             return self.generic_visit(node)
 
-        if function_name == 'Where':
-            if len(args) != 1:
-                raise SyntaxError('Where() call must have exactly one argument')
-            if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
-                args[0] = unwrap_ast(ast.parse(args[0].value))
-            if not isinstance(args[0], ast.Lambda):
-                raise SyntaxError('Where() call argument must be a lambda')
-            return Where(source=self.visit(source),
-                         predicate=self.visit(args[0]))
-        elif function_name == 'Select':
-            if len(args) != 1:
-                raise SyntaxError('Select() call must have exactly one argument')
-            if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
-                args[0] = unwrap_ast(ast.parse(args[0].value))
-            if not isinstance(args[0], ast.Lambda):
-                raise SyntaxError('Select() call argument must be a lambda')
-            return Select(source=self.visit(source),
-                          selector=self.visit(args[0]))
-        elif function_name == 'SelectMany':
-            if len(args) != 1:
-                raise SyntaxError('SelectMany() call must have exactly one argument')
-            if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
-                args[0] = unwrap_ast(ast.parse(args[0].value))
-            if not isinstance(args[0], ast.Lambda):
-                raise SyntaxError('SelectMany() call argument must be a lambda')
-            return SelectMany(source=self.visit(source),
-                              selector=self.visit(args[0]))
-        elif function_name == 'First':
-            if len(args) != 0:
-                raise SyntaxError('First() call must have zero arguments')
-            return First(source=self.visit(source))
-        elif function_name == 'Last':
-            if len(args) != 0:
-                raise SyntaxError('Last() call must have zero arguments')
-            return Last(source=self.visit(source))
-        elif function_name == 'ElementAt':
-            if len(args) != 1:
-                raise SyntaxError('ElementAt() call must have exactly one argument')
-            return ElementAt(source=self.visit(source), index=self.visit(args[0]))
-        elif function_name == 'Contains':
-            if len(args) != 1:
-                raise SyntaxError('Contains() call must have exactly one argument')
-            return Contains(source=self.visit(source), value=self.visit(args[0]))
-        elif function_name == 'Aggregate':
-            if len(args) != 2:
-                raise SyntaxError('Aggregate() call must have exactly two arguments; found'
-                                  + str(len(args)))
-            if isinstance(args[1], ast.Constant) and isinstance(args[1].value, str):
-                args[1] = unwrap_ast(ast.parse(args[1].value))
-            if not isinstance(args[1], ast.Lambda):
-                raise SyntaxError('Second Aggregate() call argument must be a lambda')
-            return Aggregate(source=self.visit(source),
-                             seed=self.visit(args[0]),
-                             func=self.visit(args[1]))
-        elif function_name == 'Count':
-            if len(args) != 0:
-                raise SyntaxError('Count() call must have zero arguments')
-            return Count(source=self.visit(source))
-        elif function_name == 'Max':
-            if len(args) != 0:
-                raise SyntaxError('Max() call must have zero arguments')
-            return Max(source=self.visit(source))
-        elif function_name == 'Min':
-            if len(args) != 0:
-                raise SyntaxError('Min() call must have zero arguments')
-            return Min(source=self.visit(source))
-        elif function_name == 'Sum':
-            if len(args) != 0:
-                raise SyntaxError('Sum() call must have zero arguments')
-            return Sum(source=self.visit(source))
-        elif function_name == 'All':
-            if len(args) != 1:
-                raise SyntaxError('All() call must have exactly one argument')
-            if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
-                args[0] = unwrap_ast(ast.parse(args[0].value))
-            if not isinstance(args[0], ast.Lambda):
-                raise SyntaxError('All() call argument must be a lambda')
-            return All(source=self.visit(source),
-                       predicate=self.visit(args[0]))
-        elif function_name == 'Any':
-            if len(args) != 1:
-                raise SyntaxError('Any() call must have exactly one argument')
-            if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
-                args[0] = unwrap_ast(ast.parse(args[0].value))
-            if not isinstance(args[0], ast.Lambda):
-                raise SyntaxError('Any() call argument must be a lambda')
-            return Any(source=self.visit(source),
-                       predicate=self.visit(args[0]))
-        elif function_name == 'Concat':
-            if len(args) != 1:
-                raise SyntaxError('Concat() call must have exactly one argument')
-            return Concat(first=self.visit(source), second=self.visit(args[0]))
-        elif function_name == 'Zip':
-            if len(args) != 0:
-                raise SyntaxError('Zip() call must have zero arguments')
-            return Zip(source=self.visit(source))
-        elif function_name == 'OrderBy':
-            if len(args) != 1:
-                raise SyntaxError('OrderBy() call must have exactly one argument')
-            if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
-                args[0] = unwrap_ast(ast.parse(args[0].value))
-            if not isinstance(args[0], ast.Lambda):
-                raise SyntaxError('OrderBy() call argument must be a lambda')
-            return OrderBy(source=self.visit(source),
-                           key_selector=self.visit(args[0]))
-        elif function_name == 'OrderByDescending':
-            if len(args) != 1:
-                raise SyntaxError('OrderByDescending() call must have exactly one argument')
-            if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
-                args[0] = unwrap_ast(ast.parse(args[0].value))
-            if not isinstance(args[0], ast.Lambda):
-                raise SyntaxError('OrderByDescending() call argument must be a lambda')
-            return OrderByDescending(source=self.visit(source),
-                                     key_selector=self.visit(args[0]))
-        elif function_name == 'Choose':
-            if len(args) != 1:
-                raise SyntaxError('Choose() call must have exactly one argument')
-            return Choose(source=self.visit(source), n=self.visit(args[0]))
-        else:
-            raise NameError('Unhandled LINQ operator: ' + function_name)
+        n_args = node_type.min_fields - 1
+        if len(args) != n_args:
+            if n_args == 0:
+                raise SyntaxError(function_name + '() call must have zero arguments')
+            raise SyntaxError(function_name + '() call must have exactly '
+                              + count_phrase(n_args, 'argument') + '; found ' + str(len(args)))
+        for index, _ in node_type.lambda_arities:
+            arg_index = index - 1
+            arg = args[arg_index]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                arg = args[arg_index] = self.visit(unwrap_ast(ast.parse(arg.value)))
+            if not isinstance(arg, ast.Lambda):
+                if n_args == 1:
+                    ordinal = ''
+                else:
+                    ordinal = ordinal_words[arg_index].capitalize() + ' '
+                raise SyntaxError(ordinal + function_name + '() call argument must be a lambda')
+        return node_type.node_class(source, *args)
 
 
 def insert_linq_nodes(python_ast):
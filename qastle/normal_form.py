@@ -0,0 +1,173 @@
+from .ast_util import PostOrderNodeTransformer, copy_ast
+from .transform import PythonASTToTextASTTransformer
+from .equivalence import as_python_ast
+
+import ast
+import re
+
+__all__ = ['normalize', 'normalize_text_ast']
+
+
+# Operators whose operands can be put in any order
+commutative_ops = (ast.Eq, ast.NotEq)
+
+# Operators whose chains can be regrouped. The operands of and and or are kept in order, since
+# earlier ones may guard the evaluation of later ones; only those of the bitwise operators are
+# also sorted.
+associative_ops = (ast.And, ast.Or, ast.BitAnd, ast.BitOr, ast.BitXor)
+
+commutative_associative_ops = (ast.BitAnd, ast.BitOr, ast.BitXor)
+
+# These are only treated as commutative when one operand is a number, since for sequences they
+# are not
+numeric_commutative_ops = (ast.Add, ast.Mult)
+
+
+def free_names(node):
+    names = set()
+    stack = [(node, frozenset())]
+    while stack:
+        item, bound_names = stack.pop()
+        if isinstance(item, ast.Name):
+            if item.id not in bound_names:
+                names.add(item.id)
+        elif isinstance(item, ast.Lambda):
+            stack.append((item.body, bound_names | {arg.arg for arg in item.args.args}))
+        else:
+            stack.extend((child, bound_names) for child in ast.iter_child_nodes(item))
+    return names
+
+
+def argument_prefix(node):
+    # The prefix for renamed lambda arguments: x, or x followed by enough underscores that no
+    # free name could be mistaken for a renamed argument
+    names = free_names(node)
+    prefix = 'x'
+    while any(re.match(re.escape(prefix) + r'[0-9]+_[0-9]+$', name) for name in names):
+        prefix += '_'
+    return prefix
+
+
+def rename_lambda_arguments(node):
+    # Renames the arguments of every lambda to <prefix><level>_<index>, where level is the
+    # number of lambdas it is nested in and index is the position of the argument. Works on
+    # and returns a copy in which no node is shared, since a node reached through different
+    # lambdas may need different names in each place.
+    prefix = argument_prefix(node)
+    node = copy_ast(node, share_subtrees=False)
+    stack = [(node, {}, 0)]
+    while stack:
+        item, scope, level = stack.pop()
+        if isinstance(item, ast.Name):
+            item.id = scope.get(item.id, item.id)
+        elif isinstance(item, ast.Lambda):
+            scope = dict(scope)
+            for index, arg in enumerate(item.args.args):
+                scope[arg.arg] = arg.arg = prefix + str(level) + '_' + str(index)
+            stack.append((item.body, scope, level + 1))
+        else:
+            stack.extend((child, scope, level) for child in ast.iter_child_nodes(item))
+    return node
+
+
+class NormalizingTransformer(PostOrderNodeTransformer):
+    # Rewrites the parts of a query that have more than one text AST for the same meaning:
+    # tuples become lists, chained comparisons and boolean operations become nested pairs
+    # as in the text AST, and the operands of commutative operators are sorted by their text.
+    # A chain of the same associative operator is flattened, and sorted if it is commutative,
+    # once, at its root, so that long chains take linear rather than quadratic time.
+
+    def visit(self, node):
+        self.chain_links = set()
+        for item in ast.walk(node):
+            if isinstance(item, ast.BoolOp):
+                operands = item.values
+            elif isinstance(item, ast.BinOp) and isinstance(item.op, associative_ops):
+                operands = [item.left, item.right]
+            else:
+                continue
+            for operand in operands:
+                if (isinstance(operand, item.__class__)
+                   and operand.op.__class__ is item.op.__class__):
+                    self.chain_links.add(id(operand))
+        return super().visit(node)
+
+    def operand_key(self, node):
+        return PythonASTToTextASTTransformer().visit(node)
+
+    def visit_Tuple(self, node):
+        return ast.List(elts=node.elts, ctx=ast.Load())
+
+    def visit_Compare(self, node):
+        left = node.left
+        comparisons = []
+        for operator, comparator in zip(node.ops, node.comparators):
+            comparisons.append(self.normalize_comparison(ast.Compare(left=left,
+                                                                     ops=[operator],
+                                                                     comparators=[comparator])))
+            left = comparator
+        if len(comparisons) == 1:
+            return comparisons[0]
+        return self.visit_BoolOp(ast.BoolOp(op=ast.And(), values=comparisons))
+
+    def normalize_comparison(self, node):
+        if isinstance(node.ops[0], commutative_ops):
+            left, right = sorted([node.left, node.comparators[0]], key=self.operand_key)
+            node.left = left
+            node.comparators = [right]
+        return node
+
+    def visit_BoolOp(self, node):
+        if id(node) in self.chain_links:
+            return node
+        operands = self.associative_operands(node, ast.BoolOp, lambda item: item.values)
+        result = operands[0]
+        for operand in operands[1:]:
+            result = ast.BoolOp(op=node.op.__class__(), values=[result, operand])
+        return result
+
+    def visit_BinOp(self, node):
+        if isinstance(node.op, associative_ops):
+            if id(node) in self.chain_links:
+                return node
+            operands = self.associative_operands(node,
+                                                 ast.BinOp,
+                                                 lambda item: [item.left, item.right])
+            result = operands[0]
+            for operand in operands[1:]:
+                result = ast.BinOp(left=result, op=node.op.__class__(), right=operand)
+            return result
+        if isinstance(node.op, numeric_commutative_ops) and any(
+                isinstance(operand, ast.Constant) and isinstance(operand.value, (int, float))
+                for operand in (node.left, node.right)):
+            node.left, node.right = sorted([node.left, node.right], key=self.operand_key)
+        return node
+
+    def associative_operands(self, node, node_class, get_operands):
+        # All operands of a tree of the same associative operator, in order, or sorted if the
+        # operator is also commutative
+        operator_class = node.op.__class__
+        operands = []
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, node_class) and item.op.__class__ is operator_class:
+                stack.extend(reversed(get_operands(item)))
+            else:
+                operands.append(item)
+        if isinstance(node.op, commutative_associative_ops):
+            operands.sort(key=self.operand_key)
+        return operands
+
+
+def normalize(python_ast):
+    # Rewrites a query into a canonical form, so that queries that differ only in the names
+    # of lambda arguments, the order of commutative operands, or how comparisons, boolean
+    # operations, and sequences are grouped and written become identical. The AST is not
+    # modified; the result is a new tree. LINQ nodes must already have been inserted.
+    return NormalizingTransformer().visit(rename_lambda_arguments(python_ast))
+
+
+def normalize_text_ast(query):
+    # The canonical text AST of a text AST or Python AST
+    return PythonASTToTextASTTransformer().visit(normalize(as_python_ast(query)))
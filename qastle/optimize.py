@@ -0,0 +1,597 @@
+from .ast_util import PostOrderNodeTransformer, copy_ast, constant_value, Placeholder
+from .linq_util import (Where, Select, SelectMany, Count, All, Any, OrderBy, OrderByDescending,
+                        Let)
+from .registry import node_classes
+from .normal_form import free_names
+from .equivalence import as_python_ast
+from .transform import PythonASTToTextASTTransformer, make_lambda
+
+import ast
+import sys
+
+__all__ = ['optimization_rules', 'optimize_query', 'optimize_text_ast',
+           'eliminate_common_subexpressions', 'eliminate_common_subexpressions_text_ast']
+
+
+def all_names(node):
+    # Every name used or bound anywhere in node
+    names = set()
+    for item in ast.walk(node):
+        if isinstance(item, ast.Name):
+            names.add(item.id)
+        elif isinstance(item, ast.arg):
+            names.add(item.arg)
+    return names
+
+
+def fresh_name(name, used_names):
+    index = 1
+    while name + '_' + str(index) in used_names:
+        index += 1
+    return name + '_' + str(index)
+
+
+def substitute_name(node, name, replacement):
+    # Replaces every free occurrence of name in node with a copy of replacement and returns
+    # the result; node is modified in place, so it must not be shared with any other part of
+    # a query. Arguments of lambdas in node that would capture a free name of replacement are
+    # renamed first.
+    if isinstance(node, ast.Name):
+        return copy_ast(replacement) if node.id == name else node
+    replacement_names = free_names(replacement)
+    used_names = None
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, ast.Lambda):
+            arguments = [arg.arg for arg in item.args.args]
+            if name in arguments:
+                continue
+            for arg in item.args.args:
+                if arg.arg in replacement_names:
+                    if used_names is None:
+                        used_names = all_names(node) | all_names(replacement)
+                    new_name = fresh_name(arg.arg, used_names)
+                    used_names.add(new_name)
+                    item.body = substitute_name(item.body,
+                                                arg.arg,
+                                                ast.Name(id=new_name, ctx=ast.Load()))
+                    arg.arg = new_name
+        for field, value in ast.iter_fields(item):
+            if isinstance(value, ast.Name):
+                if value.id == name:
+                    setattr(item, field, copy_ast(replacement))
+            elif isinstance(value, ast.AST):
+                stack.append(value)
+            elif isinstance(value, list):
+                for index, element in enumerate(value):
+                    if isinstance(element, ast.Name):
+                        if element.id == name:
+                            value[index] = copy_ast(replacement)
+                    elif isinstance(element, ast.AST):
+                        stack.append(element)
+    return node
+
+
+def beta_reduce(function, argument):
+    # The body of a one-argument lambda applied to argument
+    return substitute_name(function.body, function.args.args[0].arg, argument)
+
+
+def avoid_capture(function, other):
+    # Renames the argument of a one-argument lambda if other, whose body is about to be put
+    # under it, uses that name for something else
+    argument = function.args.args[0]
+    if argument.arg in free_names(other):
+        new_name = fresh_name(argument.arg, all_names(function) | all_names(other))
+        function.body = substitute_name(function.body, argument.arg,
+                                        ast.Name(id=new_name, ctx=ast.Load()))
+        argument.arg = new_name
+
+
+def fuse_where(node):
+    # (Where (Where source (lambda (list x) p)) (lambda (list y) q))
+    #     -> (Where source (lambda (list x) (and p q[y := x])))
+    if not (isinstance(node, Where) and isinstance(node.source, Where)):
+        return None
+    inner = node.source
+    avoid_capture(inner.predicate, node.predicate)
+    inner_argument = ast.Name(id=inner.predicate.args.args[0].arg, ctx=ast.Load())
+    body = ast.BoolOp(op=ast.And(),
+                      values=[inner.predicate.body, beta_reduce(node.predicate, inner_argument)])
+    return Where(inner.source, ast.Lambda(args=inner.predicate.args, body=body))
+
+
+def count_evaluations(node, name):
+    # How many times evaluating node evaluates the free name, where a use inside a lambda
+    # other than one that is called right away or bound by Let counts as two, since such a
+    # lambda may be evaluated any number of times
+    count = 0
+    stack = [(node, 1)]
+    while stack:
+        item, weight = stack.pop()
+        if isinstance(item, ast.Name):
+            if item.id == name:
+                count += weight
+            continue
+        if isinstance(item, ast.Lambda):
+            if name in [arg.arg for arg in item.args.args]:
+                continue
+            stack.append((item.body, weight))
+            continue
+        for field, child in ast.iter_fields(item):
+            children = child if isinstance(child, list) else [child]
+            for element in children:
+                if not isinstance(element, ast.AST):
+                    continue
+                if isinstance(element, ast.Lambda) and not (
+                        (isinstance(item, ast.Call) and field == 'func')
+                        or (isinstance(item, Let) and field == 'func')):
+                    stack.append((element, 2))
+                else:
+                    stack.append((element, weight))
+    return count
+
+
+def is_cheap(node):
+    # Whether node is an atom or a chain of attributes, which costs nothing to evaluate again
+    while isinstance(node, ast.Attribute):
+        node = node.value
+    return isinstance(node, (ast.Name, ast.Constant, Placeholder))
+
+
+def fuse_select(node):
+    # (Select (Select source (lambda (list x) f)) (lambda (list y) g))
+    #     -> (Select source (lambda (list x) g[y := f]))
+    # when g evaluates y at most once or f is cheap, so that f is not computed more often
+    if not (isinstance(node, Select) and isinstance(node.source, Select)):
+        return None
+    inner = node.source
+    if not (is_cheap(inner.selector.body)
+            or count_evaluations(node.selector.body, node.selector.args.args[0].arg) <= 1):
+        return None
+    avoid_capture(inner.selector, node.selector)
+    return Select(inner.source,
+                  ast.Lambda(args=inner.selector.args,
+                             body=beta_reduce(node.selector, inner.selector.body)))
+
+
+def substituted_parts(function, replacement):
+    # The parts of replacement that substituting it for the argument of a one-argument lambda
+    # copies into the body: the elements it reads if replacement is a list, tuple, or dict
+    # literal that it only reads elements of, and otherwise replacement itself, if it is used
+    name = function.args.args[0].arg
+    keys = projection_keys(replacement)
+    if keys is not None:
+        uses = projection_uses(function, replacement, keys)
+        if uses is not None:
+            elements = (replacement.values if isinstance(replacement, ast.Dict)
+                        else replacement.elts)
+            return [elements[keys[key]] for _, key in uses]
+    if count_evaluations(function.body, name) == 0:
+        return []
+    return [replacement]
+
+
+def push_where_below_select(node):
+    # (Where (Select source (lambda (list x) f)) (lambda (list y) p))
+    #     -> (Select (Where source (lambda (list x) p[y := f])) (lambda (list x) f))
+    # so that elements are dropped before they are projected, when the parts of f that p
+    # reads are cheap, since they are then computed again for each element that is kept
+    if not (isinstance(node, Where) and isinstance(node.source, Select)
+            and isinstance(node.predicate, ast.Lambda)
+            and len(node.predicate.args.args) == 1):
+        return None
+    select = node.source
+    if not all(is_cheap(part)
+               for part in substituted_parts(node.predicate, select.selector.body)):
+        return None
+    avoid_capture(select.selector, node.predicate)
+    predicate = ast.Lambda(args=copy_ast(select.selector.args),
+                           body=beta_reduce(node.predicate, select.selector.body))
+    return Select(Where(select.source, predicate), select.selector)
+
+
+def push_where_into_select_many_source(node):
+    # (Where (SelectMany source (lambda (list x) (Select c (lambda (list z) f))))
+    #        (lambda (list y) p))
+    #     -> (SelectMany (Where source (lambda (list x) p[y := f]))
+    #                    (lambda (list x) (Select c (lambda (list z) f))))
+    # when p[y := f] only depends on x, so that whole outer elements are dropped before their
+    # collections are expanded
+    if not (isinstance(node, Where) and isinstance(node.source, SelectMany)
+            and isinstance(node.source.selector.body, Select)):
+        return None
+    select_many = node.source
+    inner_select = select_many.selector.body
+    avoid_capture(select_many.selector, node.predicate)
+    inner_argument = inner_select.selector.args.args[0].arg
+    if inner_argument in free_names(node.predicate):
+        return None
+    body = beta_reduce(copy_ast(node.predicate), copy_ast(inner_select.selector.body))
+    body = simplify_projections(body)
+    if inner_argument in free_names(body):
+        return None
+    predicate = ast.Lambda(args=copy_ast(select_many.selector.args), body=body)
+    return SelectMany(Where(select_many.source, predicate), select_many.selector)
+
+
+def dict_literal_value(node, key):
+    # The value for key in a dict literal whose keys are all constants, or raises KeyError
+    values = {}
+    for dict_key, value in zip(node.keys, node.values):
+        values[constant_value(dict_key)] = value
+    return values[key]
+
+
+def simplify_projection(node):
+    # Selects an element of a literal right away:
+    # (subscript (list a b c) 1) -> b, (subscript (dict (list 'k') (list v)) 'k') -> v, and,
+    # as func_adl reads attributes of dicts, (attr (dict (list 'k') (list v)) 'k') -> v
+    try:
+        if isinstance(node, ast.Subscript):
+            index = constant_value(node.slice)
+            if isinstance(node.value, (ast.List, ast.Tuple)):
+                if (isinstance(index, int) and not isinstance(index, bool)
+                   and -len(node.value.elts) <= index < len(node.value.elts)):
+                    return node.value.elts[index]
+            elif isinstance(node.value, ast.Dict):
+                return dict_literal_value(node.value, index)
+        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Dict):
+            return dict_literal_value(node.value, node.attr)
+    except (KeyError, TypeError):
+        pass
+    return None
+
+
+def simplify_projections(node):
+    # Applies simplify_projection throughout node
+    return OptimizingTransformer([simplify_projection]).visit(node)
+
+
+# Operators whose results are elements of their sources, and the fields of their lambdas
+pass_through_operators = {Where: 'predicate', OrderBy: 'key_selector',
+                          OrderByDescending: 'key_selector'}
+
+# Operators that read their sources' elements only through their lambdas, or not at all, and
+# do not give them back, with the fields of their lambdas
+projection_consumers = {Select: 'selector', SelectMany: 'selector', All: 'predicate',
+                        Any: 'predicate', Count: None}
+
+
+def projection_keys(node):
+    # The position of the element for each key with which a list, tuple, or dict literal can
+    # be read, or None if node is none of these or has keys that are not distinct constants
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return {index: index for index in range(len(node.elts))}
+    if isinstance(node, ast.Dict):
+        keys = {}
+        try:
+            for position, key in enumerate(node.keys):
+                key = constant_value(key)
+                if key in keys or isinstance(key, bool):
+                    return None
+                keys[key] = position
+        except (KeyError, TypeError):
+            return None
+        return keys
+    return None
+
+
+def projection_key(node, name, literal):
+    # The key with which node reads an element of literal from the argument name, or None
+    if isinstance(node, ast.Subscript):
+        if not (isinstance(node.value, ast.Name) and node.value.id == name):
+            return None
+        try:
+            key = constant_value(node.slice)
+        except KeyError:
+            return None
+        if isinstance(literal, ast.Dict):
+            return key
+        if isinstance(key, int) and not isinstance(key, bool) and key < 0:
+            return key + len(literal.elts)
+        return key
+    if (isinstance(node, ast.Attribute) and isinstance(literal, ast.Dict)
+       and isinstance(node.value, ast.Name) and node.value.id == name):
+        # func_adl reads the entries of dicts as attributes
+        return node.attr
+    return None
+
+
+def projection_uses(function, literal, keys):
+    # The (node, key) pairs through which a one-argument lambda reads the elements of literal
+    # from its argument, or None if it uses the argument in any other way
+    name = function.args.args[0].arg
+    uses = []
+    stack = [function.body]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, ast.Name) and item.id == name:
+            return None
+        if isinstance(item, ast.Lambda) and name in [arg.arg for arg in item.args.args]:
+            continue
+        key = projection_key(item, name, literal)
+        if key is not None:
+            try:
+                if key not in keys:
+                    return None
+            except TypeError:
+                return None
+            uses.append((item, key))
+            continue
+        stack.extend(ast.iter_child_nodes(item))
+    return uses
+
+
+def prune_projection(node):
+    # (Select (Select source (lambda (list x) (list a b c))) (lambda (list y) (subscript y 2)))
+    #     -> (Select (Select source (lambda (list x) (list c))) (lambda (list y) (subscript y 0)))
+    # and likewise for dicts and through Where, OrderBy, and OrderByDescending: elements of a
+    # projection that nothing reads are dropped, so they are never computed. The operators
+    # and lambdas that change are rebuilt rather than modified, as they may be shared.
+    if node.__class__ not in projection_consumers:
+        return None
+    chain = [node]
+    source = node.source
+    while source.__class__ in pass_through_operators:
+        chain.append(source)
+        source = source.source
+    if not (isinstance(source, Select) and isinstance(source.selector, ast.Lambda)):
+        return None
+    literal = source.selector.body
+    keys = projection_keys(literal)
+    if keys is None:
+        return None
+    functions = []
+    uses = []
+    for operator in chain:
+        field = (projection_consumers if operator is node
+                 else pass_through_operators)[operator.__class__]
+        if field is None:
+            functions.append(None)
+            continue
+        function = getattr(operator, field)
+        if not (isinstance(function, ast.Lambda) and len(function.args.args) == 1):
+            return None
+        function_uses = projection_uses(function, literal, keys)
+        if function_uses is None:
+            return None
+        functions.append(function)
+        uses.extend(function_uses)
+    used_positions = sorted(set(keys[key] for _, key in uses))
+    if len(used_positions) == len(keys):
+        return None
+    if isinstance(literal, ast.Dict):
+        new_literal = ast.Dict(keys=[literal.keys[position] for position in used_positions],
+                               values=[literal.values[position] for position in used_positions])
+    else:
+        new_literal = literal.__class__(elts=[literal.elts[position]
+                                              for position in used_positions],
+                                        ctx=ast.Load())
+        new_indices = {position: index for index, position in enumerate(used_positions)}
+        for index, function in enumerate(functions):
+            if function is None:
+                continue
+            functions[index] = function = copy_ast(function, share_subtrees=False)
+            for use, key in projection_uses(function, literal, keys):
+                new_index = ast.Constant(value=new_indices[key], kind=None)
+                if sys.version_info < (3, 9):
+                    new_index = ast.Index(value=new_index)
+                use.slice = new_index
+    new_node = Select(source.source, ast.Lambda(args=source.selector.args, body=new_literal))
+    for operator, function in reversed(list(zip(chain, functions))):
+        if function is None:
+            new_node = operator.__class__(new_node)
+        else:
+            new_node = operator.__class__(new_node, function)
+    return new_node
+
+
+def number_subtrees(root):
+    # Numbers every subtree of root so that equal subtrees, and only those, get the same
+    # number. Gives, by the id() of each node, its number, its size, and its free names.
+    numbers = {}
+    sizes = {}
+    free = {}
+    interned = {}
+    stack = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if id(node) in numbers:
+            continue
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in ast.iter_child_nodes(node))
+            continue
+        key = [node.__class__]
+        size = 1
+        names = set()
+        for _, value in ast.iter_fields(node):
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                if isinstance(item, ast.AST):
+                    key.append(numbers[id(item)])
+                    size += sizes[id(item)]
+                    names |= free[id(item)]
+                else:
+                    key.append((item.__class__, item))
+            key.append(None)
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.Lambda):
+            names -= set(arg.arg for arg in node.args.args)
+        numbers[id(node)] = interned.setdefault(tuple(key), len(interned))
+        sizes[id(node)] = size
+        free[id(node)] = frozenset(names)
+    return numbers, sizes, free
+
+
+def is_common_subexpression_candidate(node):
+    # Whether node is worth binding to a name when it occurs more than once
+    if isinstance(node, (ast.Name, ast.Constant, ast.Lambda, Placeholder)):
+        return False
+    if isinstance(node, ast.UnaryOp) and isinstance(node.operand, ast.Constant):
+        return False
+    return isinstance(node, ast.expr) or node.__class__ in node_classes
+
+
+def common_subexpression_occurrences(function):
+    # For each candidate in the body of a lambda, by subtree number: where it occurs as
+    # (parent, field, index) with none of its free names bound inside the lambda, in order.
+    # Also gives the numbers of those with an occurrence that is evaluated whenever the body
+    # is, which is not the case inside lambdas other than those of Let, in the branches of an
+    # if, or in the operands of and and or after the first. Occurrences that are called, as
+    # methods, are left out: binding one would bind a bound method, which backends cannot
+    # evaluate.
+    numbers, sizes, free = number_subtrees(function.body)
+    occurrences = {}
+    always_evaluated = set()
+    stack = [(function, 'body', None, frozenset(), True)]
+    while stack:
+        parent, field, index, bound, unconditional = stack.pop()
+        node = getattr(parent, field)
+        if index is not None:
+            node = node[index]
+        if (is_common_subexpression_candidate(node) and not (free[id(node)] & bound)
+                and not (isinstance(parent, ast.Call) and field == 'func')):
+            number = numbers[id(node)]
+            occurrences.setdefault(number, []).append((parent, field, index))
+            if unconditional:
+                always_evaluated.add(number)
+        if isinstance(node, ast.Lambda):
+            children = [(node, 'body', None,
+                         bound | set(arg.arg for arg in node.args.args), False)]
+        elif isinstance(node, Let) and isinstance(node.func, ast.Lambda):
+            children = [(node, 'value', None, bound, unconditional),
+                        (node.func, 'body', None,
+                         bound | set(arg.arg for arg in node.func.args.args), unconditional)]
+        elif isinstance(node, ast.IfExp):
+            children = [(node, 'test', None, bound, unconditional),
+                        (node, 'body', None, bound, False),
+                        (node, 'orelse', None, bound, False)]
+        elif isinstance(node, ast.BoolOp):
+            children = [(node, 'values', value_index, bound, unconditional and value_index == 0)
+                        for value_index in range(len(node.values))]
+        else:
+            children = []
+            for child_field, value in ast.iter_fields(node):
+                if isinstance(value, ast.AST):
+                    children.append((node, child_field, None, bound, unconditional))
+                elif isinstance(value, list):
+                    children.extend((node, child_field, child_index, bound, unconditional)
+                                    for child_index, item in enumerate(value)
+                                    if isinstance(item, ast.AST))
+        stack.extend(reversed(children))
+    return occurrences, always_evaluated, sizes
+
+
+def hoist_common_subexpression(node):
+    # (lambda (list e) (list (f e) (g (f e))))
+    #     -> (lambda (list e) (Let (f e) (lambda (list v_1) (list v_1 (g v_1)))))
+    # for the largest expression that the body of a lambda evaluates more than once, at
+    # least once whenever the body is evaluated. Expressions in the query language have no
+    # side effects, so evaluating one once instead of several times gives the same results.
+    if not isinstance(node, ast.Lambda):
+        return None
+    occurrences, always_evaluated, sizes = common_subexpression_occurrences(node)
+    best_positions = None
+    best_size = 0
+    for number, positions in occurrences.items():
+        if len(positions) < 2 or number not in always_evaluated:
+            continue
+        parent, field, index = positions[0]
+        value = getattr(parent, field)
+        if index is not None:
+            value = value[index]
+        if sizes[id(value)] > best_size:
+            best_positions = positions
+            best_size = sizes[id(value)]
+            best_value = value
+    if best_positions is None:
+        return None
+    name = fresh_name('v', all_names(node))
+    for parent, field, index in best_positions:
+        replacement = ast.Name(id=name, ctx=ast.Load())
+        if index is None:
+            setattr(parent, field, replacement)
+        else:
+            getattr(parent, field)[index] = replacement
+    node.body = Let(best_value,
+                    make_lambda([ast.List(elts=[ast.Name(id=name, ctx=ast.Load())],
+                                          ctx=ast.Load()),
+                                 node.body]))
+    return node
+
+
+# Each rule takes a node whose fields have already been optimized and returns the node to
+# replace it with, or None if it does not apply. Rules are tried in this order.
+optimization_rules = {'fuse_where': fuse_where,
+                      'fuse_select': fuse_select,
+                      'push_where_below_select': push_where_below_select,
+                      'push_where_into_select_many_source': push_where_into_select_many_source,
+                      'simplify_projection': simplify_projection,
+                      'prune_projection': prune_projection}
+
+
+class OptimizingTransformer(PostOrderNodeTransformer):
+    # Applies the rules to every node until none of them applies to it. changed records
+    # whether any rule applied.
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.changed = False
+
+    def generic_visit(self, node):
+        applied = True
+        while applied:
+            applied = False
+            for rule in self.rules:
+                new_node = rule(node)
+                if new_node is not None:
+                    node = new_node
+                    self.changed = True
+                    applied = True
+        return node
+
+
+def apply_rules(python_ast, rules):
+    # Applies the rules until none applies anywhere
+    while True:
+        transformer = OptimizingTransformer(rules)
+        python_ast = transformer.visit(python_ast)
+        if not transformer.changed:
+            return python_ast
+
+
+def optimize_query(query, disabled_rules=()):
+    # Rewrites a query into an equivalent one that makes fewer passes over the data, until no
+    # rule applies anywhere. query may be a text AST or a Python AST; LINQ nodes must already
+    # have been inserted. The rules named in disabled_rules are not used. The result is a new
+    # tree in which no node is shared, since the rules modify nodes in place; query itself is
+    # not modified.
+    for name in disabled_rules:
+        if name not in optimization_rules:
+            raise ValueError('Unknown optimization rule: ' + str(name) + '; must be one of '
+                             + ', '.join(optimization_rules))
+    rules = [rule for name, rule in optimization_rules.items() if name not in disabled_rules]
+    return apply_rules(copy_ast(as_python_ast(query), share_subtrees=False), rules)
+
+
+def optimize_text_ast(query, disabled_rules=()):
+    return PythonASTToTextASTTransformer().visit(optimize_query(query,
+                                                                disabled_rules=disabled_rules))
+
+
+def eliminate_common_subexpressions(query):
+    # Binds every expression that a lambda body evaluates more than once to a name with Let,
+    # so that it is only computed once each time the body is evaluated. query may be a text
+    # AST or a Python AST; LINQ nodes must already have been inserted. As with
+    # optimize_query(), the result is a new tree in which no node is shared, and query itself
+    # is not modified. Not one of the optimization rules, since backends have to support Let.
+    return apply_rules(copy_ast(as_python_ast(query), share_subtrees=False),
+                       [hoist_common_subexpression])
+
+
+def eliminate_common_subexpressions_text_ast(query):
+    return PythonASTToTextASTTransformer().visit(eliminate_common_subexpressions(query))
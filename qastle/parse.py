@@ -1,14 +1,154 @@
-import lark
-
+import hashlib
 import os
+import pprint
+import threading
+
+# Parser, which is built when it is first read, is also public
+__all__ = ['syntax_specification_pathname', 'parse', 'parse_to_python_ast']
 
 
 syntax_specification_pathname = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                              'syntax.lark')
 
-with open(syntax_specification_pathname) as syntax_specification_file:
-    Parser = lark.Lark(syntax_specification_file.read(), start='record', maybe_placeholders=False)
+serialized_parser_pathname = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          'syntax_lalr.py')
+
+parser_options = {'start': 'record', 'maybe_placeholders': False}
+
+parser_names = ('lalr', 'earley')
+
+# Parsers are built on first use rather than at import time, and each thread builds its own, so
+# no lark object is ever used by two threads at once. That makes parsing thread-safe without
+# relying on lark's parsers being reentrant, and lets threads parse in parallel without
+# contending for shared objects on free-threaded builds. Loading the pregenerated LALR tables
+# takes about a millisecond per thread. 'lalr' and 'earley' produce lark trees;
+# 'lalr_transforming' runs TextASTToPythonASTTransformer while it parses.
+parsers = threading.local()
+
+
+def read_syntax_specification():
+    with open(syntax_specification_pathname) as syntax_specification_file:
+        return syntax_specification_file.read()
+
+
+def syntax_specification_sha256():
+    return hashlib.sha256(read_syntax_specification().encode('utf-8')).hexdigest()
+
+
+def load_serialized_parser(transformer=None):
+    # Loads the LALR tables pregenerated in syntax_lalr.py, which is much faster than
+    # analyzing the grammar. Returns None if they are stale or were made by a different
+    # version of lark, in which case the parser has to be built from the grammar.
+    import lark
+    try:
+        from . import syntax_lalr
+    except ImportError:
+        return None
+    if (syntax_lalr.syntax_specification_sha256 != syntax_specification_sha256()
+       or syntax_lalr.lark_version.split('.')[:2] != lark.__version__.split('.')[:2]):
+        return None
+    try:
+        return lark.Lark._load_from_dict(syntax_lalr.DATA,
+                                         syntax_lalr.MEMO,
+                                         transformer=transformer)
+    except Exception:
+        return None
+
+
+def build_parser(parser='lalr', transformer=None, use_serialized=True):
+    import lark
+    if parser == 'lalr' and use_serialized:
+        serialized_parser = load_serialized_parser(transformer=transformer)
+        if serialized_parser is not None:
+            return serialized_parser
+    return lark.Lark(read_syntax_specification(),
+                     parser=parser,
+                     transformer=transformer,
+                     **parser_options)
+
+
+def get_parser(parser='lalr'):
+    if parser not in parser_names:
+        raise ValueError('Unknown parser: ' + str(parser) + '; must be one of '
+                         + ', '.join(sorted(parser_names)))
+    return get_or_build_parser(parser, lambda: build_parser(parser))
+
+
+def get_transforming_parser():
+    from .transform import TextASTToPythonASTTransformer
+    return get_or_build_parser('lalr_transforming',
+                               lambda: build_parser('lalr',
+                                                    transformer=TextASTToPythonASTTransformer()))
+
+
+def get_or_build_parser(key, build):
+    parser = getattr(parsers, key, None)
+    if parser is None:
+        parser = build()
+        setattr(parsers, key, parser)
+    return parser
+
+
+def __getattr__(name):
+    if name == 'Parser':
+        return get_parser('lalr')
+    elif name == 'TransformingParser':
+        return get_transforming_parser()
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+
+def parse(text, parser='lalr'):
+    return get_parser(parser).parse(text)
+
+
+def parse_to_python_ast(text):
+    parser = get_transforming_parser()
+    parser.options.transformer.reset_labels()
+    return parser.parse(text)
+
+
+def lark_syntax_error(text, error):
+    # The SyntaxError, worded and positioned as the fast backend's, for a syntax error lark
+    # raised while reading text, or None if error is not one
+    from lark.exceptions import UnexpectedInput, UnexpectedToken, UnexpectedEOF
+    from .fastparse import syntax_error
+    if not isinstance(error, UnexpectedInput):
+        return None
+    if isinstance(error, UnexpectedEOF) or (isinstance(error, UnexpectedToken)
+                                            and error.token.type == '$END'):
+        position = len(text)
+    else:
+        position = error.pos_in_stream
+    expected = set(getattr(error, 'expected', None) or getattr(error, 'allowed', None) or ())
+    if 'NODE_TYPE' in expected:
+        description = 'a node type'
+    elif 'RPAR' in expected:
+        description = 'whitespace or ")"'
+    elif expected - {'_WHITESPACE'}:
+        description = 'a node'
+    else:
+        description = 'end of text'
+    return syntax_error(text, position, description)
+
+
+def format_literal(name, value):
+    return (name + ' = (\n    '
+            + pprint.pformat(value, width=95).replace('\n', '\n    ')
+            + ')\n')
 
 
-def parse(text):
-    return Parser.parse(text)
+def write_serialized_parser(pathname=serialized_parser_pathname):
+    # Regenerates syntax_lalr.py; run this after any change to syntax.lark
+    import lark
+    from lark.grammar import Rule
+    from lark.lexer import TerminalDef
+    parser = build_parser('lalr', use_serialized=False)
+    data, memo = parser.memo_serialize([TerminalDef, Rule])
+    with open(pathname, 'w') as serialized_parser_file:
+        serialized_parser_file.write('# Generated from syntax.lark by'
+                                     ' qastle.parse.write_serialized_parser(); do not edit\n\n'
+                                     + 'syntax_specification_sha256 = '
+                                     + repr(syntax_specification_sha256()) + '\n\n'
+                                     + 'lark_version = ' + repr(lark.__version__) + '\n\n'
+                                     + format_literal('DATA', data) + '\n'
+                                     + format_literal('MEMO', memo))
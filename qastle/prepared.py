@@ -0,0 +1,164 @@
+from .ast_util import Placeholder
+from .transform import PythonASTToTextASTTransformer
+from .equivalence import as_python_ast
+
+import ast
+import functools
+import math
+
+__all__ = ['PreparedQuery', 'prepare']
+
+
+class TemplateTextASTTransformer(PythonASTToTextASTTransformer):
+    # Writes the text AST of a template split at its placeholders: a list of texts, and the
+    # names of the placeholders that go between them
+
+    def split(self, node):
+        self.parts = []
+        self.names = []
+        self.chunks = []
+        self.write(node, self.chunks.append)
+        self.parts.append(''.join(self.chunks))
+        return self.parts, self.names
+
+    def visit_Placeholder(self, node):
+        return functools.partial(self.end_part, node.name)
+
+    def end_part(self, name):
+        self.parts.append(''.join(self.chunks))
+        self.chunks.clear()
+        self.names.append(name)
+
+
+# Subclasses of these, such as enums, are not accepted, since their repr() need not be a
+# literal
+literal_types = (int, float, str, bool, type(None))
+
+
+def check_literal(value):
+    if type(value) not in literal_types:
+        raise ValueError('Placeholder values must be numbers, strings, booleans, or None;'
+                         + ' found ' + str(type(value)))
+    if type(value) is float and not math.isfinite(value):
+        raise ValueError('Placeholder values must be finite; found ' + repr(value))
+    if type(value) is int:
+        try:
+            repr(value)
+        except ValueError:
+            raise ValueError('Placeholder value has too many digits to be written: '
+                             + str(value.bit_length()) + ' bits') from None
+
+
+def literal_text(value):
+    # The text AST of a value bound to a placeholder, which is also what writing the Python
+    # AST from literal_node() gives
+    check_literal(value)
+    return repr(value)
+
+
+def literal_node(value):
+    # The node parsing literal_text(value) gives, so that binding and then writing the text
+    # AST is the same as binding the text AST
+    check_literal(value)
+    if isinstance(value, (int, float)) and math.copysign(1, value) < 0:
+        return ast.UnaryOp(op=ast.USub(), operand=ast.Constant(value=-value, kind=None))
+    return ast.Constant(value=value, kind=None)
+
+
+class PreparedQuery(object):
+    # A query with $<name> placeholders that has been parsed and checked once, so that
+    # variants differing only in the constants given for the placeholders can be made
+    # without parsing or laying out the rest of the query again. bind_text() fills the values
+    # into the text AST split at the placeholders. bind() copies only the nodes on the paths
+    # from the root to the placeholders; the rest of the Python AST it returns is shared with
+    # the template and every other bound AST, so it must be copied with copy_ast() before
+    # being modified in place.
+
+    def __init__(self, query):
+        self.python_ast = as_python_ast(query)
+        text_parts, self.placeholder_occurrences = TemplateTextASTTransformer().split(
+            self.python_ast)
+        self.placeholder_names = frozenset(self.placeholder_occurrences)
+        self.text_format = '{}'.join(part.replace('{', '{{').replace('}', '}}')
+                                     for part in text_parts)
+        self.copy_plan = self.make_copy_plan()
+
+    def make_copy_plan(self):
+        # In post-order, each node that has a placeholder under it, with the fields to replace:
+        # (field, source) for single nodes and (field, [(index, source), ...]) for lists. A
+        # source is the name of a placeholder or the position in the plan of the node whose
+        # copy goes there.
+        reverse_post_order = []
+        stack = [self.python_ast]
+        while stack:
+            item = stack.pop()
+            reverse_post_order.append(item)
+            stack.extend(ast.iter_child_nodes(item))
+
+        plan = []
+        positions = {}
+
+        def source(node):
+            if isinstance(node, Placeholder):
+                return node.name
+            return positions.get(id(node))
+
+        for item in reversed(reverse_post_order):
+            if id(item) in positions or isinstance(item, Placeholder):
+                continue
+            node_fields = []
+            list_fields = []
+            for field, value in ast.iter_fields(item):
+                if isinstance(value, list):
+                    elements = [(index, source(element)) for index, element in enumerate(value)
+                                if isinstance(element, ast.AST) and source(element) is not None]
+                    if elements:
+                        list_fields.append((field, elements))
+                elif isinstance(value, ast.AST) and source(value) is not None:
+                    node_fields.append((field, source(value)))
+            if node_fields or list_fields:
+                positions[id(item)] = len(plan)
+                plan.append((item.__class__, item.__dict__, node_fields, list_fields))
+        return plan
+
+    def check_names(self, values):
+        if values.keys() != self.placeholder_names:
+            missing = sorted(self.placeholder_names - values.keys())
+            if missing:
+                raise ValueError('Missing values for placeholders: ' + ', '.join(missing))
+            raise ValueError('Unknown placeholders: '
+                             + ', '.join(sorted(values.keys() - self.placeholder_names)))
+
+    def bind_text(self, **values):
+        self.check_names(values)
+        return self.text_format.format(*[literal_text(values[name])
+                                         for name in self.placeholder_occurrences])
+
+    def bind(self, **values):
+        self.check_names(values)
+        if not self.copy_plan:
+            return self.python_ast
+        copies = []
+        for node_class, attributes, node_fields, list_fields in self.copy_plan:
+            node_copy = node_class.__new__(node_class)
+            fields = node_copy.__dict__
+            fields.update(attributes)
+            for field, source in node_fields:
+                if source.__class__ is str:
+                    fields[field] = literal_node(values[source])
+                else:
+                    fields[field] = copies[source]
+            for field, elements in list_fields:
+                fields[field] = new_list = list(fields[field])
+                for index, source in elements:
+                    if source.__class__ is str:
+                        new_list[index] = literal_node(values[source])
+                    else:
+                        new_list[index] = copies[source]
+            copies.append(node_copy)
+        return node_copy
+
+
+def prepare(query):
+    # query may be a text AST or a Python AST with $<name> placeholders
+    return PreparedQuery(query)
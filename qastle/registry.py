@@ -0,0 +1,171 @@
+import ast
+import threading
+
+__all__ = ['node_types', 'NodeType', 'register_node_type', 'unregister_node_type',
+           'register_node_class']
+
+
+# Maps the name of each composite node type of the text AST to the NodeType that builds its
+# Python AST node. The built-in node types are registered by qastle.transform and the LINQ
+# operators by qastle.linq_util; other operators can be added with register_node_type() or
+# register_node_class().
+node_types = {}
+
+# Maps each registered custom Python AST node class to its NodeType, for translating nodes of
+# that class back into text ASTs
+node_classes = {}
+
+# Serializes changes to node_types and node_classes. Lookups do not take it: each change
+# leaves both dictionaries consistent for readers, so translations can run while node types are
+# registered.
+registry_lock = threading.Lock()
+
+number_words = ('zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine')
+
+ordinal_words = ('first', 'second', 'third', 'fourth', 'fifth',
+                 'sixth', 'seventh', 'eighth', 'ninth', 'tenth')
+
+
+def number_word(number):
+    if number < len(number_words):
+        return number_words[number]
+    else:
+        return str(number)
+
+
+def count_phrase(count, unit):
+    if count == 1:
+        return number_word(count) + ' ' + unit
+    else:
+        return number_word(count) + ' ' + unit + 's'
+
+
+class NodeType(object):
+    # A composite node type: how many fields it takes, which fields must be lambdas and with
+    # how many arguments, and a factory that builds the Python AST node from a list of
+    # fields that have passed those checks. max_fields is None if there is no maximum.
+    # method_call is whether InsertLINQNodesTransformer turns calls of a node_class by its
+    # name into nodes of that class.
+
+    def __init__(self,
+                 name,
+                 factory,
+                 min_fields,
+                 max_fields,
+                 lambda_arities=None,
+                 node_class=None,
+                 description=None,
+                 unit='field',
+                 method_call=True):
+        self.name = name
+        self.factory = factory
+        self.min_fields = min_fields
+        self.max_fields = max_fields
+        if lambda_arities is None:
+            lambda_arities = {}
+        self.lambda_arities = tuple(sorted(lambda_arities.items()))
+        self.node_class = node_class
+        if description is None:
+            description = name + ' node'
+        self.description = description
+        self.unit = unit
+        self.method_call = method_call
+
+    def field_name(self, index):
+        if self.node_class is not None and index < len(self.node_class._fields):
+            return self.node_class._fields[index].replace('_', ' ')
+        else:
+            return number_word(index + 1) + ' ' + self.unit
+
+    def arity_error(self, n_fields):
+        if self.max_fields == self.min_fields:
+            expected = count_phrase(self.min_fields, self.unit)
+        elif self.max_fields is None:
+            expected = 'at least ' + count_phrase(self.min_fields, self.unit)
+        elif self.max_fields == self.min_fields + 1:
+            expected = (number_word(self.min_fields) + ' or '
+                        + count_phrase(self.max_fields, self.unit))
+        else:
+            expected = (number_word(self.min_fields) + ' to '
+                        + count_phrase(self.max_fields, self.unit))
+        return SyntaxError(self.description + ' must have ' + expected
+                           + '; found ' + str(n_fields))
+
+    def make_node(self, fields):
+        n_fields = len(fields)
+        if n_fields < self.min_fields or (self.max_fields is not None
+                                          and n_fields > self.max_fields):
+            raise self.arity_error(n_fields)
+        for index, n_arguments in self.lambda_arities:
+            field = fields[index]
+            if not isinstance(field, ast.Lambda):
+                raise SyntaxError(self.name + ' ' + self.field_name(index)
+                                  + ' must be a lambda; found ' + str(type(field)))
+            if len(field.args.args) != n_arguments:
+                raise SyntaxError(self.name + ' ' + self.field_name(index) + ' must have exactly '
+                                  + count_phrase(n_arguments, 'argument')
+                                  + '; found ' + str(len(field.args.args)))
+        return self.factory(fields)
+
+
+def register_node_type(name,
+                       factory,
+                       min_fields,
+                       max_fields,
+                       lambda_arities=None,
+                       node_class=None,
+                       description=None,
+                       unit='field',
+                       replace=False,
+                       method_call=True):
+    node_type = NodeType(name,
+                         factory,
+                         min_fields,
+                         max_fields,
+                         lambda_arities=lambda_arities,
+                         node_class=node_class,
+                         description=description,
+                         unit=unit,
+                         method_call=method_call)
+    with registry_lock:
+        if name in node_types and not replace:
+            raise ValueError('Node type already registered: ' + name)
+        old_node_type = node_types.get(name)
+        if node_class is not None:
+            node_classes[node_class] = node_type
+        node_types[name] = node_type
+        if (old_node_type is not None and old_node_type.node_class is not None
+           and old_node_type.node_class is not node_class):
+            del node_classes[old_node_type.node_class]
+    return node_type
+
+
+def unregister_node_type(name):
+    with registry_lock:
+        node_type = node_types.pop(name)
+        if node_type.node_class is not None:
+            del node_classes[node_type.node_class]
+    return node_type
+
+
+def register_node_class(node_class, lambda_arities=None, name=None, replace=False,
+                        method_call=True):
+    # Registers an ast.AST subclass whose _fields are, in order, the fields of its composite
+    # node type in the text AST. Unless method_call is False, such classes are also
+    # recognized as LINQ-style method calls by InsertLINQNodesTransformer, with the first
+    # field as the source.
+    if name is None:
+        name = node_class.__name__
+    n_fields = len(node_class._fields)
+
+    def factory(fields):
+        return node_class(*fields)
+
+    return register_node_type(name,
+                              factory,
+                              n_fields,
+                              n_fields,
+                              lambda_arities=lambda_arities,
+                              node_class=node_class,
+                              replace=replace,
+                              method_call=method_call)
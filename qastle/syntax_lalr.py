@@ -0,0 +1,688 @@
+# Generated from syntax.lark by qastle.parse.write_serialized_parser(); do not edit
+
+syntax_specification_sha256 = '64a0b9eb6adf393652b99fbd4b9bc2b6906bdf9bcbbc5ac36fe4b2166638daa2'
+
+lark_version = '1.3.1'
+
+DATA = (
+    {'__type__': 'Lark',
+     'options': {'_plugins': {},
+                 'ambiguity': 'auto',
+                 'cache': False,
+                 'cache_grammar': False,
+                 'debug': False,
+                 'edit_terminals': None,
+                 'g_regex_flags': 0,
+                 'import_paths': [],
+                 'keep_all_tokens': False,
+                 'lexer': 'contextual',
+                 'lexer_callbacks': {},
+                 'maybe_placeholders': False,
+                 'ordered_sets': True,
+                 'parser': 'lalr',
+                 'postlex': None,
+                 'priority': 'normal',
+                 'propagate_positions': False,
+                 'regex': False,
+                 'source_path': None,
+                 'start': ['record'],
+                 'strict': False,
+                 'transformer': None,
+                 'tree_class': None,
+                 'use_bytes': False},
+     'parser': {'__type__': 'ParsingFrontend',
+                'lexer_conf': {'__type__': 'LexerConf',
+                               'g_regex_flags': 0,
+                               'ignore': [],
+                               'lexer_type': 'contextual',
+                               'terminals': [{'@': 0},
+                                             {'@': 1},
+                                             {'@': 2},
+                                             {'@': 3},
+                                             {'@': 4},
+                                             {'@': 5},
+                                             {'@': 6},
+                                             {'@': 7},
+                                             {'@': 8},
+                                             {'@': 9}],
+                               'use_bytes': False},
+                'parser': {'end_states': {'record': 17},
+                           'start_states': {'record': 33},
+                           'states': {0: {0: (1, {'@': 23}), 1: (1, {'@': 23}), 2: (1, {'@': 23})},
+                                      1: {0: (0, 7),
+                                          3: (0, 27),
+                                          4: (0, 13),
+                                          5: (0, 10),
+                                          6: (0, 0),
+                                          7: (0, 29),
+                                          8: (0, 24),
+                                          9: (0, 21),
+                                          10: (0, 26),
+                                          11: (0, 35),
+                                          12: (0, 30),
+                                          13: (0, 38),
+                                          14: (0, 2)},
+                                      2: {0: (1, {'@': 35}), 1: (1, {'@': 35})},
+                                      3: {0: (0, 11), 1: (0, 9)},
+                                      4: {0: (0, 23), 1: (0, 12), 15: (0, 3)},
+                                      5: {2: (1, {'@': 15})},
+                                      6: {0: (0, 19), 1: (0, 1), 15: (0, 31)},
+                                      7: {0: (1, {'@': 33}), 1: (1, {'@': 33}), 2: (1, {'@': 33})},
+                                      8: {0: (1, {'@': 27}), 1: (1, {'@': 27}), 2: (1, {'@': 27})},
+                                      9: {0: (0, 8),
+                                          3: (0, 27),
+                                          4: (0, 13),
+                                          5: (0, 10),
+                                          6: (0, 0),
+                                          7: (0, 29),
+                                          8: (0, 24),
+                                          9: (0, 21),
+                                          10: (0, 26),
+                                          11: (0, 35),
+                                          12: (0, 30),
+                                          13: (0, 38),
+                                          14: (0, 16)},
+                                      10: {0: (1, {'@': 19}),
+                                           1: (1, {'@': 19}),
+                                           2: (1, {'@': 19})},
+                                      11: {0: (1, {'@': 28}),
+                                           1: (1, {'@': 28}),
+                                           2: (1, {'@': 28})},
+                                      12: {0: (0, 34),
+                                           3: (0, 27),
+                                           4: (0, 13),
+                                           5: (0, 10),
+                                           6: (0, 0),
+                                           7: (0, 29),
+                                           8: (0, 24),
+                                           9: (0, 21),
+                                           10: (0, 26),
+                                           11: (0, 35),
+                                           12: (0, 30),
+                                           13: (0, 38),
+                                           14: (0, 2)},
+                                      13: {0: (1, {'@': 20}),
+                                           1: (1, {'@': 20}),
+                                           2: (1, {'@': 20})},
+                                      14: {1: (0, 5), 2: (1, {'@': 16})},
+                                      15: {0: (1, {'@': 31}),
+                                           1: (1, {'@': 31}),
+                                           2: (1, {'@': 31})},
+                                      16: {0: (1, {'@': 36}), 1: (1, {'@': 36})},
+                                      17: {},
+                                      18: {2: (1, {'@': 13})},
+                                      19: {0: (1, {'@': 34}),
+                                           1: (1, {'@': 34}),
+                                           2: (1, {'@': 34})},
+                                      20: {1: (0, 18), 2: (1, {'@': 14})},
+                                      21: {0: (1, {'@': 21}),
+                                           1: (1, {'@': 21}),
+                                           2: (1, {'@': 21})},
+                                      22: {0: (1, {'@': 25}),
+                                           1: (1, {'@': 25}),
+                                           2: (1, {'@': 25})},
+                                      23: {0: (1, {'@': 30}),
+                                           1: (1, {'@': 30}),
+                                           2: (1, {'@': 30})},
+                                      24: {0: (1, {'@': 26}),
+                                           1: (1, {'@': 26}),
+                                           2: (1, {'@': 26})},
+                                      25: {16: (0, 4)},
+                                      26: {0: (1, {'@': 22}),
+                                           1: (1, {'@': 22}),
+                                           2: (1, {'@': 22})},
+                                      27: {1: (0, 25), 16: (0, 6)},
+                                      28: {0: (1, {'@': 32}),
+                                           1: (1, {'@': 32}),
+                                           2: (1, {'@': 32})},
+                                      29: {0: (1, {'@': 18}),
+                                           1: (1, {'@': 18}),
+                                           2: (1, {'@': 18})},
+                                      30: {3: (0, 27),
+                                           4: (0, 13),
+                                           5: (0, 10),
+                                           6: (0, 0),
+                                           7: (0, 29),
+                                           8: (0, 24),
+                                           9: (0, 21),
+                                           10: (0, 26),
+                                           11: (0, 35),
+                                           12: (0, 30),
+                                           13: (0, 38),
+                                           14: (0, 22)},
+                                      31: {0: (0, 28), 1: (0, 36)},
+                                      32: {2: (1, {'@': 10})},
+                                      33: {1: (0, 37),
+                                           2: (1, {'@': 12}),
+                                           3: (0, 27),
+                                           4: (0, 13),
+                                           5: (0, 10),
+                                           6: (0, 0),
+                                           7: (0, 29),
+                                           8: (0, 24),
+                                           9: (0, 21),
+                                           10: (0, 26),
+                                           11: (0, 35),
+                                           12: (0, 30),
+                                           13: (0, 38),
+                                           14: (0, 14),
+                                           17: (0, 32),
+                                           18: (0, 17)},
+                                      34: {0: (1, {'@': 29}),
+                                           1: (1, {'@': 29}),
+                                           2: (1, {'@': 29})},
+                                      35: {0: (1, {'@': 24}),
+                                           1: (1, {'@': 24}),
+                                           2: (1, {'@': 24})},
+                                      36: {0: (0, 15),
+                                           3: (0, 27),
+                                           4: (0, 13),
+                                           5: (0, 10),
+                                           6: (0, 0),
+                                           7: (0, 29),
+                                           8: (0, 24),
+                                           9: (0, 21),
+                                           10: (0, 26),
+                                           11: (0, 35),
+                                           12: (0, 30),
+                                           13: (0, 38),
+                                           14: (0, 16)},
+                                      37: {2: (1, {'@': 11}),
+                                           3: (0, 27),
+                                           4: (0, 13),
+                                           5: (0, 10),
+                                           6: (0, 0),
+                                           7: (0, 29),
+                                           8: (0, 24),
+                                           9: (0, 21),
+                                           10: (0, 26),
+                                           11: (0, 35),
+                                           12: (0, 30),
+                                           13: (0, 38),
+                                           14: (0, 20)},
+                                      38: {0: (1, {'@': 17}),
+                                           1: (1, {'@': 17}),
+                                           2: (1, {'@': 17})}},
+                           'tokens': {0: 'RPAR',
+                                      1: '_WHITESPACE',
+                                      2: '$END',
+                                      3: 'LPAR',
+                                      4: 'label_reference',
+                                      5: 'labeled_node',
+                                      6: 'NUMERIC_LITERAL',
+                                      7: 'composite',
+                                      8: 'LABEL_REFERENCE',
+                                      9: 'IDENTIFIER',
+                                      10: 'STRING_LITERAL',
+                                      11: 'PLACEHOLDER',
+                                      12: 'LABEL_DEFINITION',
+                                      13: 'atom',
+                                      14: 'node',
+                                      15: '__composite_star_0',
+                                      16: 'NODE_TYPE',
+                                      17: 'expression',
+                                      18: 'record'}},
+                'parser_conf': {'__type__': 'ParserConf',
+                                'parser_type': 'lalr',
+                                'rules': [{'@': 10},
+                                          {'@': 11},
+                                          {'@': 12},
+                                          {'@': 13},
+                                          {'@': 14},
+                                          {'@': 15},
+                                          {'@': 16},
+                                          {'@': 17},
+                                          {'@': 18},
+                                          {'@': 19},
+                                          {'@': 20},
+                                          {'@': 21},
+                                          {'@': 22},
+                                          {'@': 23},
+                                          {'@': 24},
+                                          {'@': 25},
+                                          {'@': 26},
+                                          {'@': 27},
+                                          {'@': 28},
+                                          {'@': 29},
+                                          {'@': 30},
+                                          {'@': 31},
+                                          {'@': 32},
+                                          {'@': 33},
+                                          {'@': 34},
+                                          {'@': 35},
+                                          {'@': 36}],
+                                'start': ['record']}},
+     'rules': [{'@': 10},
+               {'@': 11},
+               {'@': 12},
+               {'@': 13},
+               {'@': 14},
+               {'@': 15},
+               {'@': 16},
+               {'@': 17},
+               {'@': 18},
+               {'@': 19},
+               {'@': 20},
+               {'@': 21},
+               {'@': 22},
+               {'@': 23},
+               {'@': 24},
+               {'@': 25},
+               {'@': 26},
+               {'@': 27},
+               {'@': 28},
+               {'@': 29},
+               {'@': 30},
+               {'@': 31},
+               {'@': 32},
+               {'@': 33},
+               {'@': 34},
+               {'@': 35},
+               {'@': 36}]})
+
+MEMO = (
+    {0: {'__type__': 'TerminalDef',
+         'name': '_WHITESPACE',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [1, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '(?:(?:\\\t|\\\n|\\\r|\\ ))+'},
+         'priority': 0},
+     1: {'__type__': 'TerminalDef',
+         'name': 'IDENTIFIER',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [1, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '(?:(?:[A-Z]|[a-z])|_)(?:(?:(?:[A-Z]|[a-z])|[0-9]|_))*'},
+         'priority': 0},
+     2: {'__type__': 'TerminalDef',
+         'name': 'PLACEHOLDER',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [2, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '\\$(?:(?:[A-Z]|[a-z])|_)(?:(?:(?:[A-Z]|[a-z])|[0-9]|_))*'},
+         'priority': 0},
+     3: {'__type__': 'TerminalDef',
+         'name': 'STRING_LITERAL',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [2, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '(?:\'(?:(?:\\\\.|[^\']))*\'|"(?:(?:\\\\.|[^"]))*")'},
+         'priority': 0},
+     4: {'__type__': 'TerminalDef',
+         'name': 'NUMERIC_LITERAL',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [1, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '(?:\\.(?:[0-9])+|(?:(?:\\+|\\-))?(?:[0-9])+(?:\\.(?:(?:[0-9])+)?)?)(?:(?:E|e)(?:(?:\\+|\\-))?(?:[0-9])+)?'},
+         'priority': 0},
+     5: {'__type__': 'TerminalDef',
+         'name': 'LABEL_DEFINITION',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [3, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '\\#(?:[0-9])+='},
+         'priority': 0},
+     6: {'__type__': 'TerminalDef',
+         'name': 'LABEL_REFERENCE',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [3, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '\\#(?:[0-9])+\\#'},
+         'priority': 0},
+     7: {'__type__': 'TerminalDef',
+         'name': 'NODE_TYPE',
+         'pattern': {'__type__': 'PatternRE',
+                     '_width': [1, 18446744073709551616],
+                     'flags': [],
+                     'raw': None,
+                     'value': '(?:(?:(?:[A-Z]|[a-z]))+|(?:\\*\\*|//|<<|>>|==|!=|<=|>=|\\+|\\-|\\*|/|%|\\&|\\^|\\||\\~|<|>))'},
+         'priority': 0},
+     8: {'__type__': 'TerminalDef',
+         'name': 'LPAR',
+         'pattern': {'__type__': 'PatternStr', 'flags': [], 'raw': '"("', 'value': '('},
+         'priority': 0},
+     9: {'__type__': 'TerminalDef',
+         'name': 'RPAR',
+         'pattern': {'__type__': 'PatternStr', 'flags': [], 'raw': '")"', 'value': ')'},
+         'priority': 0},
+     10: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': 'expression'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': 'record'}},
+     11: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 1,
+          'origin': {'__type__': 'NonTerminal', 'name': 'record'}},
+     12: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 2,
+          'origin': {'__type__': 'NonTerminal', 'name': 'record'}},
+     13: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'NonTerminal', 'name': 'node'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': 'expression'}},
+     14: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'NonTerminal', 'name': 'node'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 1,
+          'origin': {'__type__': 'NonTerminal', 'name': 'expression'}},
+     15: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': 'node'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 2,
+          'origin': {'__type__': 'NonTerminal', 'name': 'expression'}},
+     16: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': 'node'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 3,
+          'origin': {'__type__': 'NonTerminal', 'name': 'expression'}},
+     17: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': 'atom'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': True,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': 'node'}},
+     18: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': 'composite'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': True,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 1,
+          'origin': {'__type__': 'NonTerminal', 'name': 'node'}},
+     19: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': 'labeled_node'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': True,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 2,
+          'origin': {'__type__': 'NonTerminal', 'name': 'node'}},
+     20: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': 'label_reference'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': True,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 3,
+          'origin': {'__type__': 'NonTerminal', 'name': 'node'}},
+     21: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': False, 'name': 'IDENTIFIER'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': 'atom'}},
+     22: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': False, 'name': 'STRING_LITERAL'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 1,
+          'origin': {'__type__': 'NonTerminal', 'name': 'atom'}},
+     23: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': False, 'name': 'NUMERIC_LITERAL'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 2,
+          'origin': {'__type__': 'NonTerminal', 'name': 'atom'}},
+     24: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': False, 'name': 'PLACEHOLDER'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 3,
+          'origin': {'__type__': 'NonTerminal', 'name': 'atom'}},
+     25: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': False, 'name': 'LABEL_DEFINITION'},
+                        {'__type__': 'NonTerminal', 'name': 'node'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': 'labeled_node'}},
+     26: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': False, 'name': 'LABEL_REFERENCE'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': 'label_reference'}},
+     27: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'NonTerminal', 'name': '__composite_star_0'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     28: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'NonTerminal', 'name': '__composite_star_0'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 1,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     29: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 2,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     30: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 3,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     31: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'NonTerminal', 'name': '__composite_star_0'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 4,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     32: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'NonTerminal', 'name': '__composite_star_0'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 5,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     33: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 6,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     34: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': 'LPAR'},
+                        {'__type__': 'Terminal', 'filter_out': False, 'name': 'NODE_TYPE'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': 'RPAR'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 7,
+          'origin': {'__type__': 'NonTerminal', 'name': 'composite'}},
+     35: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'NonTerminal', 'name': 'node'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 0,
+          'origin': {'__type__': 'NonTerminal', 'name': '__composite_star_0'}},
+     36: {'__type__': 'Rule',
+          'alias': None,
+          'expansion': [{'__type__': 'NonTerminal', 'name': '__composite_star_0'},
+                        {'__type__': 'Terminal', 'filter_out': True, 'name': '_WHITESPACE'},
+                        {'__type__': 'NonTerminal', 'name': 'node'}],
+          'options': {'__type__': 'RuleOptions',
+                      'empty_indices': (),
+                      'expand1': False,
+                      'keep_all_tokens': False,
+                      'priority': None,
+                      'template_source': None},
+          'order': 1,
+          'origin': {'__type__': 'NonTerminal', 'name': '__composite_star_0'}}})
@@ -1,12 +1,18 @@
-from .linq_util import (Where, Select, SelectMany, First, Last, ElementAt, Contains, Aggregate,
-                        Count, Max, Min, Sum, All, Any, Concat, Zip, OrderBy, OrderByDescending,
-                        Choose)
-from .ast_util import wrap_ast, unwrap_ast
-
-import lark
+from .registry import node_types, node_classes, register_node_type
+from . import linq_util  # noqa: F401 (registers the LINQ node types)
+from .ast_util import wrap_ast, Placeholder
 
 import ast
+import functools
+import keyword
 import sys
+import threading
+import weakref
+
+__all__ = ['UnaryOp_ops', 'BinOp_ops', 'BoolOp_ops', 'Compare_ops', 'op_strings', 'flexible_ops',
+           'PythonASTToTextASTTransformer', 'PythonASTToMemoizedTextASTTransformer',
+           'PythonASTToIncrementalTextASTTransformer', 'PythonASTToSharedTextASTTransformer',
+           'TextASTToPythonASTTransformer']
 
 
 UnaryOp_ops = {'+':   ast.UAdd,
@@ -45,505 +51,681 @@ flexible_ops = ('+', '-')
 
 
 class PythonASTToTextASTTransformer(ast.NodeVisitor):
+    # Each visit_<Node> method returns a layout for the node rather than its text: a string
+    # of text, another node to write in its place, or a tuple of a composite node type
+    # followed by the layouts of its fields. A list of layouts is written one after another
+    # with nothing in between, and a callable in a layout is called when write() reaches it,
+    # which lets subclasses keep state, such as scopes, that follows the output. write() then
+    # emits every piece of text exactly once from an explicit stack, so emission time is
+    # linear in the size of the output. Subclasses whose layouts depend on such state set
+    # context_dependent_layouts, so that the text of a node is not reused from elsewhere.
+
+    context_dependent_layouts = False
+
+    def visit(self, node):
+        chunks = []
+        self.write(node, chunks.append)
+        return ''.join(chunks)
+
+    def layout(self, node):
+        return getattr(self, 'visit_' + node.__class__.__name__, self.generic_visit)(node)
+
+    def write(self, node, write):
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            while isinstance(item, ast.AST):
+                item = self.layout(item)
+            if isinstance(item, str):
+                write(item)
+            elif isinstance(item, tuple):
+                write('(' + item[0])
+                stack.append(')')
+                for field in reversed(item[1:]):
+                    stack.append(field)
+                    stack.append(' ')
+            elif isinstance(item, list):
+                stack.extend(reversed(item))
+            elif callable(item):
+                item()
+            else:
+                self.generic_visit(item)
+
     def visit_Module(self, node):
         n_children = len(node.body)
         if n_children == 0:
             return ''
         elif n_children == 1:
-            return self.visit(node.body[0])
+            return node.body[0]
         else:
             raise SyntaxError('A record must contain zero or one expressions; found '
                               + str(n_children))
 
     def visit_Expr(self, node):
-        return self.visit(node.value)
+        return node.value
 
     def visit_Name(self, node):
         return node.id
 
+    def visit_Placeholder(self, node):
+        return '$' + node.name
+
     def visit_Constant(self, node):
         return repr(node.value)
 
-    @staticmethod
-    def make_composite_node_string(node_type, *fields):
-        return '(' + node_type + ''.join([' ' + field for field in fields]) + ')'
-
     def visit_List(self, node):
-        return self.make_composite_node_string('list',
-                                               *[self.visit(element) for element in node.elts])
+        return ('list', *node.elts)
 
     def visit_Tuple(self, node):
         return self.visit_List(node)
 
     def visit_Dict(self, node):
-        return self.make_composite_node_string('dict',
-                                               self.visit(ast.List(elts=node.keys)),
-                                               self.visit(ast.List(elts=node.values)))
+        return ('dict', ('list', *node.keys), ('list', *node.values))
 
     def visit_Attribute(self, node):
-        return self.make_composite_node_string('attr', self.visit(node.value), repr(node.attr))
+        return ('attr', node.value, repr(node.attr))
 
     def visit_Subscript(self, node):
-        return self.make_composite_node_string('subscript',
-                                               self.visit(node.value),
-                                               self.visit(node.slice))
+        return ('subscript', node.value, node.slice)
 
     def visit_Index(self, node):
-        return self.visit(node.value)
+        return node.value
 
     def visit_Call(self, node):
-        return self.make_composite_node_string('call',
-                                               self.visit(node.func),
-                                               *[self.visit(arg) for arg in node.args])
+        return ('call', node.func, *node.args)
 
     def visit_IfExp(self, node):
-        return self.make_composite_node_string('if',
-                                               self.visit(node.test),
-                                               self.visit(node.body),
-                                               self.visit(node.orelse))
+        return ('if', node.test, node.body, node.orelse)
 
     def visit_UnaryOp(self, node):
         if (hasattr(ast, 'Constant') and isinstance(node.operand, ast.Constant)
            or (isinstance(node.operand, ast.Constant)
                and isinstance(node.operand.value, (int, float, complex)))):
             if isinstance(node.op, ast.UAdd):
-                return self.visit(node.operand)
+                return node.operand
             elif isinstance(node.op, ast.USub):
-                return self.visit(ast.Constant(value=-node.operand.value))
-        return self.make_composite_node_string(op_strings[type(node.op)],
-                                               self.visit(node.operand))
+                return ast.Constant(value=-node.operand.value)
+        return (op_strings[type(node.op)], node.operand)
 
     def visit_BinOp(self, node):
-        return self.make_composite_node_string(op_strings[type(node.op)],
-                                               self.visit(node.left),
-                                               self.visit(node.right))
+        return (op_strings[type(node.op)], node.left, node.right)
 
     def visit_BoolOp(self, node):
         if len(node.values) < 2:
             raise SyntaxError('Boolean operator must have at least 2 operands; found: '
                               + str(len(node.values)))
-        rep = self.visit(node.values[0])
+        rep = node.values[0]
         for value in node.values[1:]:
-            rep = self.make_composite_node_string(op_strings[type(node.op)],
-                                                  rep,
-                                                  self.visit(value))
+            rep = (op_strings[type(node.op)], rep, value)
         return rep
 
     def visit_Compare(self, node):
         if len(node.ops) < 1:
             raise SyntaxError('Compare node must have at least 1 operation; found: '
                               + str(len(node.ops)))
-        left = self.visit(node.left)
-        right = self.visit(node.comparators[0])
-        rep = self.make_composite_node_string(op_strings[type(node.ops[0])],
-                                              left,
-                                              right)
+        left = node.left
+        right = node.comparators[0]
+        rep = (op_strings[type(node.ops[0])], left, right)
         for operator, comparator in zip(node.ops[1:], node.comparators[1:]):
             left = right
-            right = self.visit(comparator)
-            new_comparison = self.make_composite_node_string(op_strings[type(operator)],
-                                                             left,
-                                                             right)
-            rep = self.make_composite_node_string('and', rep, new_comparison)
+            right = comparator
+            new_comparison = (op_strings[type(operator)], left, right)
+            rep = ('and', rep, new_comparison)
         return rep
 
     def visit_Lambda(self, node):
-        return self.make_composite_node_string('lambda',
-                                               self.visit(node.args),
-                                               self.visit(node.body))
+        return ('lambda', node.args, node.body)
 
     def visit_arguments(self, node):
-        return self.visit(ast.List(elts=node.args))
+        return ('list', *node.args)
 
     def visit_arg(self, node):
         return node.arg
 
-    def visit_Where(self, node):
-        return self.make_composite_node_string('Where',
-                                               self.visit(node.source),
-                                               self.visit(node.predicate))
-
-    def visit_Select(self, node):
-        return self.make_composite_node_string('Select',
-                                               self.visit(node.source),
-                                               self.visit(node.selector))
-
-    def visit_SelectMany(self, node):
-        return self.make_composite_node_string('SelectMany',
-                                               self.visit(node.source),
-                                               self.visit(node.selector))
-
-    def visit_First(self, node):
-        return self.make_composite_node_string('First', self.visit(node.source))
-
-    def visit_Last(self, node):
-        return self.make_composite_node_string('Last', self.visit(node.source))
-
-    def visit_ElementAt(self, node):
-        return self.make_composite_node_string('ElementAt',
-                                               self.visit(node.source),
-                                               self.visit(node.index))
-
-    def visit_Contains(self, node):
-        return self.make_composite_node_string('Contains',
-                                               self.visit(node.source),
-                                               self.visit(node.value))
-
-    def visit_Aggregate(self, node):
-        return self.make_composite_node_string('Aggregate',
-                                               self.visit(node.source),
-                                               self.visit(node.seed),
-                                               self.visit(node.func))
-
-    def visit_Count(self, node):
-        return self.make_composite_node_string('Count', self.visit(node.source))
-
-    def visit_Max(self, node):
-        return self.make_composite_node_string('Max', self.visit(node.source))
-
-    def visit_Min(self, node):
-        return self.make_composite_node_string('Min', self.visit(node.source))
-
-    def visit_Sum(self, node):
-        return self.make_composite_node_string('Sum', self.visit(node.source))
-
-    def visit_All(self, node):
-        return self.make_composite_node_string('All',
-                                               self.visit(node.source),
-                                               self.visit(node.predicate))
-
-    def visit_Any(self, node):
-        return self.make_composite_node_string('Any',
-                                               self.visit(node.source),
-                                               self.visit(node.predicate))
-
-    def visit_Concat(self, node):
-        return self.make_composite_node_string('Concat',
-                                               self.visit(node.first),
-                                               self.visit(node.second))
-
-    def visit_Zip(self, node):
-        return self.make_composite_node_string('Zip', self.visit(node.source))
-
-    def visit_OrderBy(self, node):
-        return self.make_composite_node_string('OrderBy',
-                                               self.visit(node.source),
-                                               self.visit(node.key_selector))
-
-    def visit_OrderByDescending(self, node):
-        return self.make_composite_node_string('OrderByDescending',
-                                               self.visit(node.source),
-                                               self.visit(node.key_selector))
-
-    def visit_Choose(self, node):
-        return self.make_composite_node_string('Choose',
-                                               self.visit(node.source),
-                                               self.visit(node.n))
-
     def generic_visit(self, node):
-        raise SyntaxError('Unsupported node type: ' + str(type(node)))
-
+        node_type = node_classes.get(type(node))
+        if node_type is None:
+            raise SyntaxError('Unsupported node type: ' + str(type(node)))
+        return (node_type.name, *[getattr(node, field) for field in node.__class__._fields])
+
+
+def count_node_references(node):
+    # Maps the id of every node object in the tree to the number of places it occurs, looking
+    # inside each object only once
+    counts = {}
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        key = id(item)
+        if key in counts:
+            counts[key] += 1
+        else:
+            counts[key] = 1
+            stack.extend(ast.iter_child_nodes(item))
+    return counts
+
+
+class NodeEnd(object):
+    # Marks the end of the layout of a node whose text or number is being memoized
+    __slots__ = ('node', 'start')
+
+    def __init__(self, node, start=None):
+        self.node = node
+        self.start = start
+
+
+class PythonASTToMemoizedTextASTTransformer(PythonASTToTextASTTransformer):
+    # Lays out each node object that occurs in more than one place in the tree, as in queries
+    # built up programmatically, only once per call, and writes its text from a memo keyed by
+    # id at every later occurrence. The memo holds a reference to each node, so ids cannot
+    # be reused while it is in use. This relies on the text of a node not depending on where
+    # it occurs, so nothing is memoized for subclasses with context-dependent layouts.
+
+    def write(self, node, write):
+        counts = {} if self.context_dependent_layouts else count_node_references(node)
+        memo = {}
+        chunks = []
+        n_open = 0
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, ast.AST):
+                entry = memo.get(id(item))
+                if entry is not None:
+                    text = entry[1]
+                elif counts.get(id(item), 0) > 1:
+                    stack.append(NodeEnd(item, len(chunks)))
+                    stack.append(self.layout(item))
+                    n_open += 1
+                    continue
+                else:
+                    stack.append(self.layout(item))
+                    continue
+            elif isinstance(item, str):
+                text = item
+            elif isinstance(item, tuple):
+                text = '(' + item[0]
+                stack.append(')')
+                for field in reversed(item[1:]):
+                    stack.append(field)
+                    stack.append(' ')
+            elif isinstance(item, NodeEnd):
+                text = ''.join(chunks[item.start:])
+                del chunks[item.start:]
+                memo[id(item.node)] = (item.node, text)
+                n_open -= 1
+            elif isinstance(item, list):
+                stack.extend(reversed(item))
+                continue
+            elif callable(item):
+                item()
+                continue
+            else:
+                self.generic_visit(item)
+            # Text inside a node being memoized is collected; everything else is written out
+            # as it is produced
+            if n_open > 0:
+                chunks.append(text)
+            else:
+                write(text)
+
+
+class IncrementalTextEntry(object):
+    # The text written for a node by PythonASTToIncrementalTextASTTransformer, whether it is
+    # still valid, and the entries whose text includes it
+    __slots__ = ('text', 'valid', 'dependents', '__weakref__')
+
+    def __init__(self):
+        self.text = None
+        self.valid = True
+        self.dependents = weakref.WeakSet()
+
+
+class PythonASTToIncrementalTextASTTransformer(PythonASTToTextASTTransformer):
+    # Keeps the text of every node it is asked to write, for as long as the node exists, and
+    # reuses it when the node turns up again in a later call. Queries built one operator at a
+    # time, as in ds.Select(...).Where(...), contain the previous query as a subtree, so each
+    # call only lays out the new operator; the remaining work is copying the text of the
+    # previous query, once. The nodes written in each call are also recorded, so that after a
+    # node is modified in place, invalidate(node) discards every entry whose text includes it.
+    # Like the memoized transformer, this relies on the text of a node not depending on where
+    # it occurs. An instance can be shared between threads, but calls to it then take turns.
+
+    def __init__(self):
+        self.entries = weakref.WeakKeyDictionary()
+        self.owners = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def write(self, node, write):
+        with self.lock:
+            text = self.incremental_text(node)
+        write(text)
+
+    def incremental_text(self, node):
+        entry = IncrementalTextEntry()
+        # The node asked for and any nodes it is laid out as, such as the expression of a module,
+        # so that a later query is found whether or not it was wrapped
+        roots = []
+        at_root = True
+        chunks = []
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, ast.AST):
+                previous_entry = self.entries.get(item)
+                if previous_entry is not None and previous_entry.valid:
+                    previous_entry.dependents.add(entry)
+                    chunks.append(previous_entry.text)
+                    continue
+                owners = self.owners.get(item)
+                if owners is None:
+                    owners = self.owners[item] = weakref.WeakSet()
+                owners.add(entry)
+                if at_root:
+                    roots.append(item)
+                stack.append(self.layout(item))
+                continue
+            at_root = False
+            if isinstance(item, str):
+                chunks.append(item)
+            elif isinstance(item, tuple):
+                chunks.append('(' + item[0])
+                stack.append(')')
+                for field in reversed(item[1:]):
+                    stack.append(field)
+                    stack.append(' ')
+            elif isinstance(item, list):
+                stack.extend(reversed(item))
+            elif callable(item):
+                item()
+            else:
+                self.generic_visit(item)
+        entry.text = ''.join(chunks)
+        for root in roots:
+            self.entries[root] = entry
+        return entry.text
+
+    def invalidate(self, node):
+        with self.lock:
+            stack = list(self.owners.get(node, ()))
+            stack.append(self.entries.get(node))
+            while stack:
+                entry = stack.pop()
+                if entry is not None and entry.valid:
+                    entry.valid = False
+                    stack.extend(entry.dependents)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.owners.clear()
+
+
+class SubtreeEnd(object):
+    # Marks the end of the fields of a composite, or of the items of a list layout when
+    # node_type is None, while hash-consing; their numbers are those from start on
+    __slots__ = ('node_type', 'start')
+
+    def __init__(self, node_type, start):
+        self.node_type = node_type
+        self.start = start
+
+
+class PythonASTToSharedTextASTTransformer(PythonASTToTextASTTransformer):
+    # Writes each distinct composite only once. The first copy of a composite that occurs more
+    # than once is written as #<n>=<composite> and every later copy as #<n>#, like Common
+    # Lisp's reader labels. Identical subtrees are found by hash-consing: every subtree is
+    # given the number of the first identical one, keyed on its node type and the numbers of
+    # its fields, so finding them takes time linear in the size of the tree and writing takes
+    # time linear in the size of the output. A node object that occurs in several places is
+    # also only laid out once, as in PythonASTToMemoizedTextASTTransformer, unless layouts
+    # depend on context; identical text is shared either way. The argument lists of lambdas
+    # are never labeled.
+    #
+    # A list layout is given a number of its own, keyed on None and the numbers of its items,
+    # and is written as its items with nothing in between; it is never labeled. Nothing is
+    # written until the whole tree has been laid out, so callables in layouts are called as
+    # the layouts are made, which is what state such as scopes needs, rather than as the
+    # text is written.
+
+    def write(self, node, write):
+        subtree_numbers = {}
+        subtrees = []
+        numbers = []
+        node_numbers = {}
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, ast.AST):
+                entry = node_numbers.get(id(item))
+                if entry is not None:
+                    numbers.append(entry[1])
+                elif self.context_dependent_layouts:
+                    stack.append(self.layout(item))
+                else:
+                    stack.append(NodeEnd(item))
+                    stack.append(self.layout(item))
+                continue
+            elif isinstance(item, NodeEnd):
+                node_numbers[id(item.node)] = (item.node, numbers[-1])
+                continue
+            elif isinstance(item, str):
+                key = item
+            elif isinstance(item, tuple):
+                stack.append(SubtreeEnd(item[0], len(numbers)))
+                stack.extend(reversed(item[1:]))
+                continue
+            elif isinstance(item, list):
+                stack.append(SubtreeEnd(None, len(numbers)))
+                stack.extend(reversed(item))
+                continue
+            elif isinstance(item, SubtreeEnd):
+                key = (item.node_type, *numbers[item.start:])
+                del numbers[item.start:]
+                if item.node_type is None:
+                    # Not shared, so that n_uses counts every time the items are written
+                    numbers.append(len(subtrees))
+                    subtrees.append(key)
+                    continue
+            elif callable(item):
+                item()
+                continue
+            else:
+                self.generic_visit(item)
+            number = subtree_numbers.get(key)
+            if number is None:
+                number = subtree_numbers[key] = len(subtrees)
+                subtrees.append(key)
+            numbers.append(number)
+
+        n_uses = [0] * len(subtrees)
+        for key in subtrees:
+            if isinstance(key, tuple):
+                for number in key[1:]:
+                    n_uses[number] += 1
+        for key in subtrees:
+            if isinstance(key, tuple) and key[0] == 'lambda' and len(key) > 1:
+                n_uses[key[1]] = 1
+
+        labels = {}
+        stack = numbers
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                write(item)
+                continue
+            key = subtrees[item]
+            if isinstance(key, str):
+                write(key)
+                continue
+            if key[0] is None:
+                stack.extend(reversed(key[1:]))
+                continue
+            if n_uses[item] > 1:
+                label = labels.get(item)
+                if label is not None:
+                    write('#' + label + '#')
+                    continue
+                label = labels[item] = str(len(labels) + 1)
+                write('#' + label + '=')
+            write('(' + key[0])
+            stack.append(')')
+            for number in reversed(key[1:]):
+                stack.append(number)
+                stack.append(' ')
+
+
+reserved_identifiers = {'True': True, 'False': False, 'None': None}
+
+
+@functools.lru_cache(maxsize=4096)
+def atom_value(token_type, text):
+    # Returns how to build the node for an atom token as (kind, value), so that repeated
+    # identifiers and literals are decoded only once. Anything unusual (escape sequences,
+    # keywords, malformed or very long numbers) goes through ast.parse to get exactly
+    # Python's behavior.
+    kind = 'constant'
+    if token_type == 'IDENTIFIER':
+        if text in reserved_identifiers:
+            return kind, reserved_identifiers[text]
+        if not keyword.iskeyword(text):
+            return 'name', text
+    elif token_type == 'STRING_LITERAL':
+        body = text[1:-1]
+        if '\\' not in body and '\n' not in body and '\r' not in body:
+            return kind, body
+    elif token_type == 'PLACEHOLDER':
+        return 'placeholder', text[1:]
+    elif token_type == 'NUMERIC_LITERAL':
+        if text[0] == '+':
+            text = text[1:]
+        if text[0] == '-':
+            kind = 'negative'
+            text = text[1:]
+        if '.' in text or 'e' in text or 'E' in text:
+            return kind, float(text)
+        # 640 digits is the lowest limit Python can place on int() conversions
+        if (text[0] != '0' or text.strip('0') == '') and len(text) <= 640:
+            return kind, int(text)
+    body = ast.parse(text).body
+    if (len(body) == 1 and isinstance(body[0], ast.Expr)
+       and isinstance(body[0].value, ast.Constant)):
+        return kind, body[0].value.value
+    raise SyntaxError('Invalid atom: ' + text)
+
+
+def make_atom_node(token_type, value):
+    kind, atom = atom_value(token_type, value)
+    if kind == 'name':
+        return ast.Name(id=atom, ctx=ast.Load())
+    elif kind == 'constant':
+        return ast.Constant(value=atom, kind=None)
+    elif kind == 'placeholder':
+        return Placeholder(name=atom)
+    else:
+        return ast.UnaryOp(op=ast.USub(), operand=ast.Constant(value=atom, kind=None))
+
+
+def make_list(fields):
+    return ast.List(elts=fields, ctx=ast.Load())
+
+
+def make_dict(fields):
+    for field_index in range(2):
+        if not isinstance(fields[field_index], ast.List):
+            raise SyntaxError('Dictionary fields must be lists; found '
+                              + str(type(fields[field_index])))
+    return ast.Dict(keys=fields[0].elts, values=fields[1].elts)
+
+
+def make_attr(fields):
+    if not (isinstance(fields[1], ast.Constant) and isinstance(fields[1].value, str)):
+        raise SyntaxError('Attribute name must be a string; found ' + str(type(fields[1])))
+    return ast.Attribute(value=fields[0], attr=fields[1].value, ctx=ast.Load())
+
+
+if sys.version_info < (3, 9):
+    def make_subscript(fields):
+        return ast.Subscript(value=fields[0], slice=ast.Index(value=fields[1]), ctx=ast.Load())
+else:
+    def make_subscript(fields):
+        return ast.Subscript(value=fields[0], slice=fields[1], ctx=ast.Load())
+
+
+def make_call(fields):
+    return ast.Call(func=fields[0], args=fields[1:], keywords=[])
+
+
+def make_if(fields):
+    return ast.IfExp(test=fields[0], body=fields[1], orelse=fields[2])
+
+
+def make_lambda(fields):
+    if not isinstance(fields[0], ast.List):
+        raise SyntaxError('Lambda arguments must be in a list; found ' + str(type(fields[0])))
+    for arg in fields[0].elts:
+        if not isinstance(arg, ast.Name):
+            raise SyntaxError('Lambda arguments must variable names; found ' + str(type(arg)))
+    return ast.Lambda(args=ast.arguments(posonlyargs=[],
+                                         args=[ast.arg(arg=name.id,
+                                                       annotation=None,
+                                                       type_comment=None)
+                                               for name in fields[0].elts],
+                                         vararg=None,
+                                         kwonlyargs=[],
+                                         kw_defaults=[],
+                                         kwarg=None,
+                                         defaults=[]),
+                      body=fields[1])
+
+
+def make_operator_factory(node_type):
+    # Returns the factory for an operator node type, choosing between the unary and binary
+    # forms of + and - by the number of operands
+    unary_op = UnaryOp_ops.get(node_type)
+    binary_op = BinOp_ops.get(node_type)
+    if unary_op is not None and binary_op is not None:
+        def make_operator(fields):
+            if len(fields) == 1:
+                return ast.UnaryOp(op=unary_op(), operand=fields[0])
+            else:
+                return ast.BinOp(left=fields[0], op=binary_op(), right=fields[1])
+    elif unary_op is not None:
+        def make_operator(fields):
+            return ast.UnaryOp(op=unary_op(), operand=fields[0])
+    elif binary_op is not None:
+        def make_operator(fields):
+            return ast.BinOp(left=fields[0], op=binary_op(), right=fields[1])
+    elif node_type in BoolOp_ops:
+        bool_op = BoolOp_ops[node_type]
+
+        def make_operator(fields):
+            return ast.BoolOp(op=bool_op(), values=fields)
+    else:
+        compare_op = Compare_ops[node_type]
+
+        def make_operator(fields):
+            return ast.Compare(left=fields[0], ops=[compare_op()], comparators=[fields[1]])
+    return make_operator
+
+
+register_node_type('list', make_list, 0, None)
+register_node_type('dict', make_dict, 2, 2, description='Dictionary node')
+register_node_type('attr', make_attr, 2, 2, description='Attribute node')
+register_node_type('subscript', make_subscript, 2, 2, description='Subscript node')
+register_node_type('call', make_call, 1, None, description='Call node')
+register_node_type('if', make_if, 3, 3, description='If node')
+register_node_type('lambda', make_lambda, 2, 2, description='Lambda node')
+
+
+def register_operator_node_types():
+    for operator_table in [UnaryOp_ops, BinOp_ops, BoolOp_ops, Compare_ops]:
+        for operator_string in operator_table:
+            if operator_string in node_types:
+                continue
+            if operator_string in flexible_ops:
+                min_operands, max_operands = 1, 2
+            elif operator_table is UnaryOp_ops:
+                min_operands, max_operands = 1, 1
+            else:
+                min_operands, max_operands = 2, 2
+            register_node_type(operator_string,
+                               make_operator_factory(operator_string),
+                               min_operands,
+                               max_operands,
+                               description=(BinOp_ops.get(operator_string,
+                                                          operator_table[operator_string]).__name__
+                                            + ' operator'),
+                               unit='operand')
+
+
+register_operator_node_types()
+
+
+def make_composite_node(node_type, fields):
+    registered_node_type = node_types.get(node_type)
+    if registered_node_type is None:
+        raise SyntaxError('Unknown composite node type: ' + node_type)
+    return registered_node_type.make_node(fields)
+
+
+def define_label(labels, label_definition, node):
+    # label_definition is the text #<n>=; node is shared by every later #<n>#
+    label = int(label_definition[1:-1])
+    if label in labels:
+        raise SyntaxError('Label defined more than once: ' + label_definition)
+    labels[label] = node
+    return node
+
+
+def resolve_label(labels, label_reference):
+    node = labels.get(int(label_reference[1:-1]))
+    if node is None:
+        raise SyntaxError('Undefined label: ' + label_reference)
+    return node
+
+
+class TextASTToPythonASTTransformer(object):
+    # Builds a Python AST from a parse tree of syntax.lark by calling the method named after
+    # each rule with the rule's already-transformed children. Only the data and children
+    # attributes of lark's trees are used, so lark need not be imported to define this. An
+    # instance can also be given to an LALR lark.Lark as its transformer, in which case the
+    # methods are called during parsing and no tree is built at all; reset_labels() must then
+    # be called before each parse. Labels are kept per thread, so one instance can be shared.
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def reset_labels(self):
+        self.local.labels = {}
+
+    def labels(self):
+        labels = getattr(self.local, 'labels', None)
+        if labels is None:
+            labels = self.local.labels = {}
+        return labels
+
+    def transform(self, tree):
+        self.reset_labels()
+        reverse_post_order = []
+        stack = [tree]
+        while stack:
+            item = stack.pop()
+            reverse_post_order.append(item)
+            if not isinstance(item, str):
+                stack.extend(item.children)
+
+        results = []
+        for item in reversed(reverse_post_order):
+            if isinstance(item, str):
+                results.append(item)
+            else:
+                n_children = len(item.children)
+                children = results[len(results) - n_children:]
+                del results[len(results) - n_children:]
+                results.append(getattr(self, item.data)(children))
+        return results[0]
 
-class TextASTToPythonASTTransformer(lark.Transformer):
     def record(self, children):
-        if (len(children) == 0
-           or isinstance(children[0], lark.Token) and children[0].type == 'WHITESPACE'):
+        self.reset_labels()
+        if len(children) == 0:
             return wrap_ast()
         else:
             return wrap_ast(children[0])
 
     def expression(self, children):
-        for child in children:
-            if not (isinstance(child, lark.Token) and child.type == 'WHITESPACE'):
-                return child
-        raise SyntaxError('Expression does not contain a node')
+        if len(children) == 0:
+            raise SyntaxError('Expression does not contain a node')
+        return children[0]
 
     def atom(self, children):
-        child = children[0]
-        if child.type == 'NUMERIC_LITERAL':
-            if child.value[0] == '+':
-                child.value = child.value[1:]
-        return unwrap_ast(ast.parse(child.value))
+        return make_atom_node(children[0].type, children[0].value)
 
     def composite(self, children):
-        fields = []
-        for child in children:
-            if isinstance(child, lark.Token):
-                if child.type == 'NODE_TYPE':
-                    node_type = child.value
-                else:
-                    pass
-            elif isinstance(child, ast.AST):
-                fields.append(child)
-            else:
-                pass
-
-        if node_type == 'list':
-            return ast.List(elts=fields, ctx=ast.Load())
-
-        if node_type == 'dict':
-            if len(fields) != 2:
-                raise SyntaxError('Dictionary node must have two fields; found '
-                                  + str(len(fields)))
-            for field_index in range(2):
-                if not isinstance(fields[field_index], ast.List):
-                    raise SyntaxError('Dictionary fields must be lists; found '
-                                      + str(type(fields[field_index])))
-            return ast.Dict(keys=fields[0].elts, values=fields[1].elts)
-
-        elif node_type == 'attr':
-            if len(fields) != 2:
-                raise SyntaxError('Attribute node must have two fields; found ' + str(len(fields)))
-            if not (isinstance(fields[1], ast.Constant) and isinstance(fields[1].value, str)):
-                raise SyntaxError('Attribute name must be a string; found ' + str(type(fields[1])))
-            return ast.Attribute(value=fields[0], attr=fields[1].value, ctx=ast.Load())
-
-        elif node_type == 'subscript':
-            if len(fields) != 2:
-                raise SyntaxError('Subscript node must have two fields; found ' + str(len(fields)))
-            if sys.version_info[0] < 3 or (sys.version_info[0] == 3 and sys.version_info[1] < 9):
-                return ast.Subscript(value=fields[0],
-                                     slice=ast.Index(value=fields[1]),
-                                     ctx=ast.Load())
-            else:
-                return ast.Subscript(value=fields[0], slice=fields[1], ctx=ast.Load())
-
-        elif node_type == 'call':
-            if len(fields) < 1:
-                raise SyntaxError('Call node must have at least one field; found '
-                                  + str(len(fields)))
-            if sys.version_info[0] < 3:
-                return ast.Call(func=fields[0],
-                                args=fields[1:],
-                                keywords=[],
-                                starargs=None,
-                                kwargs=None)
-            else:
-                return ast.Call(func=fields[0], args=fields[1:], keywords=[])
-
-        elif node_type == 'if':
-            if len(fields) != 3:
-                raise SyntaxError('If node must have three fields; found '
-                                  + str(len(fields)))
-            return ast.IfExp(test=fields[0], body=fields[1], orelse=fields[2])
-
-        elif node_type in UnaryOp_ops:
-            if len(fields) == 1:
-                return ast.UnaryOp(op=UnaryOp_ops[node_type](), operand=fields[0])
-            elif node_type not in flexible_ops:
-                raise SyntaxError(UnaryOp_ops[node_type].__name__
-                                  + ' operator only supported for one operand; found '
-                                  + str(len(fields)))
-
-        if node_type in BinOp_ops:
-            if len(fields) == 2:
-                return ast.BinOp(left=fields[0], op=BinOp_ops[node_type](), right=fields[1])
-            else:
-                raise SyntaxError(BinOp_ops[node_type].__name__
-                                  + ' operator only supported for two operands; found '
-                                  + str(len(fields)))
+        return make_composite_node(children[0].value, children[1:])
 
-        elif node_type in BoolOp_ops:
-            if len(fields) == 2:
-                return ast.BoolOp(op=BoolOp_ops[node_type](), values=fields)
-            else:
-                raise SyntaxError(BoolOp_ops[node_type].__name__
-                                  + ' operator only supported for two operands; found '
-                                  + str(len(fields)))
-
-        elif node_type in Compare_ops:
-            if len(fields) == 2:
-                return ast.Compare(left=fields[0],
-                                   ops=[Compare_ops[node_type]()],
-                                   comparators=[fields[1]])
-            else:
-                raise SyntaxError(Compare_ops[node_type].__name__
-                                  + ' operator only supported for two operands; found '
-                                  + str(len(fields)))
-
-        elif node_type == 'lambda':
-            if len(fields) != 2:
-                raise SyntaxError('Lambda node must have two fields; found ' + str(len(fields)))
-            if not isinstance(fields[0], ast.List):
-                raise SyntaxError('Lambda arguments must be in a list; found '
-                                  + str(type(fields[0])))
-            for arg in fields[0].elts:
-                if not isinstance(arg, ast.Name):
-                    raise SyntaxError('Lambda arguments must variable names; found '
-                                      + str(type(arg)))
-            if sys.version_info[0] < 3:
-                return ast.Lambda(args=ast.arguments(args=[ast.Name(id=name.id, ctx=ast.Param())
-                                                           for name in fields[0].elts],
-                                                     vararg=None,
-                                                     kwarg=None,
-                                                     defaults=[]),
-                                  body=fields[1])
-            elif sys.version_info[0] == 3 and sys.version_info[1] < 8:
-                return ast.Lambda(args=ast.arguments(args=[ast.arg(arg=name.id, annotation=None)
-                                                           for name in fields[0].elts],
-                                                     vararg=None,
-                                                     kwonlyargs=[],
-                                                     kw_defaults=[],
-                                                     kwarg=None,
-                                                     defaults=[]),
-                                  body=fields[1])
-            else:
-                return ast.Lambda(args=ast.arguments(posonlyargs=[],
-                                                     args=[ast.arg(arg=name.id,
-                                                                   annotation=None,
-                                                                   type_comment=None)
-                                                           for name in fields[0].elts],
-                                                     vararg=None,
-                                                     kwonlyargs=[],
-                                                     kw_defaults=[],
-                                                     kwarg=None,
-                                                     defaults=[]),
-                                  body=fields[1])
-
-        elif node_type == 'Where':
-            if len(fields) != 2:
-                raise SyntaxError('Where node must have two fields; found ' + str(len(fields)))
-            if not isinstance(fields[1], ast.Lambda):
-                raise SyntaxError('Where predicate must be a lambda; found '
-                                  + str(type(fields[1])))
-            if len(fields[1].args.args) != 1:
-                raise SyntaxError('Where predicate must have exactly one argument; found '
-                                  + str(len(fields[1].args.args)))
-            return Where(source=fields[0], predicate=fields[1])
-
-        elif node_type == 'Select':
-            if len(fields) != 2:
-                raise SyntaxError('Select node must have two fields; found ' + str(len(fields)))
-            if not isinstance(fields[1], ast.Lambda):
-                raise SyntaxError('Select selector must be a lambda; found '
-                                  + str(type(fields[1])))
-            if len(fields[1].args.args) != 1:
-                raise SyntaxError('Select selector must have exactly one argument; found '
-                                  + str(len(fields[1].args.args)))
-            return Select(source=fields[0], selector=fields[1])
-
-        elif node_type == 'SelectMany':
-            if len(fields) != 2:
-                raise SyntaxError('SelectMany node must have two fields; found '
-                                  + str(len(fields)))
-            if not isinstance(fields[1], ast.Lambda):
-                raise SyntaxError('SelectMany selector must be a lambda; found '
-                                  + str(type(fields[1])))
-            if len(fields[1].args.args) != 1:
-                raise SyntaxError('SelectMany selector must have exactly one argument; found '
-                                  + str(len(fields[1].args.args)))
-            return SelectMany(source=fields[0], selector=fields[1])
-
-        elif node_type == 'First':
-            if len(fields) != 1:
-                raise SyntaxError('First node must have one field; found ' + str(len(fields)))
-            return First(source=fields[0])
-
-        elif node_type == 'Last':
-            if len(fields) != 1:
-                raise SyntaxError('Last node must have one field; found ' + str(len(fields)))
-            return Last(source=fields[0])
-
-        elif node_type == 'ElementAt':
-            if len(fields) != 2:
-                raise SyntaxError('ElementAt node must have two fields; found ' + str(len(fields)))
-            return ElementAt(source=fields[0], index=fields[1])
-
-        elif node_type == 'Contains':
-            if len(fields) != 2:
-                raise SyntaxError('Contains node must have two fields; found ' + str(len(fields)))
-            return Contains(source=fields[0], value=fields[1])
-
-        elif node_type == 'Aggregate':
-            if len(fields) != 3:
-                raise SyntaxError('Aggregate node must have three fields; found '
-                                  + str(len(fields)))
-            if not isinstance(fields[2], ast.Lambda):
-                raise SyntaxError('Aggregate func must be a lambda; found ' + str(type(fields[1])))
-            if len(fields[2].args.args) != 2:
-                raise SyntaxError('Aggregate func must have exactly two arguments; found '
-                                  + str(len(fields[2].args.args)))
-            return Aggregate(source=fields[0], seed=fields[1], func=fields[2])
-
-        elif node_type == 'Count':
-            if len(fields) != 1:
-                raise SyntaxError('Count node must have one field; found ' + str(len(fields)))
-            return Count(source=fields[0])
-
-        elif node_type == 'Max':
-            if len(fields) != 1:
-                raise SyntaxError('Max node must have one field; found ' + str(len(fields)))
-            return Max(source=fields[0])
-
-        elif node_type == 'Min':
-            if len(fields) != 1:
-                raise SyntaxError('Min node must have one field; found ' + str(len(fields)))
-            return Min(source=fields[0])
-
-        elif node_type == 'Sum':
-            if len(fields) != 1:
-                raise SyntaxError('Sum node must have one field; found ' + str(len(fields)))
-            return Sum(source=fields[0])
-
-        elif node_type == 'All':
-            if len(fields) != 2:
-                raise SyntaxError('All node must have two fields; found ' + str(len(fields)))
-            if not isinstance(fields[1], ast.Lambda):
-                raise SyntaxError('All predicate must be a lambda; found '
-                                  + str(type(fields[1])))
-            if len(fields[1].args.args) != 1:
-                raise SyntaxError('All predicate must have exactly one argument; found '
-                                  + str(len(fields[1].args.args)))
-            return All(source=fields[0], predicate=fields[1])
-
-        elif node_type == 'Any':
-            if len(fields) != 2:
-                raise SyntaxError('Any node must have two fields; found ' + str(len(fields)))
-            if not isinstance(fields[1], ast.Lambda):
-                raise SyntaxError('Any predicate must be a lambda; found '
-                                  + str(type(fields[1])))
-            if len(fields[1].args.args) != 1:
-                raise SyntaxError('Any predicate must have exactly one argument; found '
-                                  + str(len(fields[1].args.args)))
-            return Any(source=fields[0], predicate=fields[1])
-
-        elif node_type == 'Concat':
-            if len(fields) != 2:
-                raise SyntaxError('Concat node must have two fields; found ' + str(len(fields)))
-            return Concat(first=fields[0], second=fields[1])
-
-        elif node_type == 'Zip':
-            if len(fields) != 1:
-                raise SyntaxError('Zip node must have one field; found ' + str(len(fields)))
-            return Zip(source=fields[0])
-
-        elif node_type == 'OrderBy':
-            if len(fields) != 2:
-                raise SyntaxError('OrderBy node must have two fields; found ' + str(len(fields)))
-            if not isinstance(fields[1], ast.Lambda):
-                raise SyntaxError('OrderBy key selector must be a lambda; found '
-                                  + str(type(fields[1])))
-            if len(fields[1].args.args) != 1:
-                raise SyntaxError('OrderBy key selector must have exactly one argument; found '
-                                  + str(len(fields[1].args.args)))
-            return OrderBy(source=fields[0], key_selector=fields[1])
-
-        elif node_type == 'OrderByDescending':
-            if len(fields) != 2:
-                raise SyntaxError('OrderByDescending node must have two fields; found '
-                                  + str(len(fields)))
-            if not isinstance(fields[1], ast.Lambda):
-                raise SyntaxError('OrderByDescending key selector must be a lambda; found '
-                                  + str(type(fields[1])))
-            if len(fields[1].args.args) != 1:
-                raise SyntaxError('OrderByDescending key selector must have exactly one argument;'
-                                  + ' found ' + str(len(fields[1].args.args)))
-            return OrderByDescending(source=fields[0], key_selector=fields[1])
-
-        elif node_type == 'Choose':
-            if len(fields) != 2:
-                raise SyntaxError('Choose node must have two fields; found ' + str(len(fields)))
-            return Choose(source=fields[0], n=fields[1])
+    def labeled_node(self, children):
+        return define_label(self.labels(), children[0], children[1])
 
-        else:
-            raise SyntaxError('Unknown composite node type: ' + node_type)
+    def label_reference(self, children):
+        return resolve_label(self.labels(), children[0])
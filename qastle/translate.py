@@ -1,22 +1,226 @@
-from .transform import PythonASTToTextASTTransformer, TextASTToPythonASTTransformer
-from .parse import parse
+from .transform import (PythonASTToTextASTTransformer, PythonASTToMemoizedTextASTTransformer,
+                        PythonASTToSharedTextASTTransformer, TextASTToPythonASTTransformer)
+from .parse import parse, parse_to_python_ast, lark_syntax_error
+from .ast_util import copy_ast
+from .cache import canonical_text_ast
+from .columns_util import python_ast_to_columns, python_ast_to_column_dependencies
+from . import fastparse
 
 import ast
+import concurrent.futures
+import functools
+import os
+import pickle
+
+__all__ = ['python_source_to_python_ast', 'python_source_to_text_ast', 'python_ast_to_text_ast',
+           'write_text_ast', 'text_ast_to_python_ast', 'text_ast_to_columns',
+           'text_ast_to_column_dependencies', 'make_batch_executor', 'text_ast_to_python_ast_many',
+           'python_source_to_text_ast_many']
+
+
+def cached_translation(cache, key, translate):
+    value = cache.get(key)
+    if value is None:
+        value = translate()
+        cache.put(key, value)
+    return value
+
+
+def cached_normal_form_translation(cache, name, text_ast, python_ast, translate):
+    # Looks the text AST up as written and, if it is not there, in normal form, so that
+    # equivalent queries share entries. Only for translations that give the same result for
+    # equivalent queries. On a miss, the text AST is parsed once, by python_ast(), and the
+    # result of translate() on its normal form is kept under both keys. Each call counts as
+    # one hit or one miss.
+    from .normal_form import normalize
+    key = (name, canonical_text_ast(text_ast))
+    value = cache.get(key, count_miss=False)
+    if value is None:
+        normal_python_ast = normalize(python_ast())
+        normal_key = (name, PythonASTToTextASTTransformer().visit(normal_python_ast))
+        value = cached_translation(cache, normal_key, lambda: translate(normal_python_ast))
+        cache.put(key, value)
+    return value
 
 
 def python_source_to_python_ast(python_source):
     return ast.parse(python_source)
 
 
-def python_source_to_text_ast(python_source):
+def python_source_to_text_ast(python_source, cache=None):
+    if cache is not None:
+        # Python source is keyed as is, since its leading whitespace is significant
+        return cached_translation(cache,
+                                  ('python_source_to_text_ast', python_source),
+                                  lambda: python_source_to_text_ast(python_source))
     python_ast = python_source_to_python_ast(python_source)
     return python_ast_to_text_ast(python_ast)
 
 
-def python_ast_to_text_ast(python_ast):
-    return PythonASTToTextASTTransformer().visit(python_ast)
+def text_ast_transformer(share_subtrees=False, memoize=False):
+    # With share_subtrees, repeated subtrees are written once and then referred to by labels.
+    # With memoize, a node object that occurs in several places is only laid out once; this is
+    # always done when sharing subtrees.
+    if share_subtrees:
+        return PythonASTToSharedTextASTTransformer()
+    elif memoize:
+        return PythonASTToMemoizedTextASTTransformer()
+    return PythonASTToTextASTTransformer()
+
+
+def python_ast_to_text_ast(python_ast, share_subtrees=False, memoize=False):
+    return text_ast_transformer(share_subtrees=share_subtrees,
+                                memoize=memoize).visit(python_ast)
 
 
-def text_ast_to_python_ast(text_ast):
-    tree = parse(text_ast)
+def write_text_ast(python_ast, file, share_subtrees=False, memoize=False):
+    text_ast_transformer(share_subtrees=share_subtrees,
+                         memoize=memoize).write(python_ast, file.write)
+
+
+def text_ast_to_python_ast(text_ast, parser='lalr', backend='lark', cache=None, normalize=False):
+    if normalize:
+        from .normal_form import normalize as normalize_python_ast
+        if cache is not None:
+            return copy_ast(cached_normal_form_translation(
+                cache,
+                'normalized_python_ast',
+                text_ast,
+                lambda: text_ast_to_python_ast(text_ast, parser=parser, backend=backend),
+                lambda normal_python_ast: normal_python_ast))
+        return normalize_python_ast(text_ast_to_python_ast(text_ast,
+                                                           parser=parser,
+                                                           backend=backend))
+    if cache is not None:
+        # Every parser and backend gives the same AST, so they share cache entries. The cached
+        # AST is never handed out, only copies of it, so callers are free to modify them.
+        return copy_ast(cached_translation(cache,
+                                           ('text_ast_to_python_ast',
+                                            canonical_text_ast(text_ast)),
+                                           lambda: text_ast_to_python_ast(text_ast,
+                                                                          parser=parser,
+                                                                          backend=backend)))
+    if backend == 'fast':
+        return fastparse.text_ast_to_python_ast(text_ast)
+    elif backend != 'lark':
+        raise ValueError('Unknown backend: ' + str(backend) + "; must be 'lark' or 'fast'")
+    # Syntax errors are reported as SyntaxErrors, as by the fast backend, rather than lark's
+    # own exceptions
+    try:
+        if parser == 'lalr':
+            return parse_to_python_ast(text_ast)
+        tree = parse(text_ast, parser=parser)
+    except Exception as error:
+        syntax_error = lark_syntax_error(text_ast, error)
+        if syntax_error is None:
+            raise
+        raise syntax_error from error
     return TextASTToPythonASTTransformer().transform(tree)
+
+
+def text_ast_to_columns(text_ast, cache=None):
+    if cache is not None:
+        return cached_normal_form_translation(cache,
+                                              'text_ast_to_columns',
+                                              text_ast,
+                                              lambda: text_ast_to_python_ast(text_ast),
+                                              python_ast_to_columns)
+    return python_ast_to_columns(text_ast_to_python_ast(text_ast))
+
+
+def text_ast_to_column_dependencies(text_ast):
+    return python_ast_to_column_dependencies(text_ast_to_python_ast(text_ast))
+
+
+def batch_item_result(translate, options, portable_errors, item):
+    # Translates one item of a batch, returning the exception rather than raising it. Errors
+    # that cannot be sent back from a worker process are replaced by a SyntaxError with the
+    # same message.
+    try:
+        return translate(item, **options)
+    except Exception as error:
+        if portable_errors:
+            try:
+                pickle.dumps(error)
+            except Exception:
+                return SyntaxError(str(error))
+        return error
+
+
+def warm_batch_worker(parser, backend):
+    # Builds the parser a worker will use before it is given any work
+    if parser is not None:
+        text_ast_to_python_ast('', parser=parser, backend=backend)
+
+
+def make_batch_executor(executor='process', max_workers=None, parser='lalr', backend='lark'):
+    # A pool whose workers load the parser for text ASTs when they start, so it can be kept
+    # and passed to several batches. parser=None skips this, for pools that only translate
+    # Python source.
+    if executor == 'process':
+        pool_class = concurrent.futures.ProcessPoolExecutor
+    elif executor == 'thread':
+        pool_class = concurrent.futures.ThreadPoolExecutor
+    else:
+        raise ValueError('Unknown executor: ' + str(executor) + "; must be 'process' or 'thread'")
+    return pool_class(max_workers=max_workers,
+                      initializer=warm_batch_worker,
+                      initargs=(parser, backend))
+
+
+def translate_many(translate, items, options, executor, max_workers, chunksize, parser, backend):
+    # Results are in the order of the items, with an exception in place of the result of each
+    # item that failed. executor may be 'process', 'thread', None to translate in this
+    # thread, or an existing concurrent.futures.Executor.
+    items = list(items)
+    portable_errors = not (executor is None or executor == 'thread'
+                           or isinstance(executor, concurrent.futures.ThreadPoolExecutor))
+    function = functools.partial(batch_item_result, translate, options, portable_errors)
+    if executor is None:
+        return [function(item) for item in items]
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, max(len(items), 1))
+    if isinstance(executor, concurrent.futures.Executor):
+        pool = executor
+    else:
+        pool = make_batch_executor(executor, max_workers=max_workers, parser=parser,
+                                   backend=backend)
+    if chunksize is None:
+        # A few chunks per worker amortizes sending work to processes while keeping the load
+        # balanced
+        chunksize = max(1, len(items) // (4 * max_workers))
+    try:
+        return list(pool.map(function, items, chunksize=chunksize))
+    finally:
+        if pool is not executor:
+            pool.shutdown()
+
+
+def text_ast_to_python_ast_many(text_asts,
+                                parser='lalr',
+                                backend='lark',
+                                executor='process',
+                                max_workers=None,
+                                chunksize=None):
+    return translate_many(text_ast_to_python_ast,
+                          text_asts,
+                          {'parser': parser, 'backend': backend},
+                          executor,
+                          max_workers,
+                          chunksize,
+                          parser,
+                          backend)
+
+
+def python_source_to_text_ast_many(python_sources,
+                                   executor='process',
+                                   max_workers=None,
+                                   chunksize=None):
+    return translate_many(python_source_to_text_ast,
+                          python_sources,
+                          {},
+                          executor,
+                          max_workers,
+                          chunksize,
+                          None,
+                          None)
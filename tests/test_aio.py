@@ -0,0 +1,129 @@
+from .testing_util import *
+
+from qastle import aio, python_ast_to_text_ast, text_ast_to_python_ast, TranslationCache
+
+import asyncio
+import ast
+import threading
+
+import pytest
+
+
+text_ast = "(Select data_source (lambda (list e) (attr e 'pt')))"
+
+
+def test_aio_translations():
+    async def translate():
+        return await asyncio.gather(aio.text_ast_to_python_ast(text_ast),
+                                    aio.text_ast_to_python_ast(text_ast, backend='fast'),
+                                    aio.python_source_to_text_ast('a.b'),
+                                    aio.python_ast_to_text_ast(ast.parse('a.b')),
+                                    aio.text_ast_to_columns("(attr a 'b')"))
+
+    python_ast, fast_python_ast, python_source_text_ast, python_ast_text_ast, columns = (
+        asyncio.run(translate()))
+    assert_ast_nodes_are_equal(python_ast, text_ast_to_python_ast(text_ast))
+    assert_ast_nodes_are_equal(fast_python_ast, text_ast_to_python_ast(text_ast))
+    assert python_source_text_ast == python_ast_text_ast == "(attr a 'b')"
+    assert columns == 'a.b'
+
+
+def test_aio_errors():
+    with pytest.raises(SyntaxError):
+        asyncio.run(aio.text_ast_to_python_ast('(attr a)'))
+
+
+class BlockingTranslator(aio.AsyncTranslator):
+    # Counts runs and holds each one until released
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.n_runs = 0
+        self.release = threading.Event()
+
+    async def run(self, key, function, timeout=None, copy_result=None):
+        def blocking_function():
+            self.n_runs += 1
+            self.release.wait()
+            self.last_result = function()
+            return self.last_result
+
+        return await super().run(key, blocking_function, timeout=timeout,
+                                 copy_result=copy_result)
+
+
+def test_aio_coalesces_identical_requests():
+    translator = BlockingTranslator()
+
+    async def translate():
+        tasks = [asyncio.ensure_future(translator.text_ast_to_python_ast(text_ast))
+                 for _ in range(5)]
+        tasks.append(asyncio.ensure_future(translator.text_ast_to_python_ast('(list)')))
+        await asyncio.sleep(0.01)
+        translator.release.set()
+        results = await asyncio.gather(*tasks)
+        assert translator.in_flight[asyncio.get_running_loop()] == {}
+        return results
+
+    results = asyncio.run(translate())
+    assert translator.n_runs == 2
+    assert len({id(result) for result in results}) == 6
+    for result in results[:5]:
+        assert python_ast_to_text_ast(result) == text_ast
+    assert python_ast_to_text_ast(results[5]) == '(list)'
+    translator.shutdown()
+
+
+def test_aio_shared_result_is_never_handed_out():
+    translator = BlockingTranslator()
+
+    async def translate():
+        tasks = [asyncio.ensure_future(translator.text_ast_to_python_ast(text_ast))
+                 for _ in range(3)]
+        await asyncio.sleep(0.01)
+        translator.release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(translate())
+    assert translator.n_runs == 1
+    assert all(result is not translator.last_result for result in results)
+    translator.shutdown()
+
+
+def test_aio_requests_with_different_caches_are_not_shared():
+    translator = BlockingTranslator()
+    caches = [TranslationCache(), TranslationCache()]
+
+    async def translate():
+        tasks = [asyncio.ensure_future(translator.text_ast_to_columns(text_ast, cache=cache))
+                 for cache in caches]
+        await asyncio.sleep(0.01)
+        translator.release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(translate()) == ['pt', 'pt']
+    assert translator.n_runs == 2
+    assert all(cache.info().currsize > 0 for cache in caches)
+    translator.shutdown()
+
+
+def test_aio_timeout_and_cancellation():
+    translator = BlockingTranslator()
+
+    async def translate():
+        first = asyncio.ensure_future(translator.text_ast_to_python_ast(text_ast))
+        second = asyncio.ensure_future(translator.text_ast_to_python_ast(text_ast,
+                                                                         timeout=0.01))
+        queued = asyncio.ensure_future(translator.text_ast_to_python_ast('(list)'))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await second
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        translator.release.set()
+        return await first
+
+    result = asyncio.run(translate())
+    assert python_ast_to_text_ast(result) == text_ast
+    assert translator.n_runs == 1
+    translator.shutdown()
@@ -1,8 +1,20 @@
 from .testing_util import *
+from .test_parse import text_ast_corpus
 
 from qastle import *
 
 import ast
+import io
+
+import pytest
+
+
+def assert_parsers_agree(text_ast):
+    # Every text AST in the tests below is also checked to parse the same way with LALR and
+    # with Earley
+    assert parse(text_ast, parser='lalr') == parse(text_ast, parser='earley'), text_ast
+    assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast, parser='lalr'),
+                               text_ast_to_python_ast(text_ast, parser='earley'))
 
 
 def assert_identical_atom(initial_text):
@@ -11,6 +23,7 @@ def assert_identical_atom(initial_text):
     assert final_text_ast == initial_text.strip(' \t\r\n')
     final_python_ast = text_ast_to_python_ast(initial_text)
     assert_ast_nodes_are_equal(final_python_ast, initial_python_ast)
+    assert_parsers_agree(initial_text)
 
 
 def assert_equivalent_literal(initial_text):
@@ -19,13 +32,18 @@ def assert_equivalent_literal(initial_text):
     assert ast.literal_eval(final_text_ast) == ast.literal_eval(initial_text)
     final_python_ast = text_ast_to_python_ast(initial_text)
     assert_ast_nodes_are_equal(final_python_ast, initial_python_ast)
+    assert_parsers_agree(initial_text)
 
 
 def assert_equivalent_python_ast_and_text_ast(initial_python_ast, initial_text_ast):
     final_text_ast = python_ast_to_text_ast(initial_python_ast)
     assert final_text_ast == initial_text_ast
+    stream = io.StringIO()
+    write_text_ast(initial_python_ast, stream)
+    assert stream.getvalue() == initial_text_ast
     final_python_ast = text_ast_to_python_ast(initial_text_ast)
     assert_ast_nodes_are_equal(final_python_ast, initial_python_ast)
+    assert_parsers_agree(initial_text_ast)
 
 
 def assert_equivalent_python_text_and_text_ast(python_text, initial_text_ast):
@@ -69,6 +87,29 @@ def test_numeric_literals():
     assert_equivalent_literal('.13e-14')
 
 
+def test_atoms_match_python():
+    for text in ['True', 'False', 'None', '_x1', 'Event', "'pt'", '"pt"', "'a\\'b'", "'\\n\\t'",
+                 "'\\x41\\u00e9'", "'\\\\'", '0', '00', '7', '-7', '-0', '1.', '-1.5e-3', '.5E+2',
+                 '1' * 700, '-' + '1' * 700]:
+        assert_ast_nodes_are_equal(text_ast_to_python_ast(text), ast.parse(text))
+    assert_ast_nodes_are_equal(text_ast_to_python_ast('+2e3'), ast.parse('2e3'))
+
+
+def test_invalid_atoms():
+    for text in ['012', '-012', 'lambda', 'pass', "'\\N{not a name}'"]:
+        with pytest.raises(SyntaxError):
+            text_ast_to_python_ast(text)
+
+
+def test_repeated_atoms_are_distinct_nodes():
+    python_ast = text_ast_to_python_ast("(list Event Event 'pt' 'pt' -1 -1)")
+    elements = python_ast.body[0].value.elts
+    assert elements[0] is not elements[1]
+    assert elements[2] is not elements[3]
+    assert elements[4] is not elements[5]
+    assert elements[4].operand is not elements[5].operand
+
+
 def test_list():
     assert_equivalent_python_text_and_text_ast('[]', '(list)')
     assert_equivalent_python_text_and_text_ast('[0]', '(list 0)')
@@ -280,3 +321,177 @@ def test_Choose():
                          n=unwrap_ast(ast.parse('2')))
     assert_equivalent_python_ast_and_text_ast(wrap_ast(choose_node),
                                               '(Choose data_source 2)')
+
+
+def test_Let():
+    let_node = Let(value=unwrap_ast(ast.parse('e.jets()')),
+                   func=unwrap_ast(ast.parse('lambda j: j.Count()')))
+    assert_equivalent_python_ast_and_text_ast(
+        wrap_ast(let_node),
+        "(Let (call (attr e 'jets')) (lambda (list j) (call (attr j 'Count'))))")
+
+
+def test_write_text_ast_long_chain():
+    python_ast = unwrap_ast(ast.parse('data_source'))
+    text_ast = 'data_source'
+    for _ in range(5000):
+        python_ast = Where(source=python_ast, predicate=unwrap_ast(ast.parse('lambda e: e')))
+        text_ast = '(Where ' + text_ast + ' (lambda (list e) e))'
+    assert python_ast_to_text_ast(wrap_ast(python_ast)) == text_ast
+    stream = io.StringIO()
+    write_text_ast(wrap_ast(python_ast), stream)
+    assert stream.getvalue() == text_ast
+
+
+def test_unsupported_node():
+    with pytest.raises(SyntaxError):
+        python_source_to_text_ast('x = 1')
+    with pytest.raises(SyntaxError):
+        python_source_to_text_ast('{**c}')
+
+
+def test_long_boolean_and_comparison_chains():
+    n = 5000
+    names = ['x' + str(i) for i in range(n)]
+    text_ast = names[0]
+    for name in names[1:]:
+        text_ast = '(and ' + text_ast + ' ' + name + ')'
+    assert python_source_to_text_ast(' and '.join(names)) == text_ast
+    compare_node = ast.Compare(left=ast.Name(id='x', ctx=ast.Load()),
+                               ops=[ast.Lt() for _ in range(n)],
+                               comparators=[ast.Name(id='x', ctx=ast.Load()) for _ in range(n)])
+    text_ast = '(< x x)'
+    for _ in range(n - 1):
+        text_ast = '(and ' + text_ast + ' (< x x))'
+    assert python_ast_to_text_ast(compare_node) == text_ast
+
+
+def test_share_subtrees():
+    python_source = 'f(a.b.c, a.b.d, a.b.c, 1 < a.b < 2)'
+    text_ast = python_ast_to_text_ast(ast.parse(python_source), share_subtrees=True)
+    assert text_ast == ("(call f #1=(attr #2=(attr a 'b') 'c') (attr #2# 'd') #1#"
+                        + " (and (< 1 #2#) (< #2# 2)))")
+    unshared_text_ast = python_ast_to_text_ast(ast.parse(python_source))
+    assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast),
+                               text_ast_to_python_ast(unshared_text_ast))
+    file = io.StringIO()
+    write_text_ast(ast.parse(python_source), file, share_subtrees=True)
+    assert file.getvalue() == text_ast
+
+
+def test_share_subtrees_corpus():
+    for text_ast in text_ast_corpus:
+        python_ast = text_ast_to_python_ast(text_ast)
+        shared_text_ast = python_ast_to_text_ast(python_ast, share_subtrees=True)
+        assert_ast_nodes_are_equal(text_ast_to_python_ast(shared_text_ast), python_ast)
+
+
+def test_share_subtrees_deep():
+    depth = 5000
+    text_ast = '(list' + ' (list' * (depth - 1) + ')' * depth
+    python_ast = text_ast_to_python_ast(text_ast, backend='fast')
+    assert python_ast_to_text_ast(python_ast, share_subtrees=True) == text_ast
+
+
+class SharedAlphaNormalTextASTTransformer(AlphaNormalTextASTTransformer,
+                                          PythonASTToSharedTextASTTransformer):
+    # Lays lambdas out as lists with callables that keep track of scopes
+    pass
+
+
+def test_share_subtrees_list_and_callable_layouts():
+    python_ast = text_ast_to_python_ast('(list (lambda (list x) x) (lambda (list y) y)'
+                                        + ' (lambda (list z) (lambda (list w) (list z w))))')
+    transformer = SharedAlphaNormalTextASTTransformer()
+    assert (transformer.visit(python_ast)
+            == '(list #1=(lambda (list #0.0) #0.0) #1#'
+            + ' (lambda (list #0.0) (lambda (list #1.0) (list #0.0 #1.0))))')
+    assert transformer.scopes == [{}]
+    python_ast = text_ast_to_python_ast("(Select src (lambda (list e) (list #1=(attr e 'pt')"
+                                        + " (Select (attr e 'jets') (lambda (list e) #1#)))))")
+    assert (SharedAlphaNormalTextASTTransformer().visit(python_ast)
+            == alpha_normal_text_ast(python_ast)
+            == "(Select src (lambda (list #0.0) (list (attr #0.0 'pt')"
+            + " (Select (attr #0.0 'jets') (lambda (list #1.0) (attr #1.0 'pt'))))))")
+    assert (python_ast_to_text_ast(text_ast_to_python_ast('(list (lambda (list e) e)'
+                                                          + ' (lambda (list e) (- e)))'),
+                                   share_subtrees=True)
+            == '(list (lambda (list e) e) (lambda (list e) (- e)))')
+    python_ast = text_ast_to_python_ast("(Select s (lambda (list e) (attr e 'a')))")
+    assert (SharedAlphaNormalTextASTTransformer().visit(python_ast)
+            == alpha_normal_text_ast(python_ast))
+
+
+def shared_dag(depth):
+    node = ast.Name(id='e', ctx=ast.Load())
+    for _ in range(depth):
+        node = ast.BinOp(left=node, op=ast.Add(), right=node)
+    return wrap_ast(node)
+
+
+def test_memoize():
+    python_ast = shared_dag(4)
+    text_ast = python_ast_to_text_ast(python_ast)
+    assert python_ast_to_text_ast(python_ast, memoize=True) == text_ast
+    file = io.StringIO()
+    write_text_ast(python_ast, file, memoize=True)
+    assert file.getvalue() == text_ast
+    assert (python_ast_to_text_ast(python_ast, share_subtrees=True)
+            == '(+ #1=(+ #2=(+ #3=(+ e e) #3#) #2#) #1#)')
+
+
+def test_memoize_corpus():
+    for text_ast in text_ast_corpus:
+        python_ast = text_ast_to_python_ast(text_ast)
+        assert (python_ast_to_text_ast(python_ast, memoize=True)
+                == python_ast_to_text_ast(python_ast))
+
+
+def test_memoize_lays_out_shared_nodes_once():
+    layouts = []
+
+    class CountingTransformer(PythonASTToMemoizedTextASTTransformer):
+        def layout(self, node):
+            layouts.append(node)
+            return super().layout(node)
+
+    CountingTransformer().visit(shared_dag(12))
+    assert len(layouts) == len({id(node) for node in layouts}) == 15
+
+
+def test_incremental():
+    layouts = []
+
+    class CountingTransformer(PythonASTToIncrementalTextASTTransformer):
+        def layout(self, node):
+            layouts.append(node)
+            return super().layout(node)
+
+    transformer = CountingTransformer()
+    query = ast.parse('data_source').body[0].value
+    for _ in range(10):
+        query = ast.Call(func=ast.Attribute(value=query, attr='Select', ctx=ast.Load()),
+                         args=[ast.parse('lambda e: e.pt').body[0].value],
+                         keywords=[])
+        layouts.clear()
+        text_ast = transformer.visit(wrap_ast(query))
+        assert text_ast == python_ast_to_text_ast(wrap_ast(query))
+        assert len(layouts) <= 10
+
+
+def test_incremental_invalidate():
+    transformer = PythonASTToIncrementalTextASTTransformer()
+    python_ast = ast.parse('a.b.c')
+    inner = python_ast.body[0].value.value
+    outer = ast.parse('f(x)')
+    outer.body[0].value.args[0] = python_ast.body[0].value
+    assert transformer.visit(python_ast) == "(attr (attr a 'b') 'c')"
+    assert transformer.visit(outer) == "(call f (attr (attr a 'b') 'c'))"
+    inner.attr = 'd'
+    assert transformer.visit(outer) == "(call f (attr (attr a 'b') 'c'))"
+    transformer.invalidate(inner)
+    assert transformer.visit(python_ast) == "(attr (attr a 'd') 'c')"
+    assert transformer.visit(outer) == "(call f (attr (attr a 'd') 'c'))"
+    transformer.clear()
+    inner.attr = 'e'
+    assert transformer.visit(outer) == "(call f (attr (attr a 'e') 'c'))"
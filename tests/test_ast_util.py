@@ -18,3 +18,36 @@ def test_wrap_ast():
     parsed_node = ast.parse('a')
     name_node = ast.Name(id='a', ctx=ast.Load())
     assert_ast_nodes_are_equal(wrap_ast(name_node), parsed_node)
+
+
+def test_copy_ast():
+    original = ast.parse('f(a.b, [1, 2], lambda x: x + 1)')
+    copied = copy_ast(original)
+    assert_ast_nodes_are_equal(copied, original)
+    original_nodes = {id(node) for node in ast.walk(original)}
+    assert not any(id(node) in original_nodes for node in ast.walk(copied))
+    assert copied.body[0].lineno == original.body[0].lineno
+
+
+def test_copy_ast_shared_nodes():
+    shared = ast.Name(id='a', ctx=ast.Load())
+    original = ast.List(elts=[shared, shared], ctx=ast.Load())
+    copied = copy_ast(original)
+    assert copied.elts[0] is copied.elts[1]
+    assert copied.elts[0] is not shared
+    unshared = copy_ast(original, share_subtrees=False)
+    assert unshared.elts[0] is not unshared.elts[1]
+    assert_ast_nodes_are_equal(unshared, original)
+
+
+def test_copy_ast_deep():
+    depth = 5000
+    original = ast.Name(id='a', ctx=ast.Load())
+    for _ in range(depth):
+        original = ast.List(elts=[original], ctx=ast.Load())
+    copied = copy_ast(original)
+    for _ in range(depth):
+        assert copied is not original
+        copied = copied.elts[0]
+        original = original.elts[0]
+    assert copied.id == 'a'
@@ -0,0 +1,61 @@
+from .testing_util import *
+
+from qastle import *
+
+import concurrent.futures
+
+import pytest
+
+
+text_asts = ['(list 1)', '(list', "(attr a 'b')", '(attr a)', '', '(Count data_source)']
+
+
+def check_text_ast_results(results):
+    assert len(results) == len(text_asts)
+    for text_ast, result in zip(text_asts, results):
+        try:
+            expected = text_ast_to_python_ast(text_ast)
+        except Exception:
+            assert isinstance(result, Exception)
+        else:
+            assert_ast_nodes_are_equal(result, expected)
+
+
+def test_text_ast_to_python_ast_many():
+    for executor in [None, 'thread', 'process']:
+        check_text_ast_results(text_ast_to_python_ast_many(text_asts, executor=executor))
+    check_text_ast_results(text_ast_to_python_ast_many(iter(text_asts), backend='fast',
+                                                       executor='thread', max_workers=2,
+                                                       chunksize=2))
+
+
+def test_text_ast_to_python_ast_many_errors():
+    thread_results = text_ast_to_python_ast_many(text_asts, executor='thread')
+    process_results = text_ast_to_python_ast_many(text_asts, executor='process')
+    assert type(thread_results[1]) is SyntaxError
+    assert type(process_results[1]) is SyntaxError
+    assert str(process_results[1]) == str(thread_results[1])
+    assert process_results[1].offset == thread_results[1].offset
+    assert isinstance(process_results[3], SyntaxError)
+
+
+def test_batch_executor():
+    with make_batch_executor('process', max_workers=2) as executor:
+        check_text_ast_results(text_ast_to_python_ast_many(text_asts, executor=executor))
+        check_text_ast_results(text_ast_to_python_ast_many(text_asts, executor=executor))
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        check_text_ast_results(text_ast_to_python_ast_many(text_asts, executor=executor))
+    with pytest.raises(ValueError):
+        make_batch_executor('fiber')
+    with pytest.raises(ValueError):
+        text_ast_to_python_ast_many(text_asts, executor='fiber')
+
+
+def test_python_source_to_text_ast_many():
+    python_sources = ['a.b', 'a +', '[1]']
+    for executor in [None, 'thread', 'process']:
+        results = python_source_to_text_ast_many(python_sources, executor=executor)
+        assert results[0] == "(attr a 'b')"
+        assert isinstance(results[1], SyntaxError)
+        assert results[2] == '(list 1)'
+    assert python_source_to_text_ast_many([]) == []
@@ -0,0 +1,85 @@
+from .testing_util import *
+from .test_parse import text_ast_corpus
+from .test_registry import Distinct
+
+from qastle import *
+from qastle.binary import binary_ast_magic, binary_ast_version, node_type_opcodes
+
+import ast
+
+import pytest
+
+
+def round_trip(python_ast):
+    return binary_ast_to_python_ast(python_ast_to_binary_ast(python_ast))
+
+
+def test_round_trip():
+    for text_ast in text_ast_corpus:
+        python_ast = text_ast_to_python_ast(text_ast)
+        assert_ast_nodes_are_equal(round_trip(python_ast), python_ast)
+
+
+def test_round_trip_python_source():
+    for python_source in ['', 'a.b(1, -2.5, "c")', '[x, (y, z)]', '{1: a, "b": None}',
+                          'x if y else -z', 'not a or b and c', '1 < a <= 2',
+                          "s.Where('lambda e: e.pt > 5').Select('lambda e: e.eta')"]:
+        python_ast = insert_linq_nodes(ast.parse(python_source))
+        assert_ast_nodes_are_equal(round_trip(python_ast),
+                                   text_ast_to_python_ast(python_ast_to_text_ast(python_ast)))
+
+
+def test_encoding_is_compact():
+    text_ast = ("(Select data_column_source (lambda (list Event) (list "
+                + ' '.join("(call (attr (attr Event '" + collection + "') '" + column + "'))"
+                           for collection in ['Electrons', 'Muons']
+                           for column in ['pt', 'eta', 'phi', 'e'])
+                + ')))')
+    assert len(python_ast_to_binary_ast(text_ast_to_python_ast(text_ast))) * 2 < len(text_ast)
+
+
+def test_many_strings():
+    python_ast = ast.parse('[' + ', '.join('a' + str(index) for index in range(300)) + ']')
+    assert_ast_nodes_are_equal(round_trip(python_ast), python_ast)
+
+
+def test_named_composite():
+    register_node_class(Distinct, lambda_arities={1: 1})
+    try:
+        python_ast = text_ast_to_python_ast('(Distinct data_source (lambda (list e) e))')
+        assert_ast_nodes_are_equal(round_trip(python_ast), python_ast)
+    finally:
+        unregister_node_type('Distinct')
+
+
+def test_invalid_atom():
+    with pytest.raises(SyntaxError):
+        python_ast_to_binary_ast(ast.parse('1j'))
+
+
+def test_invalid_data():
+    data = python_ast_to_binary_ast(ast.parse('a.b'))
+    with pytest.raises(ValueError):
+        binary_ast_to_python_ast(b'(attr a b)')
+    with pytest.raises(ValueError):
+        binary_ast_to_python_ast(data[:len(binary_ast_magic)] + bytes([binary_ast_version + 1])
+                                 + data[len(binary_ast_magic) + 1:])
+    with pytest.raises(ValueError):
+        binary_ast_to_python_ast(data[:-1])
+    with pytest.raises(ValueError):
+        binary_ast_to_python_ast(data + data[-2:])
+
+
+def test_invalid_node():
+    data = python_ast_to_binary_ast(ast.parse('a'))
+    with pytest.raises(SyntaxError):
+        binary_ast_to_python_ast(data + bytes([node_type_opcodes['attr'], 1]))
+
+
+def test_deep():
+    depth = 5000
+    python_ast = text_ast_to_python_ast('(list ' * depth + ')' * depth, backend='fast')
+    node = round_trip(python_ast).body[0].value
+    for _ in range(depth - 1):
+        node = node.elts[0]
+    assert node.elts == []
@@ -0,0 +1,219 @@
+from .testing_util import *
+
+from qastle import *
+from qastle.cache import canonical_text_ast
+
+import qastle.cache
+
+import ast
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+
+
+def test_cache_lru_eviction():
+    cache = TranslationCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.info() == CacheInfo(hits=3, misses=1, evictions=1, maxsize=2, currsize=2)
+    cache.clear()
+    assert cache.info() == CacheInfo(hits=0, misses=0, evictions=0, maxsize=2, currsize=0)
+
+
+def test_cache_bad_size():
+    with pytest.raises(ValueError):
+        TranslationCache(maxsize=0)
+
+
+def test_cache_threads():
+    cache = TranslationCache(maxsize=16)
+    n_threads = 8
+    n_operations = 1000
+
+    def work(thread_index):
+        for operation_index in range(n_operations):
+            key = (thread_index + operation_index) % 32
+            if cache.get(key) is None:
+                cache.put(key, key)
+
+    threads = [threading.Thread(target=work, args=(thread_index,))
+               for thread_index in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    info = cache.info()
+    assert info.hits + info.misses == n_threads * n_operations
+    assert info.currsize == 16
+    assert info.evictions >= info.misses - 32
+
+
+def test_canonical_text_ast():
+    text_ast = ' ( Select  data_source\n\t(lambda (list e) ( attr e  \'pt\' ) ) ) '
+    assert canonical_text_ast(text_ast) == "(Select data_source (lambda (list e) (attr e 'pt')))"
+    assert canonical_text_ast("(list 'a  b' \"c ) \")") == "(list 'a  b' \"c ) \")"
+    assert canonical_text_ast('(list(list))') == '(list(list))'
+    assert canonical_text_ast(' \t\r\n') == ''
+
+
+def test_text_ast_to_python_ast_cache():
+    cache = TranslationCache()
+    text_ast = "(Select data_source (lambda (list e) (attr e 'pt')))"
+    expected_ast = text_ast_to_python_ast(text_ast)
+    first_ast = text_ast_to_python_ast(text_ast, cache=cache)
+    assert_ast_nodes_are_equal(first_ast, expected_ast)
+    first_ast.body[0].value.source.id = 'modified'
+    second_ast = text_ast_to_python_ast(' ' + text_ast.replace(' ', '  '), cache=cache)
+    assert_ast_nodes_are_equal(second_ast, expected_ast)
+    third_ast = text_ast_to_python_ast(text_ast, backend='fast', cache=cache)
+    assert_ast_nodes_are_equal(third_ast, expected_ast)
+    assert third_ast is not second_ast
+    assert cache.info() == CacheInfo(hits=2, misses=1, evictions=0, maxsize=1024, currsize=1)
+
+
+def test_text_ast_to_python_ast_cache_errors():
+    cache = TranslationCache()
+    for _ in range(2):
+        with pytest.raises(SyntaxError):
+            text_ast_to_python_ast('(attr a)', cache=cache)
+    assert len(cache) == 0
+
+
+def test_python_source_to_text_ast_cache():
+    cache = TranslationCache()
+    python_source = "data_source.Select('lambda e: e.pt')"
+    for _ in range(3):
+        assert (python_source_to_text_ast(python_source, cache=cache)
+                == python_source_to_text_ast(python_source))
+    assert cache.info().hits == 2
+    assert cache.info().misses == 1
+    with pytest.raises(SyntaxError):
+        python_source_to_text_ast(' ' + python_source, cache=cache)
+
+
+def test_cache_shared_between_directions():
+    cache = TranslationCache()
+    text_ast = python_source_to_text_ast('a.b', cache=cache)
+    assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast, cache=cache), ast.parse('a.b'))
+    assert len(cache) == 2
+
+
+def test_persistent_cache(tmp_path):
+    pathname = str(tmp_path / 'cache.sqlite')
+    cache = PersistentTranslationCache(pathname)
+    assert cache.get('a') is None
+    cache.put('a', [1, 2])
+    assert cache.get('a') == [1, 2]
+    assert cache.info() == CacheInfo(hits=1, misses=1, evictions=0, maxsize=65536, currsize=1)
+    cache.close()
+    reopened_cache = PersistentTranslationCache(pathname)
+    assert reopened_cache.get('a') == [1, 2]
+    reopened_cache.clear()
+    assert len(reopened_cache) == 0
+
+
+def test_persistent_cache_is_keyed_by_source(tmp_path, monkeypatch):
+    pathname = str(tmp_path / 'cache.sqlite')
+    PersistentTranslationCache(pathname).put('a', 1)
+    assert PersistentTranslationCache(pathname).get('a') == 1
+    monkeypatch.setattr(qastle.cache, 'package_source_sha256', lambda: '0' * 64)
+    assert PersistentTranslationCache(pathname).get('a') is None
+
+
+def test_persistent_cache_eviction(tmp_path):
+    cache = PersistentTranslationCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.info().evictions == 1
+
+
+def test_persistent_cache_byte_limit(tmp_path):
+    cache = PersistentTranslationCache(str(tmp_path / 'cache.sqlite'), max_bytes=2500)
+    for index in range(10):
+        cache.put(index, 'x' * 1000)
+    assert len(cache) == 2
+    cache.put('large', 'x' * 10000)
+    assert len(cache) == 1
+    assert cache.get('large') == 'x' * 10000
+
+
+def test_persistent_cache_hits_are_written_together(tmp_path):
+    pathname = str(tmp_path / 'cache.sqlite')
+    cache = PersistentTranslationCache(pathname, touch_interval=3600)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    database = sqlite3.connect(pathname)
+    written = dict(database.execute('SELECT key, last_used FROM entries'))
+    for _ in range(10):
+        assert cache.get('a') == 1
+    assert dict(database.execute('SELECT key, last_used FROM entries')) == written
+    cache.close()
+    last_used = dict(database.execute('SELECT key, last_used FROM entries'))
+    assert last_used[cache.hash_key('a')] > written[cache.hash_key('a')]
+    assert last_used[cache.hash_key('b')] == written[cache.hash_key('b')]
+    database.close()
+
+
+def test_persistent_cache_totals(tmp_path):
+    pathname = str(tmp_path / 'cache.sqlite')
+    database = sqlite3.connect(pathname)
+    database.execute('CREATE TABLE entries (key BLOB PRIMARY KEY, value BLOB NOT NULL,'
+                     ' size INTEGER NOT NULL, last_used REAL NOT NULL)')
+    database.execute("INSERT INTO entries VALUES (x'00', x'00', 10, 0)")
+    database.commit()
+    cache = PersistentTranslationCache(pathname, max_entries=4, max_bytes=3000)
+    assert len(cache) == 1
+    for index in range(6):
+        cache.put(index % 3, 'x' * (100 * index))
+    cache.put('large', 'x' * 2000)
+    assert database.execute('SELECT n_entries, n_bytes FROM totals').fetchone() == \
+        database.execute('SELECT COUNT(*), TOTAL(size) FROM entries').fetchone()
+    assert cache.info().evictions > 0
+    cache.clear()
+    assert database.execute('SELECT n_entries, n_bytes FROM totals').fetchone() == (0, 0)
+    database.close()
+
+
+def test_persistent_cache_translations(tmp_path):
+    cache = PersistentTranslationCache(str(tmp_path / 'cache.sqlite'))
+    text_ast = "(Select data_source (lambda (list e) (list (attr e 'pt') (attr e 'eta'))))"
+    expected_ast = text_ast_to_python_ast(text_ast)
+    for _ in range(2):
+        assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast, cache=cache), expected_ast)
+        assert text_ast_to_columns(text_ast, cache=cache) == 'pt, eta'
+    assert cache.info().hits == 2
+
+
+def test_persistent_cache_processes(tmp_path):
+    # Several processes writing at once, then a fresh process that is served from the cache
+    # without importing lark
+    pathname = str(tmp_path / 'cache.sqlite')
+    writer = ('import sys\n'
+              + 'from qastle import *\n'
+              + 'cache = PersistentTranslationCache(sys.argv[1], max_entries=50)\n'
+              + 'for index in range(100):\n'
+              + "    text_ast = '(Select s (lambda (list e) (attr e \\'c%d\\')))' % index\n"
+              + '    text_ast_to_columns(text_ast, cache=cache)\n')
+    processes = [subprocess.Popen([sys.executable, '-c', writer, pathname]) for _ in range(4)]
+    for process in processes:
+        assert process.wait() == 0
+    assert len(PersistentTranslationCache(pathname)) == 50
+    reader = ('import sys; from qastle import *; '
+              + 'cache = PersistentTranslationCache(sys.argv[1]); '
+              + "assert text_ast_to_columns('(Select s (lambda (list e) (attr e \\'c99\\')))',"
+              + " cache=cache) == 'c99'; "
+              + "assert cache.info().hits == 1; assert 'lark' not in sys.modules")
+    subprocess.run([sys.executable, '-c', reader, pathname], check=True)
@@ -19,3 +19,100 @@ def test_python_ast_to_columns():
                                                           (row.collection_i.column_1(),\
                                                            row.collection_ii.column_2())'))))
     assert python_ast_to_columns(node) == 'collection_i.column_1(), collection_ii.column_2()'
+
+
+def test_python_ast_to_columns_deep_attribute():
+    depth = 5000
+    body = ast.Name(id='row', ctx=ast.Load())
+    for _ in range(depth):
+        body = ast.Attribute(value=body, attr='a', ctx=ast.Load())
+    node = wrap_ast(Select(source=unwrap_ast(ast.parse('the_source')),
+                           selector=ast.Lambda(args=unwrap_ast(ast.parse('lambda row: 0')).args,
+                                               body=body)))
+    assert python_ast_to_columns(node) == '.'.join(['a'] * depth)
+
+
+def assert_column_dependencies(text_ast, expected):
+    assert text_ast_to_column_dependencies(text_ast) == expected
+
+
+def test_column_dependencies_filter_and_output():
+    assert_column_dependencies("(Select (Where events"
+                               + " (lambda (list e) (> (call (attr e 'met')) 50)))"
+                               + " (lambda (list e) (list (call (attr e 'pt'))"
+                               + " (Count (call (attr e 'jets') 'AntiKt4')))))",
+                               {'met()': {'filter'},
+                                'pt()': {'output'},
+                                "jets('AntiKt4')": {'aggregate'}})
+
+
+def test_column_dependencies_through_lambda_scopes():
+    assert_column_dependencies("(SelectMany events (lambda (list e) (Select (call (attr e 'jets'))"
+                               + " (lambda (list j) (call (attr j 'eta'))))))",
+                               {'jets().eta()': {'output'}, 'jets()': {'output'}})
+    assert_column_dependencies("(Select events (lambda (list e)"
+                               + " (attr (call (attr (First (call (attr e 'jets'))) 'p4')) 'x')))",
+                               {'jets().p4().x': {'output'}, 'jets()': {'aggregate'}})
+    assert_column_dependencies("(Select events (lambda (list e)"
+                               + " (call (lambda (list x) (attr x 'a')) e)))",
+                               {'a': {'output'}})
+
+
+def test_column_dependencies_through_let():
+    assert_column_dependencies("(Select events (lambda (list e) (Let (call (attr e 'jets'))"
+                               + " (lambda (list v) (list (Count v) (Select v"
+                               + " (lambda (list j) (call (attr j 'pt')))))))))",
+                               {'jets()': {'aggregate', 'output'}, 'jets().pt()': {'output'}})
+
+
+def test_column_dependencies_aggregate_in_filter():
+    assert_column_dependencies("(Where events (lambda (list e)"
+                               + " (> (Count (Where (call (attr e 'jets'))"
+                               + " (lambda (list j) (> (call (attr j 'pt')) 30)))) 2)))",
+                               {'jets().pt()': {'filter'},
+                                'jets()': {'aggregate', 'filter'},
+                                whole_element_path: {'output'}})
+    assert whole_element_path == ''
+
+
+def test_column_dependencies_placeholders():
+    assert_column_dependencies("(Select (Where events (lambda (list e) (> (attr e 'pt') $cut)))"
+                               + " (lambda (list e) (list (attr e 'eta') $scale)))",
+                               {'pt': {'filter'}, 'eta': {'output'}})
+    python_ast = prepare("(Where events (lambda (list e) (> (attr e 'pt') $cut)))").python_ast
+    assert python_ast_to_column_dependencies(python_ast) == {'pt': {'filter'},
+                                                             whole_element_path: {'output'}}
+
+
+def test_column_dependencies_only_in_aggregate():
+    assert_column_dependencies("(Count (Select events (lambda (list e) (attr e 'pt'))))", {})
+    assert_column_dependencies("(Select events (lambda (list e)"
+                               + " (Sum (Select (call (attr e 'jets'))"
+                               + " (lambda (list j) (call (attr j 'pt')))))))",
+                               {'jets().pt()': {'aggregate'}, 'jets()': {'aggregate'}})
+    assert_column_dependencies("(Aggregate (Select events (lambda (list e) (attr e 'x'))) 0"
+                               + " (lambda (list acc v) (+ acc v)))",
+                               {'x': {'aggregate'}})
+
+
+def test_column_dependencies_projections():
+    assert_column_dependencies("(Select (Select events (lambda (list e)"
+                               + " (list (attr e 'a') (attr e 'b'))))"
+                               + " (lambda (list r) (subscript r 1)))",
+                               {'b': {'output'}})
+    assert_column_dependencies("(OrderBy (Select events (lambda (list e) (dict (list 'a' 'b')"
+                               + " (list (attr e 'x') (attr e 'y')))))"
+                               + " (lambda (list r) (attr r 'b')))",
+                               {'x': {'output'}, 'y': {'output'}})
+
+
+def test_column_dependencies_deep_query():
+    depth = 5000
+    text_ast = 'events'
+    for _ in range(depth):
+        text_ast = '(Where ' + text_ast + " (lambda (list e) (> (attr e 'x') 0)))"
+    body = 'e'
+    for _ in range(depth):
+        body = '(attr ' + body + " 'a')"
+    text_ast = '(Select ' + text_ast + ' (lambda (list e) ' + body + '))'
+    assert_column_dependencies(text_ast, {'x': {'filter'}, '.'.join(['a'] * depth): {'output'}})
@@ -0,0 +1,57 @@
+from .test_parse import text_ast_corpus
+
+from qastle import *
+
+import ast
+import subprocess
+import sys
+
+import pytest
+
+
+def test_alpha_normal_text_ast():
+    text_ast = '(Select s (lambda (list e) (Where e (lambda (list f) (> f e)))))'
+    assert (alpha_normal_text_ast(text_ast)
+            == '(Select s (lambda (list #0.0) (Where #0.0 (lambda (list #1.0) (> #1.0 #0.0)))))')
+    assert (alpha_normal_text_ast('(lambda (list x y) (lambda (list x) (+ x y)))')
+            == '(lambda (list #0.0 #0.1) (lambda (list #1.0) (+ #1.0 #0.1)))')
+    assert alpha_normal_text_ast('(+ x (lambda (list x) x))') == '(+ x (lambda (list #0.0) #0.0))'
+
+
+def test_alpha_normal_text_ast_without_lambdas():
+    for text_ast in text_ast_corpus:
+        if 'lambda' not in text_ast:
+            assert (alpha_normal_text_ast(text_ast)
+                    == python_ast_to_text_ast(text_ast_to_python_ast(text_ast)))
+
+
+def test_alpha_equivalence():
+    assert are_alpha_equivalent('(Where s (lambda (list e) (attr e \'pt\')))',
+                                ' (Where  s\n(lambda (list x) (attr x \'pt\')))')
+    assert not are_alpha_equivalent('(lambda (list x y) x)', '(lambda (list x y) y)')
+    assert not are_alpha_equivalent('(lambda (list x) y)', '(lambda (list x) z)')
+    assert not are_alpha_equivalent('(lambda (list x) 1)', '(lambda (list x) 1.0)')
+
+
+def test_python_ast_fingerprint():
+    python_ast = insert_linq_nodes(ast.parse("s.Select('lambda e: e.pt')"))
+    assert fingerprint(python_ast) == fingerprint('(Select s (lambda (list x) (attr x \'pt\')))')
+    other_python_ast = insert_linq_nodes(ast.parse('Select(s, lambda y: y.pt)'))
+    assert are_alpha_equivalent(python_ast, other_python_ast)
+
+
+def test_fingerprint_size():
+    text_ast = '(Select s (lambda (list e) e))'
+    assert fingerprint(text_ast) < 2**64
+    assert fingerprint(text_ast, bits=128) < 2**128
+    with pytest.raises(ValueError):
+        fingerprint(text_ast, bits=32)
+
+
+def test_fingerprint_stable_across_processes():
+    text_ast = "(Select s (lambda (list e) (attr e 'pt')))"
+    script = 'import qastle; print(qastle.fingerprint(' + repr(text_ast) + '))'
+    for _ in range(2):
+        output = subprocess.run([sys.executable, '-c', script],
+                                check=True, capture_output=True, text=True).stdout
+        assert int(output) == fingerprint(text_ast)
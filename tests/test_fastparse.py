@@ -0,0 +1,114 @@
+from .testing_util import *
+from .test_parse import text_ast_corpus
+
+from qastle import *
+from qastle import fastparse
+
+import pytest
+
+
+invalid_text_ast_corpus = ['(',
+                           ')',
+                           '()',
+                           '(list',
+                           '(list 0))',
+                           '(list(list))',
+                           '(list (list)(list))',
+                           '(list0)',
+                           '(1 2)',
+                           '(list 1a)',
+                           '(list 1.2.3)',
+                           '(list a-1)',
+                           "(list 'a)",
+                           '(list "a)',
+                           '(list $)',
+                           '(list $1)',
+                           '(list $ a)',
+                           '(list $a$)',
+                           'a b',
+                           '+.5',
+                           '(list 01)',
+                           '(list lambda)',
+                           "(list '\n')",
+                           '(list #1= a)',
+                           '(list #1=a #1)',
+                           '(list #a#)',
+                           '#1#',
+                           '(list #1=a #1=a)']
+
+invalid_node_corpus = ['(unknown a)',
+                       '(dict (list))',
+                       '(dict a b)',
+                       '(attr a)',
+                       '(attr a b)',
+                       '(subscript a)',
+                       '(call)',
+                       '(if a b)',
+                       '(not a b)',
+                       '(- a b c)',
+                       '(* a)',
+                       '(and a)',
+                       '(== a)',
+                       '(lambda (list x))',
+                       '(lambda x x)',
+                       '(lambda (list 0) 0)',
+                       '(Where a b)',
+                       '(Where a (lambda (list) 0))',
+                       '(Select a)',
+                       '(Aggregate a 0 (lambda (list x) x))',
+                       '(First a b)',
+                       '(OrderByDescending a (lambda (list x y) x))']
+
+
+def test_fastparse_matches_lark():
+    for text_ast in text_ast_corpus:
+        assert_ast_nodes_are_equal(fastparse.text_ast_to_python_ast(text_ast),
+                                   text_ast_to_python_ast(text_ast, backend='lark'))
+
+
+def test_fastparse_backend():
+    for text_ast in text_ast_corpus:
+        assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast, backend='fast'),
+                                   text_ast_to_python_ast(text_ast, backend='lark'))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        text_ast_to_python_ast('a', backend='antlr')
+
+
+def test_fastparse_rejects_invalid_text():
+    for text_ast in invalid_text_ast_corpus:
+        with pytest.raises(SyntaxError) as fast_info:
+            fastparse.text_ast_to_python_ast(text_ast)
+        for parser in ['lalr', 'earley']:
+            with pytest.raises(SyntaxError) as lark_info:
+                text_ast_to_python_ast(text_ast, backend='lark', parser=parser)
+            assert type(lark_info.value) is SyntaxError
+            assert lark_info.value.lineno == fast_info.value.lineno
+            assert lark_info.value.offset == fast_info.value.offset
+
+
+def test_fastparse_error_position():
+    with pytest.raises(SyntaxError) as info:
+        fastparse.text_ast_to_python_ast('(list\n  0 (1))')
+    assert info.value.lineno == 2
+    assert info.value.offset == 6
+    assert info.value.text == '  0 (1))'
+
+
+def test_fastparse_node_errors_match_lark():
+    for text_ast in invalid_node_corpus:
+        with pytest.raises(SyntaxError) as lark_info:
+            text_ast_to_python_ast(text_ast, backend='lark')
+        with pytest.raises(SyntaxError) as fast_info:
+            fastparse.text_ast_to_python_ast(text_ast)
+        assert str(fast_info.value) == str(lark_info.value)
+
+
+def test_fastparse_deep():
+    depth = 5000
+    node = fastparse.text_ast_to_python_ast('(list ' * depth + ')' * depth).body[0].value
+    for _ in range(depth - 1):
+        node = node.elts[0]
+    assert node.elts == []
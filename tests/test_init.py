@@ -0,0 +1,28 @@
+import qastle
+from qastle.parse import get_parser
+
+import importlib
+import types
+
+
+def test_lazy_attributes_match_submodules():
+    for submodule_name, attributes in qastle._submodule_attributes.items():
+        submodule = importlib.import_module('qastle.' + submodule_name)
+        assert ([attribute for attribute in attributes
+                 if attribute not in qastle._parser_attributes]
+                == list(submodule.__all__)), submodule_name
+        for attribute in attributes:
+            assert getattr(qastle, attribute) is getattr(submodule, attribute)
+
+
+def test_internals_are_not_exported():
+    for name in ['number_words', 'ordinal_words', 'count_phrase', 'registry_lock',
+                 'write_varint', 'CompositeEnd', 'fuse_where', 'cached_translation']:
+        assert name not in qastle.__all__
+        assert not hasattr(qastle, name)
+
+
+def test_parse_is_function():
+    importlib.import_module('qastle.parse')
+    assert not isinstance(qastle.parse, types.ModuleType)
+    assert qastle.parse('(list)') == get_parser().parse('(list)')
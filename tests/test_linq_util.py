@@ -469,3 +469,31 @@ def test_choose_composite():
 def test_choose_bad():
     with pytest.raises(SyntaxError):
         insert_linq_nodes(ast.parse('the_source.Choose()'))
+
+
+def test_let_calls_are_not_linq_nodes():
+    for source in ['the_source.Let(lambda x: x)', 'x.Let(1, 2)', 'Let(a)', 'Let()']:
+        initial_ast = ast.parse(source)
+        assert_ast_nodes_are_equal(insert_linq_nodes(initial_ast), ast.parse(source))
+
+
+def test_deep_chain():
+    depth = 5000
+    node = ast.Name(id='the_source', ctx=ast.Load())
+    for _ in range(depth):
+        node = ast.Call(func=ast.Attribute(value=node, attr='First', ctx=ast.Load()),
+                        args=[],
+                        keywords=[])
+    final_ast = insert_linq_nodes(wrap_ast(node))
+    node = final_ast.body[0].value
+    for _ in range(depth):
+        assert isinstance(node, First)
+        node = node.source
+    assert node.id == 'the_source'
+
+
+def test_lambda_string_in_lambda_string():
+    initial_ast = ast.parse("the_source.Select('lambda row: row.Where(\"lambda x: True\")')")
+    final_ast = insert_linq_nodes(initial_ast)
+    assert (python_ast_to_text_ast(final_ast)
+            == '(Select the_source (lambda (list row) (Where row (lambda (list x) True))))')
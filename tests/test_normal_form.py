@@ -0,0 +1,128 @@
+from .testing_util import *
+from .test_parse import text_ast_corpus
+
+from qastle import *
+
+import qastle.translate
+
+import ast
+
+
+def normal_text(python_source):
+    return normalize_text_ast(insert_linq_nodes(ast.parse(python_source)))
+
+
+def test_normalize_lambda_arguments():
+    assert normal_text('s.Select(lambda e: e.pt)') == normal_text('s.Select(lambda x: x.pt)')
+    assert (normal_text('lambda a, b: lambda a: a + b')
+            == '(lambda (list x0_0 x0_1) (lambda (list x1_0) (+ x1_0 x0_1)))')
+
+
+def test_normalize_lambda_arguments_avoid_free_names():
+    assert normal_text('lambda e: e + x0_0') == '(lambda (list x_0_0) (+ x_0_0 x0_0))'
+    assert normal_text('lambda x0_0: x0_0') == '(lambda (list x0_0) x0_0)'
+
+
+def test_normalize_commutative_operands():
+    assert normal_text('a == b') == normal_text('b == a')
+    assert normal_text('a != 1') == normal_text('1 != a')
+    assert normal_text('a and b and c') == normal_text('(a and b) and c')
+    assert normal_text('a and b and c') != normal_text('c and (b and a)')
+    assert normal_text('a | b | c') == normal_text('c | (a | b)')
+    assert normal_text('x + 1') == normal_text('1 + x')
+    assert normal_text('2 * x') == normal_text('x * 2')
+    assert normal_text('x + y') != normal_text('y + x')
+    assert normal_text('a < b') != normal_text('b < a')
+    assert normal_text('a and b') != normal_text('a or b')
+
+
+def test_normalize_chained_comparisons():
+    assert normal_text('1 < a < 5') == normal_text('1 < a and a < 5')
+    assert normal_text('a == b == c') == normal_text('b == a and c == b')
+
+
+def test_normalize_keeps_guard_order():
+    text_ast = ("(and (> (attr e 'njets') 0)"
+                + " (> (attr (First (call (attr e 'jets'))) 'pt') 20))")
+    assert normalize_text_ast(text_ast) == text_ast
+    assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast, normalize=True),
+                               text_ast_to_python_ast(text_ast))
+    assert (normalize_text_ast('(or (or a b) (or c (or d e)))')
+            == '(or (or (or (or a b) c) d) e)')
+
+
+def test_normalize_sequences():
+    assert normal_text('s.Select(lambda e: (e.pt, e.eta))') == normal_text(
+        "s.Select('lambda e: [e.pt, e.eta]')")
+
+
+def test_normalize_is_idempotent():
+    for text_ast in text_ast_corpus + ['(Where s (lambda (list e) (and (== 1 e) (< e 2))))']:
+        normal_text_ast = normalize_text_ast(text_ast)
+        assert normalize_text_ast(normal_text_ast) == normal_text_ast
+        assert are_alpha_equivalent(normal_text_ast, normalize_text_ast(
+            python_ast_to_text_ast(text_ast_to_python_ast(text_ast))))
+
+
+def test_normalize_shared_nodes():
+    expanded_text_ast = ("(Select src (lambda (list e) (list (attr e 'pt')"
+                         + " (Select (attr e 'jets') (lambda (list e) (attr e 'pt'))))))")
+    labeled_text_ast = ("(Select src (lambda (list e) (list #1=(attr e 'pt')"
+                        + " (Select (attr e 'jets') (lambda (list e) #1#)))))")
+    assert normalize_text_ast(labeled_text_ast) == normalize_text_ast(expanded_text_ast)
+    python_ast = text_ast_to_python_ast(labeled_text_ast)
+    normalize(python_ast)
+    assert python_ast_to_text_ast(python_ast) == expanded_text_ast
+
+
+def test_normalize_long_chain():
+    n_operands = 3000
+    text_ast = 'a0'
+    for index in range(1, n_operands):
+        text_ast = '(and ' + text_ast + ' a' + str(index) + ')'
+    assert normalize_text_ast(text_ast) == text_ast
+    text_ast = text_ast.replace('and', '|')
+    operands = sorted('a' + str(index) for index in range(n_operands))
+    expected_text_ast = operands[0]
+    for operand in operands[1:]:
+        expected_text_ast = '(| ' + expected_text_ast + ' ' + operand + ')'
+    assert normalize_text_ast(text_ast) == expected_text_ast
+
+
+def test_normalize_text_ast_to_python_ast():
+    python_ast = text_ast_to_python_ast('(lambda (list e) (== 0 e))', normalize=True)
+    assert_ast_nodes_are_equal(python_ast, ast.parse('lambda x0_0: 0 == x0_0'))
+
+
+def test_normal_form_cache():
+    cache = TranslationCache()
+    variants = ["(Select s (lambda (list e) (list (attr e 'pt') (attr e 'eta'))))",
+                "(Select s (lambda (list x) (list (attr x 'pt') (attr x 'eta'))))",
+                "(Select  s (lambda (list x) (list (attr x 'pt') (attr x 'eta'))))"]
+    for text_ast in variants:
+        assert text_ast_to_columns(text_ast, cache=cache) == 'pt, eta'
+    normal_python_asts = [text_ast_to_python_ast(text_ast, cache=cache, normalize=True)
+                          for text_ast in variants]
+    for python_ast in normal_python_asts:
+        assert_ast_nodes_are_equal(python_ast, normal_python_asts[0])
+    assert normal_python_asts[0] is not normal_python_asts[1]
+    python_ast = text_ast_to_python_ast(variants[1], cache=cache)
+    assert python_ast_to_text_ast(python_ast) == variants[1]
+
+
+def test_normal_form_cache_counts_each_call_once(monkeypatch):
+    parsed_text_asts = []
+    parse_to_python_ast = qastle.translate.parse_to_python_ast
+    monkeypatch.setattr(qastle.translate, 'parse_to_python_ast',
+                        lambda text_ast: parsed_text_asts.append(text_ast)
+                        or parse_to_python_ast(text_ast))
+    cache = TranslationCache()
+    text_ast = "(Select s (lambda (list e) (attr e 'pt')))"
+    assert text_ast_to_columns(text_ast, cache=cache) == 'pt'
+    assert parsed_text_asts == [text_ast]
+    assert cache.info() == CacheInfo(hits=0, misses=1, evictions=0, maxsize=1024, currsize=2)
+    assert text_ast_to_columns("(Select s (lambda (list x) (attr x 'pt')))", cache=cache) == 'pt'
+    assert cache.info() == CacheInfo(hits=1, misses=1, evictions=0, maxsize=1024, currsize=3)
+    assert text_ast_to_columns(text_ast, cache=cache) == 'pt'
+    assert cache.info().hits == 2
+    assert len(parsed_text_asts) == 2
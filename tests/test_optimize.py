@@ -0,0 +1,376 @@
+from .testing_util import *
+
+from qastle import *
+from qastle.optimize import prune_projection
+
+import ast
+
+import pytest
+
+
+class LINQToCallsTransformer(ast.NodeTransformer):
+    # Turns Where, Select, OrderBy, and Count nodes into calls of where(), select(), sorted(),
+    # and len(), and Let nodes into calls of their lambdas, so that queries can be run on
+    # lists
+    def visit_Where(self, node):
+        return ast.Call(func=ast.Name(id='where', ctx=ast.Load()),
+                        args=[self.visit(node.source), self.visit(node.predicate)],
+                        keywords=[])
+
+    def visit_Select(self, node):
+        return ast.Call(func=ast.Name(id='select', ctx=ast.Load()),
+                        args=[self.visit(node.source), self.visit(node.selector)],
+                        keywords=[])
+
+    def visit_OrderBy(self, node):
+        return ast.Call(func=ast.Name(id='sorted', ctx=ast.Load()),
+                        args=[self.visit(node.source)],
+                        keywords=[ast.keyword(arg='key', value=self.visit(node.key_selector))])
+
+    def visit_Let(self, node):
+        return ast.Call(func=self.visit(node.func), args=[self.visit(node.value)], keywords=[])
+
+    def visit_Count(self, node):
+        return ast.Call(func=ast.Name(id='len', ctx=ast.Load()),
+                        args=[self.visit(node.source)],
+                        keywords=[])
+
+
+def run(text_ast, data_source):
+    python_ast = LINQToCallsTransformer().visit(text_ast_to_python_ast(text_ast))
+    expression = ast.fix_missing_locations(ast.Expression(body=python_ast.body[0].value))
+    return eval(compile(expression, '<query>', 'eval'),
+                {'where': lambda source, predicate: [e for e in source if predicate(e)],
+                 'select': lambda source, selector: [selector(e) for e in source],
+                 'data_source': data_source,
+                 'k': 3})
+
+
+def assert_optimizes(text_ast, expected_text_ast, data_source=range(-5, 10), **options):
+    optimized_text_ast = optimize_text_ast(text_ast, **options)
+    assert optimized_text_ast == expected_text_ast
+    assert python_ast_to_text_ast(text_ast_to_python_ast(optimized_text_ast)) == optimized_text_ast
+    assert run(optimized_text_ast, data_source) == run(text_ast, data_source)
+
+
+def test_fuse_where():
+    assert_optimizes('(Where (Where data_source (lambda (list e) (> e 0)))'
+                     + ' (lambda (list f) (< f 5)))',
+                     '(Where data_source (lambda (list e) (and (> e 0) (< e 5))))')
+
+
+def test_fuse_where_chain():
+    assert_optimizes('(Where (Where (Where data_source (lambda (list e) (> e 0)))'
+                     + ' (lambda (list e) (< e 5))) (lambda (list e) (!= e 2)))',
+                     '(Where data_source (lambda (list e) (and (and (> e 0) (< e 5)) (!= e 2))))')
+
+
+def test_fuse_select():
+    assert_optimizes('(Select (Select data_source (lambda (list e) (* e 2)))'
+                     + ' (lambda (list x) (+ x 1)))',
+                     '(Select data_source (lambda (list e) (+ (* e 2) 1)))')
+    assert_optimizes("(Select (Select data_source (lambda (list e) (attr e 'real')))"
+                     + ' (lambda (list x) (list x x)))',
+                     "(Select data_source (lambda (list e)"
+                     + " (list (attr e 'real') (attr e 'real'))))")
+
+
+def test_fuse_select_does_not_repeat_work():
+    for text_ast in ['(Select (Select data_source (lambda (list e) (+ e k)))'
+                     + ' (lambda (list x) (list x x)))',
+                     "(Select (Select data_source (lambda (list e) (call (attr e 'heavy'))))"
+                     + ' (lambda (list y) (list y y y)))',
+                     '(Select (Select data_source (lambda (list e) (* e 2)))'
+                     + ' (lambda (list x) (Select (list 1 2) (lambda (list z) (+ x z)))))']:
+        assert optimize_text_ast(text_ast) == text_ast
+    assert_optimizes('(Select (Select data_source (lambda (list e) (* e 2)))'
+                     + ' (lambda (list x) (+ (call (lambda (list z) (* z z)) x) 1)))',
+                     '(Select data_source (lambda (list e)'
+                     + ' (+ (call (lambda (list z) (* z z)) (* e 2)) 1)))')
+
+
+def test_optimize_does_not_modify_shared_nodes():
+    assert (optimize_text_ast('(list (Where (Where s #1=(lambda (list x) (> x 1)))'
+                              + ' (lambda (list y) (< y 5))) (Where t #1#))')
+            == '(list (Where s (lambda (list x) (and (> x 1) (< x 5))))'
+            + ' (Where t (lambda (list x) (> x 1))))')
+    python_ast = text_ast_to_python_ast('(Where (Where s (lambda (list x) (> x 1)))'
+                                        + ' (lambda (list y) (< y 5)))')
+    text_ast = python_ast_to_text_ast(python_ast)
+    optimize_query(python_ast)
+    assert python_ast_to_text_ast(python_ast) == text_ast
+
+
+def test_fuse_select_avoids_capture():
+    assert_optimizes('(Select (Select data_source (lambda (list e) (+ e k)))'
+                     + ' (lambda (list x) (call (lambda (list k) (* x k)) 2)))',
+                     '(Select data_source (lambda (list e)'
+                     + ' (call (lambda (list k_1) (* (+ e k) k_1)) 2)))')
+    assert_optimizes('(Select (Select data_source (lambda (list e) e))'
+                     + ' (lambda (list x) (call (lambda (list x) x) 2)))',
+                     '(Select data_source (lambda (list e) (call (lambda (list x) x) 2)))')
+
+
+def test_fuse_avoids_capturing_free_names():
+    assert_optimizes('(Select (Select data_source (lambda (list k) (* k 2)))'
+                     + ' (lambda (list x) (+ x k)))',
+                     '(Select data_source (lambda (list k_1) (+ (* k_1 2) k)))')
+    assert_optimizes('(Where (Where data_source (lambda (list k) (> k 0)))'
+                     + ' (lambda (list e) (< e k)))',
+                     '(Where data_source (lambda (list k_1) (and (> k_1 0) (< k_1 k))))')
+
+
+def test_fuse_mixed_chain():
+    assert_optimizes('(Select (Select (Where (Where data_source (lambda (list e) (> e 0)))'
+                     + ' (lambda (list e) (< e 5))) (lambda (list e) (* e e)))'
+                     + ' (lambda (list e) (- e 1)))',
+                     '(Select (Where data_source (lambda (list e) (and (> e 0) (< e 5))))'
+                     + ' (lambda (list e) (- (* e e) 1)))')
+
+
+def test_disabled_rules():
+    text_ast = ('(Select (Select (Where (Where data_source (lambda (list e) (> e 0)))'
+                + ' (lambda (list e) (< e 5))) (lambda (list e) (* e e)))'
+                + ' (lambda (list e) (- e 1)))')
+    assert_optimizes(text_ast,
+                     '(Select (Select (Where data_source (lambda (list e) (and (> e 0) (< e 5))))'
+                     + ' (lambda (list e) (* e e))) (lambda (list e) (- e 1)))',
+                     disabled_rules=['fuse_select'])
+    assert_optimizes(text_ast, text_ast, disabled_rules=['fuse_select', 'fuse_where'])
+    with pytest.raises(ValueError):
+        optimize_text_ast(text_ast, disabled_rules=['fuse_everything'])
+
+
+def test_optimize_python_ast():
+    python_ast = insert_linq_nodes(ast.parse('data_source.Where(lambda e: e > 0)'
+                                             + '.Where(lambda e: e < 5)'))
+    assert (python_ast_to_text_ast(optimize_query(python_ast))
+            == '(Where data_source (lambda (list e) (and (> e 0) (< e 5))))')
+
+
+def test_push_where_below_select():
+    assert_optimizes("(Where (Select data_source (lambda (list e) (list (attr e 'real') (+ e k))))"
+                     + ' (lambda (list r) (> (subscript r 0) 0)))',
+                     "(Select (Where data_source (lambda (list e) (> (attr e 'real') 0)))"
+                     + " (lambda (list e) (list (attr e 'real') (+ e k))))")
+    assert_optimizes("(Where (Select data_source (lambda (list e) (attr e 'real')))"
+                     + ' (lambda (list r) (> r k)))',
+                     "(Select (Where data_source (lambda (list e) (> (attr e 'real') k)))"
+                     + " (lambda (list e) (attr e 'real')))")
+
+
+def test_push_where_below_select_does_not_repeat_work():
+    for text_ast in ["(Where (Select s (lambda (list e) (call (attr e 'heavy'))))"
+                     + ' (lambda (list y) (> y 0)))',
+                     "(Where (Select s (lambda (list e) (list (attr e 'pt')"
+                     + " (call (attr e 'heavy'))))) (lambda (list y) (> (subscript y 1) 0)))",
+                     "(Where (Select s (lambda (list e) (list (attr e 'pt')"
+                     + " (call (attr e 'heavy'))))) (lambda (list y) (> (call len y) 0)))"]:
+        assert optimize_text_ast(text_ast) == text_ast
+
+
+def test_push_where_below_select_avoids_capture():
+    assert_optimizes("(Where (Select data_source (lambda (list k) (attr k 'real')))"
+                     + ' (lambda (list r) (> r k)))',
+                     "(Select (Where data_source (lambda (list k_1) (> (attr k_1 'real') k)))"
+                     + " (lambda (list k_1) (attr k_1 'real')))")
+
+
+def test_push_where_then_fuse():
+    assert_optimizes('(Where (Select (Where data_source (lambda (list e) (> e -3)))'
+                     + " (lambda (list e) (list (* e e) (attr e 'real'))))"
+                     + ' (lambda (list r) (< (subscript r 1) 5)))',
+                     '(Select (Where data_source (lambda (list e)'
+                     + " (and (> e -3) (< (attr e 'real') 5))))"
+                     + " (lambda (list e) (list (* e e) (attr e 'real'))))")
+
+
+def test_simplify_projection():
+    assert (optimize_text_ast("(subscript (list a b c) 1)") == 'b')
+    assert (optimize_text_ast("(subscript (list a b c) -1)") == 'c')
+    assert (optimize_text_ast("(subscript (list a b c) 3)") == '(subscript (list a b c) 3)')
+    assert (optimize_text_ast("(subscript (list a b c) i)") == '(subscript (list a b c) i)')
+    assert (optimize_text_ast("(subscript (dict (list 'pt' 'eta') (list a b)) 'eta')") == 'b')
+    assert (optimize_text_ast("(subscript (dict (list 1 True) (list a b)) 1)") == 'b')
+    assert (optimize_text_ast("(subscript (dict (list 'pt' x) (list a b)) 'pt')")
+            == "(subscript (dict (list 'pt' x) (list a b)) 'pt')")
+    assert (optimize_text_ast("(attr (dict (list 'pt' 'eta') (list a b)) 'pt')") == 'a')
+    assert (optimize_text_ast("(attr (dict (list 'pt') (list a)) 'eta')")
+            == "(attr (dict (list 'pt') (list a)) 'eta')")
+
+
+def test_push_where_below_dict_select():
+    assert (optimize_text_ast("(Where (Select data_source (lambda (list e)"
+                              + " (dict (list 'pt' 'eta') (list (attr e 'pt')"
+                              + " (call (attr e 'eta'))))))"
+                              + " (lambda (list r) (> (attr r 'pt') 25)))")
+            == "(Select (Where data_source (lambda (list e) (> (attr e 'pt') 25)))"
+            + " (lambda (list e) (dict (list 'pt' 'eta') (list (attr e 'pt')"
+            + " (call (attr e 'eta'))))))")
+
+
+def test_push_where_into_select_many_source():
+    assert (optimize_text_ast("(Where (SelectMany events (lambda (list e)"
+                              + " (Select (call (attr e 'jets')) (lambda (list j)"
+                              + " (list (call (attr e 'met')) (call (attr j 'pt')))))))"
+                              + " (lambda (list r) (> (subscript r 0) 50)))")
+            == "(SelectMany (Where events (lambda (list e) (> (call (attr e 'met')) 50)))"
+            + " (lambda (list e) (Select (call (attr e 'jets')) (lambda (list j)"
+            + " (list (call (attr e 'met')) (call (attr j 'pt')))))))")
+    text_ast = ("(Where (SelectMany events (lambda (list e)"
+                + " (Select (call (attr e 'jets')) (lambda (list j)"
+                + " (list (call (attr e 'met')) (call (attr j 'pt')))))))"
+                + " (lambda (list r) (> (subscript r 1) 50)))")
+    assert optimize_text_ast(text_ast) == text_ast
+    text_ast = ("(Where (SelectMany events (lambda (list e) (call (attr e 'jets'))))"
+                + " (lambda (list j) (> (call (attr j 'pt')) 50)))")
+    assert optimize_text_ast(text_ast) == text_ast
+
+
+def test_prune_projection():
+    assert_optimizes('(Select (Select data_source (lambda (list e) (list e (* e 2) (* e k))))'
+                     + ' (lambda (list r) (+ (subscript r 2) (subscript r 0))))',
+                     '(Select (Select data_source (lambda (list e) (list e (* e k))))'
+                     + ' (lambda (list r) (+ (subscript r 1) (subscript r 0))))',
+                     disabled_rules=['fuse_select'])
+    assert_optimizes("(Select (Select data_source (lambda (list e) (dict (list 'a' 'b' 'c')"
+                     + " (list e (* e 2) (* e k))))) (lambda (list r) (+ (subscript r 'c')"
+                     + " (subscript r 'a'))))",
+                     "(Select (Select data_source (lambda (list e) (dict (list 'a' 'c')"
+                     + " (list e (* e k))))) (lambda (list r) (+ (subscript r 'c')"
+                     + " (subscript r 'a'))))",
+                     disabled_rules=['fuse_select'])
+    assert (optimize_text_ast("(Select (Select data_source (lambda (list e) (dict (list 'a' 'b')"
+                              + " (list e (* e 2))))) (lambda (list r) (attr r 'b')))",
+                              disabled_rules=['fuse_select'])
+            == "(Select (Select data_source (lambda (list e) (dict (list 'b')"
+            + " (list (* e 2))))) (lambda (list r) (attr r 'b')))")
+
+
+def test_prune_projection_does_not_modify_shared_nodes():
+    assert (optimize_text_ast("(list #1=(Select s (lambda (list x) (list (attr x 'a')"
+                              + " (attr x 'b')))) (Select #1# (lambda (list y) (subscript y 0))))")
+            == "(list (Select s (lambda (list x) (list (attr x 'a') (attr x 'b'))))"
+            + " (Select s (lambda (list x) (attr x 'a'))))")
+    python_ast = text_ast_to_python_ast("(Select #1=(Select s (lambda (list x) (list (attr x 'a')"
+                                        + " (attr x 'b')))) (lambda (list y) (subscript y 1)))")
+    select = python_ast.body[0].value
+    assert prune_projection(select) is not select
+    assert (python_ast_to_text_ast(python_ast)
+            == "(Select (Select s (lambda (list x) (list (attr x 'a') (attr x 'b'))))"
+            + " (lambda (list y) (subscript y 1)))")
+
+
+def test_prune_projection_through_operators():
+    assert_optimizes('(Select (OrderBy (Select data_source (lambda (list e)'
+                     + ' (list e (- 0 e) (* e 3)))) (lambda (list r) (subscript r 1)))'
+                     + ' (lambda (list r) (subscript r -1)))',
+                     '(Select (OrderBy (Select data_source (lambda (list e)'
+                     + ' (list (- 0 e) (* e 3)))) (lambda (list r) (subscript r 0)))'
+                     + ' (lambda (list r) (subscript r 1)))')
+    assert_optimizes('(Count (Where (Select data_source (lambda (list e) (list e (* e 2))))'
+                     + ' (lambda (list r) (> (subscript r 1) 4))))',
+                     '(Count (Where (Select data_source (lambda (list e) (list (* e 2))))'
+                     + ' (lambda (list r) (> (subscript r 0) 4))))',
+                     disabled_rules=['push_where_below_select'])
+
+
+def test_prune_projection_keeps_used_elements():
+    for text_ast in ['(Select (OrderBy (Select data_source (lambda (list e) (list e (* e 2))))'
+                     + ' (lambda (list r) r)) (lambda (list r) (subscript r 0)))',
+                     '(Select (OrderBy (Select data_source (lambda (list e) (list e (* e 2))))'
+                     + ' (lambda (list r) (subscript r i))) (lambda (list r) (subscript r 0)))',
+                     '(Select (OrderBy (Select data_source (lambda (list e) (list e (* e 2))))'
+                     + ' (lambda (list r) (subscript r 2))) (lambda (list r) (subscript r 0)))']:
+        assert optimize_text_ast(text_ast) == text_ast
+    text_ast = ('(Where (Select data_source (lambda (list e) (list e (* e 2))))'
+                + ' (lambda (list r) (> (subscript r 0) 1)))')
+    assert optimize_text_ast(text_ast, disabled_rules=['push_where_below_select']) == text_ast
+    assert (optimize_text_ast('(Select (Select data_source (lambda (list e) (list e (* e 2))))'
+                              + ' (lambda (list r) (Select (subscript r 1) (lambda (list r) r))))',
+                              disabled_rules=['fuse_select'])
+            == '(Select (Select data_source (lambda (list e) (list (* e 2))))'
+            + ' (lambda (list r) (Select (subscript r 0) (lambda (list r) r))))')
+
+
+def assert_eliminates(text_ast, expected_text_ast, data_source=range(-5, 10)):
+    eliminated_text_ast = eliminate_common_subexpressions_text_ast(text_ast)
+    assert eliminated_text_ast == expected_text_ast
+    assert (python_ast_to_text_ast(text_ast_to_python_ast(eliminated_text_ast))
+            == eliminated_text_ast)
+    assert run(eliminated_text_ast, data_source) == run(text_ast, data_source)
+
+
+def test_eliminate_common_subexpressions():
+    assert_eliminates('(Select data_source (lambda (list e) (list (* e e) (+ (* e e) 1))))',
+                      '(Select data_source (lambda (list e)'
+                      + ' (Let (* e e) (lambda (list v_1) (list v_1 (+ v_1 1))))))')
+    assert_eliminates('(Select data_source (lambda (list e) (list (* e e) (- e 1))))',
+                      '(Select data_source (lambda (list e) (list (* e e) (- e 1))))')
+
+
+def test_eliminate_largest_common_subexpressions_first():
+    assert_eliminates('(Select data_source (lambda (list e)'
+                      + ' (list (+ (* e k) 1) (- (+ (* e k) 1)) (* e k))))',
+                      '(Select data_source (lambda (list e) (Let (* e k) (lambda (list v_2)'
+                      + ' (Let (+ v_2 1) (lambda (list v_1) (list v_1 (- v_1) v_2)))))))')
+
+
+def test_eliminate_common_subexpressions_in_nested_lambdas():
+    assert_eliminates('(Select data_source (lambda (list e) (Select (list e k)'
+                      + ' (lambda (list x) (list (* x e) (* x e) (+ e 1) (+ e 1))))))',
+                      '(Select data_source (lambda (list e) (Select (list e k)'
+                      + ' (lambda (list x) (Let (+ e 1) (lambda (list v_2)'
+                      + ' (Let (* x e) (lambda (list v_1) (list v_1 v_1 v_2 v_2)))))))))')
+    assert_eliminates('(Select data_source (lambda (list e) (list (+ e 1)'
+                      + ' (Select (list e k) (lambda (list x) (* x (+ e 1)))))))',
+                      '(Select data_source (lambda (list e) (Let (+ e 1) (lambda (list v_1)'
+                      + ' (list v_1 (Select (list e k) (lambda (list x) (* x v_1))))))))')
+    assert_eliminates('(Select data_source (lambda (list e) (list (+ e 1)'
+                      + ' (Select (list e k) (lambda (list e) (* 2 (+ e 1)))))))',
+                      '(Select data_source (lambda (list e) (list (+ e 1)'
+                      + ' (Select (list e k) (lambda (list e) (* 2 (+ e 1)))))))')
+
+
+def test_eliminate_common_subexpressions_only_if_always_evaluated():
+    for text_ast in ['(Select data_source (lambda (list e)'
+                     + ' (if (!= e 0) (list (/ 1 e) (/ 1 e)) 0)))',
+                     '(Select data_source (lambda (list e)'
+                     + ' (and (!= e 0) (> (// 5 e) (// 5 e)))))']:
+        assert_eliminates(text_ast, text_ast)
+    assert_eliminates('(Select data_source (lambda (list e)'
+                      + ' (if (> (+ e 1) 0) (+ e 1) (- (+ e 1)))))',
+                      '(Select data_source (lambda (list e) (Let (+ e 1) (lambda (list v_1)'
+                      + ' (if (> v_1 0) v_1 (- v_1))))))')
+
+
+def test_eliminate_common_subexpressions_avoids_capture():
+    assert_eliminates('(Select data_source (lambda (list e) (list v_1 (+ e v_1) (+ e v_1))))',
+                      '(Select data_source (lambda (list e) (Let (+ e v_1) (lambda (list v_2)'
+                      + ' (list v_1 v_2 v_2)))))',
+                      data_source=[])
+
+
+def test_eliminate_common_subexpressions_leaves_methods():
+    assert_eliminates("(Select data_source (lambda (list e) (list (call (attr e 'conjugate'))"
+                      + " (call (attr e 'conjugate')) (call (attr e '__add__') 1))))",
+                      "(Select data_source (lambda (list e) (Let (call (attr e 'conjugate'))"
+                      + " (lambda (list v_1) (list v_1 v_1 (call (attr e '__add__') 1))))))")
+    text_ast = ("(Select data_source (lambda (list e) (list (call (attr e '__add__') 2)"
+                + " (call (attr e '__add__') 1))))")
+    assert_eliminates(text_ast, text_ast)
+    text_ast = ("(Select data_source (lambda (list e) (list (attr e 'conjugate')"
+                + " (call (attr e 'conjugate')))))")
+    assert_eliminates(text_ast, text_ast)
+    assert_eliminates("(Select data_source (lambda (list e) (list (attr e 'conjugate')"
+                      + " (call (attr e 'conjugate')) (attr e 'conjugate'))))",
+                      "(Select data_source (lambda (list e) (Let (attr e 'conjugate')"
+                      + " (lambda (list v_1) (list v_1 (call (attr e 'conjugate')) v_1)))))")
+
+
+def test_eliminate_common_subexpressions_does_not_modify_query():
+    python_ast = text_ast_to_python_ast('(Select data_source (lambda (list e)'
+                                        + ' (list (* e e) (* e e))))')
+    text_ast = python_ast_to_text_ast(python_ast)
+    eliminate_common_subexpressions(python_ast)
+    assert python_ast_to_text_ast(python_ast) == text_ast
@@ -0,0 +1,221 @@
+from .testing_util import *
+
+from qastle import *
+from qastle.parse import (build_parser, get_parser, get_transforming_parser,
+                          load_serialized_parser, syntax_specification_sha256)
+
+import qastle
+
+import concurrent.futures
+import subprocess
+import sys
+import threading
+
+import pytest
+
+
+text_ast_corpus = ['',
+                   ' \t\r\n',
+                   'xyz',
+                   "''",
+                   "'as\"df'",
+                   '"as\'df"',
+                   '0',
+                   '1.2',
+                   '3e+21',
+                   '4e-22',
+                   '5.6e+23',
+                   '7.8e-24',
+                   '1.',
+                   '.2',
+                   '3.e4',
+                   '5.e+6',
+                   '7.e-8',
+                   '.9e10',
+                   '.11e+12',
+                   '.13e-14',
+                   '+1',
+                   '-1',
+                   '(list)',
+                   '(list 0)',
+                   '(list 0 1 2)',
+                   '(dict (list) (list))',
+                   '(dict (list 0) (list 0))',
+                   "(dict (list 0 1 'b' 'abc') (list 0 'a' 2 'abc'))",
+                   "(attr a 'b')",
+                   '(subscript a 0)',
+                   "(subscript a 'b')",
+                   '(call a)',
+                   '(call a 0 1 2)',
+                   '(if b a c)',
+                   '(+ a)',
+                   '(- a)',
+                   '(not True)',
+                   '(~ 1)',
+                   '(+ 1 2)',
+                   '(- 1 2)',
+                   '(* 1 2)',
+                   '(/ 1 2)',
+                   '(% 1 2)',
+                   '(** 1 2)',
+                   '(// 1 2)',
+                   '(& 1 2)',
+                   '(| 1 2)',
+                   '(^ 1 2)',
+                   '(<< 1 2)',
+                   '(>> 1 2)',
+                   '(and True False)',
+                   '(or True False)',
+                   '(and (and a b) c)',
+                   '(== 1 2)',
+                   '(!= 1 2)',
+                   '(< 1 2)',
+                   '(<= 1 2)',
+                   '(> 1 2)',
+                   '(>= 1 2)',
+                   '(and (and (< 1 2) (< 2 3)) (< 3 4))',
+                   '(lambda (list) 0)',
+                   '(lambda (list x y z) x)',
+                   '(Where data_source (lambda (list e) e))',
+                   '(Select data_source (lambda (list e) e))',
+                   '(SelectMany data_source (lambda (list e) e))',
+                   '(First data_source)',
+                   '(Last data_source)',
+                   '(ElementAt data_source 2)',
+                   '(Contains data_source element)',
+                   '(Aggregate data_source 0 (lambda (list v e) (+ v e)))',
+                   '(Count data_source)',
+                   '(Max data_source)',
+                   '(Min data_source)',
+                   '(Sum data_source)',
+                   '(All data_source (lambda (list e) e))',
+                   '(Any data_source (lambda (list e) e))',
+                   '(Concat sequence1 sequence2)',
+                   '(Zip data_source)',
+                   '(OrderBy data_source (lambda (list e) e))',
+                   '(OrderByDescending data_source (lambda (list e) e))',
+                   '(Choose data_source 2)',
+                   '(Let (First data_source) (lambda (list e) e))',
+                   '(> (call (attr e \'pt\')) $pt_cut)',
+                   "(list #1=(attr a 'b') #1# (call #1#))",
+                   '(list #1=#2=(list) #2# #1#)',
+                   '#7=a',
+                   ' ( Select  data_source\n\t(lambda (list e) ( attr e  \'pt\' ) ) ) ']
+
+
+def test_parse_default_is_lalr():
+    assert qastle.Parser is get_parser('lalr')
+    assert parse('(list 0)') == get_parser('lalr').parse('(list 0)')
+
+
+def test_parse_unknown_parser():
+    with pytest.raises(ValueError):
+        parse('(list 0)', parser='cyk')
+
+
+def test_lalr_earley_conformance():
+    for text_ast in text_ast_corpus:
+        assert parse(text_ast, parser='lalr') == parse(text_ast, parser='earley'), text_ast
+        assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast, parser='lalr'),
+                                   text_ast_to_python_ast(text_ast, parser='earley'))
+
+
+def test_parse_to_python_ast():
+    for text_ast in text_ast_corpus:
+        tree = parse(text_ast)
+        assert_ast_nodes_are_equal(parse_to_python_ast(text_ast),
+                                   TextASTToPythonASTTransformer().transform(tree))
+
+
+def test_parse_drops_whitespace():
+    tree = parse(' (list  0 ) ')
+    assert all(token.type != 'WHITESPACE' for token in tree.scan_values(lambda value: True))
+
+
+def test_invalid_composite():
+    with pytest.raises(SyntaxError):
+        text_ast_to_python_ast('(attr a)', parser='lalr')
+    with pytest.raises(SyntaxError):
+        text_ast_to_python_ast('(attr a)', parser='earley')
+
+
+def test_deep_text_ast():
+    depth = 5000
+    text_ast = '(list ' * depth + ')' * depth
+    tree_ast = TextASTToPythonASTTransformer().transform(parse(text_ast))
+    fused_ast = parse_to_python_ast(text_ast)
+    for python_ast in (tree_ast, fused_ast):
+        node = python_ast.body[0].value
+        for _ in range(depth - 1):
+            node = node.elts[0]
+        assert node.elts == []
+
+
+def test_serialized_parser_is_current():
+    from qastle import syntax_lalr
+    assert syntax_lalr.syntax_specification_sha256 == syntax_specification_sha256()
+    serialized_parser = load_serialized_parser()
+    assert serialized_parser is not None
+    built_parser = build_parser('lalr', use_serialized=False)
+    for text_ast in text_ast_corpus:
+        assert serialized_parser.parse(text_ast) == built_parser.parse(text_ast)
+
+
+def test_import_does_not_build_parser():
+    script = ('import ast, sys, qastle; from qastle import *; '
+              + "python_ast_to_text_ast(ast.parse('a.b')); "
+              + "text_ast_to_python_ast('(list)', backend='fast'); "
+              + "assert 'lark' not in sys.modules, 'lark was imported'")
+    subprocess.run([sys.executable, '-c', script], check=True)
+
+
+def test_labels_share_nodes():
+    for parser in ('lalr', 'earley'):
+        python_ast = text_ast_to_python_ast("(list #1=(attr a 'b') #1# (call #1#))", parser=parser)
+        elts = python_ast.body[0].value.elts
+        assert elts[0] is elts[1]
+        assert elts[2].func is elts[0]
+
+
+def test_undefined_labels():
+    for text_ast in ['#1#', '(list #1# #1=a)', '(list #1=(list #1#))', '(list #1=a #1=b)']:
+        with pytest.raises(SyntaxError):
+            text_ast_to_python_ast(text_ast)
+        with pytest.raises(SyntaxError):
+            text_ast_to_python_ast(text_ast, parser='earley')
+
+
+def test_labels_do_not_leak_between_parses():
+    with pytest.raises(SyntaxError):
+        text_ast_to_python_ast('(list #1=a (attr))')
+    with pytest.raises(SyntaxError):
+        text_ast_to_python_ast('#1#')
+
+
+def test_parsers_are_per_thread():
+    main_thread_parsers = (get_parser('lalr'), get_transforming_parser())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        other_thread_parsers = executor.submit(
+            lambda: (get_parser('lalr'), get_transforming_parser(), qastle.Parser)).result()
+    assert other_thread_parsers[0] is not main_thread_parsers[0]
+    assert other_thread_parsers[1] is not main_thread_parsers[1]
+    assert other_thread_parsers[2] is other_thread_parsers[0]
+    assert qastle.Parser is main_thread_parsers[0]
+
+
+def test_concurrent_parsing():
+    n_threads = 8
+    barrier = threading.Barrier(n_threads)
+    expected = [(text_ast, parse(text_ast), text_ast_to_python_ast(text_ast))
+                for text_ast in text_ast_corpus]
+
+    def parse_corpus(index):
+        barrier.wait()
+        for _ in range(5):
+            for text_ast, tree, python_ast in expected[index:] + expected[:index]:
+                assert parse(text_ast) == tree
+                assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast), python_ast)
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        assert all(executor.map(parse_corpus, range(n_threads)))
@@ -0,0 +1,101 @@
+from .testing_util import *
+from .test_binary import round_trip
+
+from qastle import *
+
+import ast
+import enum
+import sys
+
+import pytest
+
+
+template = ("(Where data_source (lambda (list e) (and (> (call (attr e 'pt')) $pt_cut)"
+            + " (< (call (attr e 'eta')) $eta_cut))))")
+
+
+def test_placeholder_atom():
+    for backend in ['lark', 'fast']:
+        python_ast = text_ast_to_python_ast('(list $a $_b1)', backend=backend)
+        elts = python_ast.body[0].value.elts
+        assert isinstance(elts[0], Placeholder) and elts[0].name == 'a'
+        assert isinstance(elts[1], Placeholder) and elts[1].name == '_b1'
+        assert python_ast_to_text_ast(python_ast) == '(list $a $_b1)'
+    assert python_ast_to_text_ast(round_trip(python_ast)) == '(list $a $_b1)'
+
+
+def test_bind():
+    prepared_query = prepare(template)
+    assert prepared_query.placeholder_names == {'pt_cut', 'eta_cut'}
+    for pt_cut, eta_cut in [(25000, 2.5), (0, -2.5), (-0.0, 1e100), ('a{}b', None), (True, 7)]:
+        text_ast = prepared_query.bind_text(pt_cut=pt_cut, eta_cut=eta_cut)
+        expected_text_ast = (template.replace('$pt_cut', repr(pt_cut))
+                             .replace('$eta_cut', repr(eta_cut)))
+        assert text_ast == expected_text_ast
+        python_ast = prepared_query.bind(pt_cut=pt_cut, eta_cut=eta_cut)
+        assert_ast_nodes_are_equal(python_ast, text_ast_to_python_ast(expected_text_ast))
+        assert python_ast_to_text_ast(python_ast) == expected_text_ast
+
+
+def test_bind_copies_only_paths_to_placeholders():
+    prepared_query = prepare(template)
+    first = prepared_query.bind(pt_cut=1, eta_cut=2)
+    second = prepared_query.bind(pt_cut=3, eta_cut=4)
+    first_where = first.body[0].value
+    second_where = second.body[0].value
+    assert first_where is not second_where
+    assert first_where.source is second_where.source
+    first_and = first_where.predicate.body
+    assert first_and.values[0].left is second_where.predicate.body.values[0].left
+    assert first_and.values[0].comparators[0].value == 1
+    assert python_ast_to_text_ast(prepared_query.python_ast) == template
+
+
+def test_bind_python_ast():
+    python_ast = wrap_ast(ast.BinOp(left=Placeholder(name='x'), op=ast.Add(),
+                                    right=ast.Name(id='y', ctx=ast.Load())))
+    prepared_query = prepare(python_ast)
+    assert python_ast_to_text_ast(prepared_query.bind(x=1)) == '(+ 1 y)'
+    assert prepared_query.bind_text(x=-1) == '(+ -1 y)'
+
+
+def test_bind_repeated_placeholder():
+    prepared_query = prepare('(list $x (list $x))')
+    assert prepared_query.bind_text(x=1) == '(list 1 (list 1))'
+    assert python_ast_to_text_ast(prepared_query.bind(x=1)) == '(list 1 (list 1))'
+
+
+def test_bind_without_placeholders():
+    prepared_query = prepare('(list a)')
+    assert prepared_query.bind_text() == '(list a)'
+    assert python_ast_to_text_ast(prepared_query.bind()) == '(list a)'
+
+
+class Color(enum.IntEnum):
+    RED = 1
+
+
+class Name(str):
+    pass
+
+
+class Ratio(float):
+    pass
+
+
+def test_bind_invalid_values():
+    prepared_query = prepare(template)
+    with pytest.raises(ValueError):
+        prepared_query.bind(pt_cut=1)
+    with pytest.raises(ValueError):
+        prepared_query.bind_text(pt_cut=1, eta_cut=2, phi_cut=3)
+    invalid_values = [float('nan'), float('inf'), [1], object(), Color.RED, Name('pt'),
+                      Ratio(1.5)]
+    if getattr(sys, 'get_int_max_str_digits', lambda: 0)() > 0:
+        # Python versions that limit the digits of int's repr()
+        invalid_values.append(10 ** (sys.get_int_max_str_digits() + 1))
+    for value in invalid_values:
+        with pytest.raises(ValueError):
+            prepared_query.bind(pt_cut=value, eta_cut=2)
+        with pytest.raises(ValueError):
+            prepared_query.bind_text(pt_cut=value, eta_cut=2)
@@ -0,0 +1,71 @@
+from .testing_util import *
+
+from qastle import *
+from qastle.registry import node_classes
+
+import ast
+
+import pytest
+
+
+class Distinct(ast.AST):
+    _fields = ['source', 'key_selector']
+
+
+@pytest.fixture
+def distinct():
+    node_type = register_node_class(Distinct, lambda_arities={1: 1})
+    yield node_type
+    unregister_node_type('Distinct')
+
+
+def test_builtin_node_types_registered():
+    for name in ('list', 'dict', 'attr', 'subscript', 'call', 'if', 'lambda', '+', '-', 'not',
+                 '**', 'and', '>=') + linq_operator_names:
+        assert name in node_types
+    for name in linq_operator_names:
+        assert node_classes[node_types[name].node_class] is node_types[name]
+
+
+def test_register_duplicate():
+    with pytest.raises(ValueError):
+        register_node_class(Where)
+
+
+def test_registered_node_class(distinct):
+    text_ast = '(Distinct data_source (lambda (list e) e))'
+    python_ast = text_ast_to_python_ast(text_ast)
+    assert isinstance(python_ast.body[0].value, Distinct)
+    assert_ast_nodes_are_equal(text_ast_to_python_ast(text_ast, backend='fast'), python_ast)
+    assert python_ast_to_text_ast(python_ast) == text_ast
+    linq_ast = insert_linq_nodes(ast.parse("data_source.Distinct('lambda e: e')"))
+    assert python_ast_to_text_ast(linq_ast) == text_ast
+
+
+def test_registered_node_class_checks(distinct):
+    with pytest.raises(SyntaxError, match='Distinct node must have two fields; found 1'):
+        text_ast_to_python_ast('(Distinct data_source)')
+    with pytest.raises(SyntaxError, match='Distinct key selector must be a lambda'):
+        text_ast_to_python_ast('(Distinct data_source 0)')
+    with pytest.raises(SyntaxError, match='Distinct key selector must have exactly one argument'):
+        text_ast_to_python_ast('(Distinct data_source (lambda (list a b) a))')
+    with pytest.raises(SyntaxError, match='Distinct\\(\\) call must have exactly one argument'):
+        insert_linq_nodes(ast.parse('data_source.Distinct()'))
+
+
+def test_unregistered_node_type(distinct):
+    unregister_node_type('Distinct')
+    with pytest.raises(SyntaxError):
+        text_ast_to_python_ast('(Distinct data_source (lambda (list e) e))')
+    with pytest.raises(SyntaxError):
+        python_ast_to_text_ast(Distinct(source=ast.Name(id='a'), key_selector=ast.Name(id='b')))
+    register_node_class(Distinct, lambda_arities={1: 1})
+
+
+def test_operator_arity_messages():
+    with pytest.raises(SyntaxError, match='Add operator must have one or two operands; found 3'):
+        text_ast_to_python_ast('(+ a b c)')
+    with pytest.raises(SyntaxError, match='Not operator must have one operand; found 2'):
+        text_ast_to_python_ast('(not a b)')
+    with pytest.raises(SyntaxError, match='Call node must have at least one field; found 0'):
+        text_ast_to_python_ast('(call)')